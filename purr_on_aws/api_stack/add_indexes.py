@@ -1,7 +1,11 @@
+import argparse
 import boto3
 import os
+import sys
 import time
+from collections import Counter
 from dotenv import load_dotenv
+from boto3.dynamodb.conditions import Attr, Key
 from botocore.exceptions import ClientError
 
 load_dotenv()
@@ -9,6 +13,25 @@ load_dotenv()
 # aws_account = os.getenv("AWS_ACCOUNT")
 purr_subdomain = os.getenv("PURR_SUBDOMAIN")
 
+# The migrations shard, post, geohash, sort key and count rasters with the
+# lambda's own helpers; dynamodb_handler reads these at import
+os.environ.setdefault("PURR_DOMAIN", "purr.io")
+os.environ.setdefault("FIZZ_TABLE_NAME", f"{purr_subdomain}-fizz")
+os.environ.setdefault("JOBS_TABLE_NAME", f"{purr_subdomain}-jobs")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lambda"))
+
+from dynamodb_handler import (  # noqa: E402
+    RASTER_PARTITIONS,
+    RASTER_SHARDS,
+    change_bucket,
+    geo_attributes,
+    index_raster,
+    posting_items,
+    posting_pk,
+    sort_attributes,
+)
+from facet_store import counter_sk, facet_keys  # noqa: E402
+
 
 def wait_for_index_active(
     table_name, index_name, dynamodb_client, delay=10, max_attempts=60
@@ -87,6 +110,10 @@ def add_dynamodb_indexes():
         "table": f"{purr_subdomain}-fizz",
         "indices": [
             ("pk", "uwi", "pk-uwi-index"),
+            ("geo_cell", "geohash", "geo-cell-index"),
+            ("pk", "sort_well_name", "pk-well-name-index"),
+            ("pk", "sort_depth", "pk-depth-index"),
+            ("change_bucket", "updated_at", "change-index"),
             # ("pk", "calib_log_description_lc", "pk-calib-index"),
         ],
     }
@@ -97,4 +124,266 @@ def add_dynamodb_indexes():
         safe_create_gsi(table_name, index_name, partition_key, sort_key)
 
 
-add_dynamodb_indexes()
+# 2026-10-18 | rasters moved from pk "RASTER" to write shards RASTER#00..NN
+def migrate_raster_shards():
+    """
+    Re-put every unsharded raster under its shard pk, repoint its keyword
+    postings and delete the original. Safe to re-run.
+    """
+    table = boto3.resource("dynamodb").Table(f"{purr_subdomain}-fizz")
+    query_args = {"KeyConditionExpression": Key("pk").eq("RASTER")}
+    moved = 0
+    with table.batch_writer() as batch:
+        while True:
+            response = table.query(**query_args)
+            for item in response.get("Items", []):
+                if not item.get("uwi"):
+                    continue
+                sharded = index_raster(item)
+                batch.put_item(Item=sharded)
+                for posting in posting_items(sharded):
+                    batch.put_item(Item=posting)
+                batch.delete_item(Key={"pk": "RASTER", "sk": item["sk"]})
+                moved += 1
+            if "LastEvaluatedKey" not in response:
+                break
+            query_args["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+    print(f"Moved {moved} raster(s) to {RASTER_SHARDS} shards")
+
+
+# 2026-10-18 | surface locations indexed on geo-cell-index
+def backfill_raster_geohash():
+    """
+    Add geo-cell-index keys to sharded rasters written before the index
+    existed. Safe to re-run.
+    """
+    table = boto3.resource("dynamodb").Table(f"{purr_subdomain}-fizz")
+    located = 0
+    for partition in RASTER_PARTITIONS:
+        query_args = {
+            "KeyConditionExpression": Key("pk").eq(partition),
+            "FilterExpression": Attr("geohash").not_exists()
+            & Attr("surface_lat").exists(),
+        }
+        while True:
+            response = table.query(**query_args)
+            for item in response.get("Items", []):
+                attributes = geo_attributes(item)
+                if not attributes:
+                    continue
+                table.update_item(
+                    Key={"pk": item["pk"], "sk": item["sk"]},
+                    UpdateExpression="SET geo_cell = :c, geohash = :g",
+                    ExpressionAttributeValues={
+                        ":c": attributes["geo_cell"],
+                        ":g": attributes["geohash"],
+                    },
+                )
+                located += 1
+            if "LastEvaluatedKey" not in response:
+                break
+            query_args["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+    print(f"Indexed {located} raster location(s)")
+
+
+# 2026-10-18 | calibration segments posted to DEPTH#<bucket> for depth search
+def backfill_depth_postings():
+    """
+    Write depth postings for sharded rasters loaded before depth search.
+    Safe to re-run.
+    """
+    table = boto3.resource("dynamodb").Table(f"{purr_subdomain}-fizz")
+    posted = 0
+    with table.batch_writer() as batch:
+        for partition in RASTER_PARTITIONS:
+            query_args = {
+                "KeyConditionExpression": Key("pk").eq(partition),
+                "FilterExpression": Attr("calib_segment_top_depth").exists(),
+            }
+            while True:
+                response = table.query(**query_args)
+                for item in response.get("Items", []):
+                    for posting in posting_items(item):
+                        if posting["pk"].startswith("DEPTH#"):
+                            batch.put_item(Item=posting)
+                            posted += 1
+                if "LastEvaluatedKey" not in response:
+                    break
+                query_args["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+    print(f"Wrote {posted} depth posting(s)")
+
+
+# 2026-10-18 | postings moved from WORD#<token> and DEPTH#<bucket> to their
+# rasters' shards, WORD#<token>#NN and DEPTH#<bucket>#NN
+def migrate_posting_shards():
+    """
+    Re-put every unsharded keyword and depth posting under its shard pk and
+    delete the original. Safe to re-run.
+    """
+    table = boto3.resource("dynamodb").Table(f"{purr_subdomain}-fizz")
+    scan_args = {
+        "FilterExpression": Attr("pk").begins_with("WORD#")
+        | Attr("pk").begins_with("DEPTH#")
+    }
+    moved = 0
+    with table.batch_writer() as batch:
+        while True:
+            response = table.scan(**scan_args)
+            for item in response.get("Items", []):
+                if item["pk"].count("#") != 1:
+                    continue
+                uwi = item["sk"].split("#", 1)[0]
+                batch.put_item(Item={**item, "pk": posting_pk(item["pk"], uwi)})
+                batch.delete_item(Key={"pk": item["pk"], "sk": item["sk"]})
+                moved += 1
+            if "LastEvaluatedKey" not in response:
+                break
+            scan_args["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+    print(f"Moved {moved} posting(s) to {RASTER_SHARDS} shards")
+
+
+# 2026-10-18 | rasters sorted by well name and depth on sort indexes
+def backfill_sort_keys():
+    """
+    Add sort index keys to sharded rasters written before sorted search.
+    Safe to re-run.
+    """
+    table = boto3.resource("dynamodb").Table(f"{purr_subdomain}-fizz")
+    sorted_count = 0
+    for partition in RASTER_PARTITIONS:
+        query_args = {
+            "KeyConditionExpression": Key("pk").eq(partition),
+            "FilterExpression": Attr("sort_well_name").not_exists()
+            & Attr("uwi").exists(),
+        }
+        while True:
+            response = table.query(**query_args)
+            for item in response.get("Items", []):
+                attributes = sort_attributes(item)
+                table.update_item(
+                    Key={"pk": item["pk"], "sk": item["sk"]},
+                    UpdateExpression="SET sort_well_name = :n, sort_depth = :d",
+                    ExpressionAttributeValues={
+                        ":n": attributes["sort_well_name"],
+                        ":d": attributes["sort_depth"],
+                    },
+                )
+                sorted_count += 1
+            if "LastEvaluatedKey" not in response:
+                break
+            query_args["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+    print(f"Added sort keys to {sorted_count} raster(s)")
+
+
+# 2026-10-18 | raster counts by facet, kept by facet_worker.py
+def recount_facets():
+    """
+    Rewrite the facet counters from the rasters into their first shard,
+    zeroing every other counter item. Run while no rasters are being loaded:
+    counts the worker adds in the meantime are overwritten. Safe to re-run.
+    """
+    table = boto3.resource("dynamodb").Table(f"{purr_subdomain}-fizz")
+    counts = Counter()
+    for partition in RASTER_PARTITIONS:
+        query_args = {
+            "KeyConditionExpression": Key("pk").eq(partition),
+            "FilterExpression": Attr("uwi").exists(),
+        }
+        while True:
+            response = table.query(**query_args)
+            for item in response.get("Items", []):
+                counts.update(facet_keys(item))
+            if "LastEvaluatedKey" not in response:
+                break
+            query_args["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    # Counter items are "<counter>#NN" with the counter in "counter"
+    counters = {
+        (pk, counter_sk(sk, 0)): {
+            "pk": pk,
+            "sk": counter_sk(sk, 0),
+            "counter": sk,
+            "count": count,
+        }
+        for (pk, sk), count in counts.items()
+    }
+    scan_args = {"FilterExpression": Attr("pk").begins_with("FACET#")}
+    while True:
+        response = table.scan(**scan_args)
+        for item in response.get("Items", []):
+            counters.setdefault((item["pk"], item["sk"]), {**item, "count": 0})
+        if "LastEvaluatedKey" not in response:
+            break
+        scan_args["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    with table.batch_writer() as batch:
+        for counter in counters.values():
+            batch.put_item(Item=counter)
+    print(f"Wrote {len(counters)} facet counter item(s)")
+
+
+# 2026-10-18 | rasters and repos indexed by updated_at for the changefeed
+def backfill_change_buckets():
+    """
+    Add change-index keys to rasters and repos written before the changefeed.
+    Safe to re-run.
+    """
+    table = boto3.resource("dynamodb").Table(f"{purr_subdomain}-fizz")
+    bucketed = 0
+    for pk in [*RASTER_PARTITIONS, "REPO"]:
+        query_args = {
+            "KeyConditionExpression": Key("pk").eq(pk),
+            "FilterExpression": Attr("change_bucket").not_exists()
+            & Attr("updated_at").exists(),
+        }
+        while True:
+            response = table.query(**query_args)
+            for item in response.get("Items", []):
+                table.update_item(
+                    Key={"pk": item["pk"], "sk": item["sk"]},
+                    UpdateExpression="SET change_bucket = :b",
+                    ExpressionAttributeValues={
+                        ":b": change_bucket(item["pk"], item["updated_at"])
+                    },
+                )
+                bucketed += 1
+            if "LastEvaluatedKey" not in response:
+                break
+            query_args["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+    print(f"Indexed {bucketed} change(s)")
+
+
+# One-off data migrations and backfills, run only when named, e.g.
+#   python api_stack/add_indexes.py --run migrate_raster_shards --run recount_facets
+MIGRATIONS = {
+    migration.__name__: migration
+    for migration in (
+        migrate_raster_shards,
+        backfill_raster_geohash,
+        backfill_depth_postings,
+        backfill_sort_keys,
+        migrate_posting_shards,
+        recount_facets,
+        backfill_change_buckets,
+    )
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Create any missing fizz table indexes, then run the "
+        "migrations named with --run, in the order given."
+    )
+    parser.add_argument(
+        "--run",
+        action="append",
+        default=[],
+        choices=list(MIGRATIONS),
+        metavar="MIGRATION",
+        help=f"one of: {', '.join(MIGRATIONS)}",
+    )
+    args = parser.parse_args()
+
+    add_dynamodb_indexes()
+    for name in args.run:
+        MIGRATIONS[name]()
@@ -5,8 +5,11 @@ from aws_cdk import (
     Stack,
     aws_dynamodb as dynamodb,
     aws_lambda as _lambda,
+    aws_lambda_event_sources as lambda_event_sources,
     aws_apigateway as apigw,
     aws_iam as iam,
+    aws_s3 as s3,
+    aws_secretsmanager as secretsmanager,
     RemovalPolicy,
     CfnOutput,
 )
@@ -18,10 +21,17 @@ load_dotenv()
 
 purr_domain = os.getenv("PURR_DOMAIN", "purr.io")
 purr_subdomain = os.getenv("PURR_SUBDOMAIN", "test")
+search_token_secret = os.getenv("SEARCH_TOKEN_SECRET", "")
+low_level_reads = os.getenv("LOW_LEVEL_READS", "true")
+shared_search_cache = os.getenv("SHARED_SEARCH_CACHE", "false").lower() == "true"
 # aws_account = os.getenv("AWS_ACCOUNT", "")
 purr_fizz_table_name = f"{purr_subdomain}-fizz"
 purr_jobs_table_name = f"{purr_subdomain}-jobs"
+purr_search_cache_table_name = f"{purr_subdomain}-search-cache"
+purr_ingest_bucket_name = f"{purr_subdomain}-ingest"
 purr_api_lambda_name = f"{purr_subdomain}-api-lambda"
+purr_job_worker_lambda_name = f"{purr_subdomain}-job-worker-lambda"
+purr_facet_worker_lambda_name = f"{purr_subdomain}-facet-worker-lambda"
 
 
 class ApiStack(Stack):
@@ -60,7 +70,8 @@ class ApiStack(Stack):
             results_cache_ttl=Duration.minutes(5),
         )
 
-        # Create DynamoDB fizz table. (GSIs are created later)
+        # Create DynamoDB fizz table. (GSIs are created later; the stream
+        # keeps the facet counters)
         fizz_table = dynamodb.Table(
             self,
             "FizzTable",
@@ -71,6 +82,7 @@ class ApiStack(Stack):
             billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
             table_name=purr_fizz_table_name,
             removal_policy=RemovalPolicy.DESTROY,
+            stream=dynamodb.StreamViewType.NEW_AND_OLD_IMAGES,
         )
 
         # Create DynamoDB jobs table.
@@ -87,18 +99,34 @@ class ApiStack(Stack):
             stream=dynamodb.StreamViewType.NEW_IMAGE,
         )
 
+        # Create S3 bucket for staged (NDJSON, optionally gzipped) raster loads
+        ingest_bucket = s3.Bucket(
+            self,
+            "IngestBucket",
+            removal_policy=RemovalPolicy.DESTROY,
+            auto_delete_objects=True,
+            block_public_access=s3.BlockPublicAccess.BLOCK_ALL,
+            encryption=s3.BucketEncryption.S3_MANAGED,
+            bucket_name=purr_ingest_bucket_name,
+            lifecycle_rules=[s3.LifecycleRule(expiration=Duration.days(7))],
+        )
+
         # Create Lambda API + DynamoDB handler function
+        # (timeout matches the API Gateway integration limit for bulk loads)
         api_handler = _lambda.Function(
             self,
             "FizzTableHandler",
             runtime=_lambda.Runtime.PYTHON_3_9,
             code=_lambda.Code.from_asset("lambda"),
             handler="dynamodb_handler.handler",
+            timeout=Duration.seconds(29),
             environment={
                 "FIZZ_TABLE_NAME": fizz_table.table_name,
                 "JOBS_TABLE_NAME": jobs_table.table_name,
+                "INGEST_BUCKET_NAME": ingest_bucket.bucket_name,
                 "PURR_SUBDOMAIN": purr_subdomain,
                 "PURR_DOMAIN": purr_domain,
+                "LOW_LEVEL_READS": low_level_reads,
             },
             function_name=purr_api_lambda_name,
         )
@@ -120,6 +148,10 @@ class ApiStack(Stack):
                 fizz_table.table_arn,
                 jobs_table.table_arn,
                 f"{fizz_table.table_arn}/index/pk-uwi-index",
+                f"{fizz_table.table_arn}/index/geo-cell-index",
+                f"{fizz_table.table_arn}/index/pk-well-name-index",
+                f"{fizz_table.table_arn}/index/pk-depth-index",
+                f"{fizz_table.table_arn}/index/change-index",
                 # f"{fizz_table.table_arn}/index/pk-calib-index",
             ],
         )
@@ -127,6 +159,129 @@ class ApiStack(Stack):
         # Ensure that api_handler can do logging, DynamoDB stuff
         api_handler.add_to_role_policy(dynamodb_policy)
         api_handler.add_to_role_policy(logging_policy)
+        ingest_bucket.grant_read(api_handler)
+
+        # Search pagination tokens are signed: with a configured secret, or
+        # one generated here and read once per api_handler container
+        if search_token_secret:
+            api_handler.add_environment("SEARCH_TOKEN_SECRET", search_token_secret)
+        else:
+            token_secret = secretsmanager.Secret(
+                self,
+                "SearchTokenSecret",
+                generate_secret_string=secretsmanager.SecretStringGenerator(
+                    password_length=64, exclude_punctuation=True
+                ),
+            )
+            api_handler.add_environment(
+                "SEARCH_TOKEN_SECRET_ARN", token_secret.secret_arn
+            )
+            token_secret.grant_read(api_handler)
+
+        # Optional search result cache shared by all api_handler containers
+        if shared_search_cache:
+            search_cache_table = dynamodb.Table(
+                self,
+                "SearchCacheTable",
+                partition_key=dynamodb.Attribute(
+                    name="key", type=dynamodb.AttributeType.STRING
+                ),
+                billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+                table_name=purr_search_cache_table_name,
+                removal_policy=RemovalPolicy.DESTROY,
+                time_to_live_attribute="ttl",
+            )
+            api_handler.add_environment(
+                "SEARCH_CACHE_TABLE_NAME", search_cache_table.table_name
+            )
+            search_cache_table.grant_read_write_data(api_handler)
+
+        # Create job worker: consumes the jobs table stream and runs the
+        # directives registered in job_worker.py
+        job_worker = _lambda.Function(
+            self,
+            "JobWorker",
+            runtime=_lambda.Runtime.PYTHON_3_9,
+            code=_lambda.Code.from_asset("lambda"),
+            handler="job_worker.handler",
+            timeout=Duration.minutes(5),
+            environment={
+                "JOBS_TABLE_NAME": jobs_table.table_name,
+            },
+            function_name=purr_job_worker_lambda_name,
+        )
+        jobs_table.grant_read_write_data(job_worker)
+        job_worker.add_to_role_policy(logging_policy)
+
+        # Only newly pending jobs invoke the worker; failed records are
+        # reported individually and retried from there
+        job_worker.add_event_source(
+            lambda_event_sources.DynamoEventSource(
+                jobs_table,
+                starting_position=_lambda.StartingPosition.LATEST,
+                batch_size=10,
+                max_batching_window=Duration.seconds(1),
+                retry_attempts=3,
+                report_batch_item_failures=True,
+                filters=[
+                    _lambda.FilterCriteria.filter(
+                        {
+                            "eventName": _lambda.FilterRule.or_("INSERT", "MODIFY"),
+                            "dynamodb": {
+                                "NewImage": {
+                                    "status": {
+                                        "S": _lambda.FilterRule.is_equal("pending")
+                                    }
+                                }
+                            },
+                        }
+                    )
+                ],
+            )
+        )
+
+        # Create facet worker: consumes the fizz table stream and keeps the
+        # raster count and facet counters (facet_store.py)
+        facet_worker = _lambda.Function(
+            self,
+            "FacetWorker",
+            runtime=_lambda.Runtime.PYTHON_3_9,
+            code=_lambda.Code.from_asset("lambda"),
+            handler="facet_worker.handler",
+            timeout=Duration.minutes(1),
+            environment={
+                "FIZZ_TABLE_NAME": fizz_table.table_name,
+            },
+            function_name=purr_facet_worker_lambda_name,
+        )
+        fizz_table.grant_write_data(facet_worker)
+        facet_worker.add_to_role_policy(logging_policy)
+
+        # Only raster changes invoke the worker. A failed batch is retried
+        # whole (counter updates are idempotent per batch); one dropped after
+        # the last retry leaves the counts off until add_indexes.py recounts.
+        facet_worker.add_event_source(
+            lambda_event_sources.DynamoEventSource(
+                fizz_table,
+                starting_position=_lambda.StartingPosition.LATEST,
+                batch_size=100,
+                max_batching_window=Duration.seconds(5),
+                retry_attempts=10,
+                filters=[
+                    _lambda.FilterCriteria.filter(
+                        {
+                            "dynamodb": {
+                                "Keys": {
+                                    "pk": {
+                                        "S": _lambda.FilterRule.begins_with("RASTER")
+                                    }
+                                }
+                            }
+                        }
+                    )
+                ],
+            )
+        )
 
         # Create API Gateway with safe CORS
         api = apigw.RestApi(
@@ -134,6 +289,8 @@ class ApiStack(Stack):
             "FizzApi",
             rest_api_name="Fizz API",
             description="API for fizzy operations",
+            # NDJSON raster loads arrive base64-encoded, gzipped or not
+            binary_media_types=["application/x-ndjson", "application/gzip"],
             default_cors_preflight_options=apigw.CorsOptions(
                 allow_origins=[
                     "http://localhost:3000",
@@ -144,6 +301,7 @@ class ApiStack(Stack):
                     "Content-Type",
                     "Authorization",
                     "token",
+                    "X-Purr-Debug",
                 ],
                 max_age=Duration.minutes(5),
                 status_code=200,
@@ -193,7 +351,7 @@ class ApiStack(Stack):
             method_responses=[method_response],
         )
 
-        # POST /rasters
+        # POST /rasters (JSON array, NDJSON body or staged NDJSON source)
         rasters_resource = api.root.add_resource("rasters")
         rasters_resource.add_method(
             "POST",
@@ -213,6 +371,26 @@ class ApiStack(Stack):
             method_responses=[method_response],
         )
 
+        # POST /facets (raster counts by facet)
+        facets_resource = api.root.add_resource("facets")
+        facets_resource.add_method(
+            "POST",
+            integration=integration,
+            authorizer=authorizer,
+            authorization_type=apigw.AuthorizationType.CUSTOM,
+            method_responses=[method_response],
+        )
+
+        # GET /changes (rasters or repos updated since a watermark)
+        changes_resource = api.root.add_resource("changes")
+        changes_resource.add_method(
+            "GET",
+            integration=integration,
+            authorizer=authorizer,
+            authorization_type=apigw.AuthorizationType.CUSTOM,
+            method_responses=[method_response],
+        )
+
         # POST /jobs
         jobs_resource = api.root.add_resource("jobs")
         jobs_resource.add_method(
@@ -223,6 +401,16 @@ class ApiStack(Stack):
             method_responses=[method_response],
         )
 
+        # POST /jobs/status (many job ids at once)
+        job_status_resource = jobs_resource.add_resource("status")
+        job_status_resource.add_method(
+            "POST",
+            integration=integration,
+            authorizer=authorizer,
+            authorization_type=apigw.AuthorizationType.CUSTOM,
+            method_responses=[method_response],
+        )
+
         # GET /jobs/{id}
         job_id_resource = jobs_resource.add_resource("{id}")
         job_id_resource.add_method(
@@ -266,6 +454,12 @@ class ApiStack(Stack):
             value=fizz_table.table_name,
             description="DynamoDB fizz table name",
         )
+        CfnOutput(
+            self,
+            "IngestBucketName",
+            value=ingest_bucket.bucket_name,
+            description="S3 bucket for staged raster loads",
+        )
         CfnOutput(
             self,
             "JobsTableName",
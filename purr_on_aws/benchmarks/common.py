@@ -0,0 +1,114 @@
+import os
+import random
+import sys
+from decimal import Decimal
+
+# dynamodb_handler reads these at import time
+os.environ.setdefault("PURR_SUBDOMAIN", "bench")
+os.environ.setdefault("PURR_DOMAIN", "purr.io")
+os.environ.setdefault("FIZZ_TABLE_NAME", "bench-fizz")
+os.environ.setdefault("JOBS_TABLE_NAME", "bench-jobs")
+os.environ.setdefault("SEARCH_TOKEN_SECRET", "bench")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+# Benchmarks import dynamodb_handler after this module
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lambda"))
+
+LOG_TYPES = ["gamma ray", "resistivity", "sonic", "neutron", "density", "sp"]
+STATES = {"42": "TX", "05": "CO", "30": "NM", "35": "OK"}
+COUNTIES = ["ANDREWS", "MIDLAND", "REEVES", "WELD", "EDDY", "KINGFISHER"]
+
+
+def make_uwi(rng, state_code=None):
+    state_code = state_code or rng.choice(list(STATES))
+    return f"{state_code}{rng.randrange(10**8):08d}"
+
+
+def make_raster(rng, uwi, segment_num, decimals=True, log_type=None):
+    """
+    A raster/calibration item shaped like site/src/ts/raster.ts. Numbers are
+    Decimals as boto3 returns them, or floats as a loader would post them.
+    """
+    num = Decimal if decimals else float
+    top = rng.randrange(0, 12000, 50)
+    log_type = log_type or rng.choice(LOG_TYPES)
+    sk = f"{uwi}:{segment_num}:{rng.randrange(10**12):012x}"
+    return {
+        "pk": "RASTER",
+        "sk": sk,
+        "uwi": uwi,
+        "bottom_lat": num(str(round(rng.uniform(25, 45), 6))),
+        "bottom_lon": num(str(round(rng.uniform(-110, -95), 6))),
+        "calib_checksum": f"{rng.getrandbits(128):032x}",
+        "calib_file_name": f"{sk}.xml",
+        "calib_file_name_lc": f"{sk}.xml",
+        "calib_log_base_depth": num(top + 2000),
+        "calib_log_copyright": "none",
+        "calib_log_date": "1982-06-14",
+        "calib_log_depth_type": "MD",
+        "calib_log_depth_unit": "ft",
+        "calib_log_description": log_type.upper(),
+        "calib_log_description_lc": log_type,
+        "calib_log_provider": "purr",
+        "calib_log_top_depth": num(top),
+        "calib_log_type": log_type.upper(),
+        "calib_log_type_lc": log_type,
+        "calib_orig_fs_path": f"c:/logs/{sk}.xml",
+        "calib_segment_base_depth": num(str(top + rng.randrange(100, 2000) + 0.5)),
+        "calib_segment_depth_unit": "ft",
+        "calib_segment_name": f"segment {segment_num}",
+        "calib_segment_num": num(segment_num),
+        "calib_segment_scale": "5in/100ft",
+        "calib_segment_top_depth": num(str(top + 0.5)),
+        "calib_type": rng.choice(["depth", "composite"]),
+        "calib_vault_fs_path": f"vault/{sk}.xml",
+        "loader_name": "bench",
+        "raster_bytes": num(rng.randrange(10**5, 10**8)),
+        "raster_checksum": f"{rng.getrandbits(128):032x}",
+        "raster_file_name": f"{sk}.tif",
+        "raster_orig_fs_path": f"c:/logs/{sk}.tif",
+        "raster_pixel_height": num(rng.randrange(2000, 60000)),
+        "raster_pixel_width": num(rng.randrange(1000, 4000)),
+        "raster_vault_fs_path": f"vault/{sk}.tif",
+        "surface_lat": num(str(round(rng.uniform(25, 45), 6))),
+        "surface_lon": num(str(round(rng.uniform(-110, -95), 6))),
+        "well_county": rng.choice(COUNTIES),
+        "well_name": f"WELL {rng.randrange(1, 999)}",
+        "well_operator": "PURR OIL",
+        "well_state": STATES.get(uwi[:2], "TX"),
+        "well_wsn": num(rng.randrange(10**6)),
+        "wordz": f"{log_type} {sk} {rng.choice(COUNTIES).lower()}",
+        "created_at": "2025-01-01T00:00:00+00:00",
+        "updated_at": "2025-01-01T00:00:00+00:00",
+    }
+
+
+def make_rasters(count, seed=0, decimals=True):
+    rng = random.Random(seed)
+    items = []
+    while len(items) < count:
+        uwi = make_uwi(rng)
+        for segment_num in range(rng.randrange(1, 6)):
+            items.append(make_raster(rng, uwi, segment_num, decimals))
+    return items[:count]
+
+
+def make_repos(count, seed=0):
+    rng = random.Random(seed)
+    return [
+        {
+            "pk": "REPO",
+            "sk": f"repo-{i}",
+            "fs_path": f"//server/share/repo_{i}",
+            "name": f"repo {i}",
+            "file_count": Decimal(rng.randrange(10**6)),
+            "storage_bytes": Decimal(rng.randrange(10**12)),
+            "polygon": [
+                [Decimal(str(round(rng.uniform(-110, -95), 4))) for _ in range(2)]
+                for _ in range(20)
+            ],
+            "created_at": "2025-01-01T00:00:00+00:00",
+            "updated_at": "2025-01-01T00:00:00+00:00",
+        }
+        for i in range(count)
+    ]
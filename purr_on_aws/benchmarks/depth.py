@@ -0,0 +1,117 @@
+"""
+Depth-interval search: a FilterExpression over every segment under the UWI
+prefixes (the baseline) vs POST /search with "depth", which reads the depth
+bucket postings. Synthetic wells with many segments each, against the
+stand-in with simulated round-trip latency. Run from purr_on_aws/:
+
+    python -m benchmarks.depth [--wells 200] [--segments 50] [--latency 0.005]
+"""
+
+import argparse
+import json
+import random
+import time
+from decimal import Decimal
+
+from boto3.dynamodb.conditions import Attr
+
+from benchmarks.common import make_raster, make_uwi
+from benchmarks.ingest import FIZZ_INDEXES, FIZZ_KEYS
+from tests.standin import StandIn
+
+# On the lambda path benchmarks.common sets up
+import dynamodb_handler  # noqa: E402
+
+INTERVALS = [(8000, 9500), (3000, 3100), (0, 3000)]
+PREFIXES = ["420", "421", "422"]
+
+
+def make_wells(wells, segments, seed=0):
+    rng = random.Random(seed)
+    items = []
+    for _ in range(wells):
+        uwi = make_uwi(rng, "42")
+        items.extend(make_raster(rng, uwi, n) for n in range(segments))
+    return items
+
+
+def filter_baseline(uwis, depth):
+    top, base = depth
+    condition = Attr("calib_segment_top_depth").lte(Decimal(base)) & Attr(
+        "calib_segment_base_depth"
+    ).gte(Decimal(top))
+    items = []
+    for uwi_prefix in uwis:
+        for partition in dynamodb_handler.RASTER_PARTITIONS:
+            exclusive_start_key = None
+            while True:
+                query_args = dynamodb_handler.build_query_args(
+                    uwi_prefix, partition, 1000, exclusive_start_key
+                )
+                query_args["FilterExpression"] = condition
+                response = dynamodb_handler.query_items(
+                    dynamodb_handler.fizz_table, **query_args
+                )
+                items.extend(response["Items"])
+                exclusive_start_key = response.get("LastEvaluatedKey")
+                if not exclusive_start_key:
+                    break
+    return items
+
+
+def indexed_search(uwis, depth):
+    items = []
+    token = None
+    while True:
+        body = {"uwis": uwis, "depth": list(depth), "maxResults": 500}
+        if token:
+            body["paginationToken"] = token
+        event = {"headers": {}, "body": json.dumps(body)}
+        response = json.loads(dynamodb_handler.post_search(event, body)["body"])
+        items.extend(response["data"])
+        token = response["metadata"]["paginationToken"]
+        if not token:
+            return items
+
+
+def measure(standin, search, uwis, depth):
+    standin.reset_counters()
+    started = time.perf_counter()
+    items = search(uwis, depth)
+    elapsed = time.perf_counter() - started
+    return {
+        "seconds": round(elapsed, 3),
+        "matched": len(items),
+        "items_read": sum(standin.reads.values()),
+        "read_units": sum(standin.read_units.values()),
+        "round_trips": sum(standin.calls.values()),
+    }
+
+
+def run(wells=200, segments=50, latency=0.005):
+    standin = StandIn()
+    standin.create_table(dynamodb_handler.fizz_table.name, FIZZ_KEYS, FIZZ_INDEXES)
+    standin.create_table(dynamodb_handler.jobs_table.name, ("id",))
+    standin.install(dynamodb_handler)
+    dynamodb_handler.post_rasters(
+        {"headers": {}, "queryStringParameters": None},
+        make_wells(wells, segments),
+    )
+    standin.latency = latency
+
+    results = {"wells": wells, "segments": segments, "latency": latency}
+    for depth in INTERVALS:
+        results[f"depth_{depth[0]}_{depth[1]}"] = {
+            "filter_expression": measure(standin, filter_baseline, PREFIXES, depth),
+            "depth_index": measure(standin, indexed_search, PREFIXES, depth),
+        }
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--wells", type=int, default=200)
+    parser.add_argument("--segments", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.005)
+    args = parser.parse_args()
+    print(json.dumps(run(args.wells, args.segments, args.latency), indent=2))
@@ -0,0 +1,86 @@
+"""
+POST /rasters ingest: the original one-at-a-time batch_writer path vs the
+concurrent chunked bulk writer, against the stand-in with simulated
+round-trip latency and throttling. Run from purr_on_aws/:
+
+    python -m benchmarks.ingest [--latency 0.01] [--throttle 0.05]
+"""
+
+import argparse
+import json
+import time
+from datetime import datetime, timezone
+
+from boto3.dynamodb.table import BatchWriter
+
+from benchmarks.common import make_rasters
+from tests.standin import StandIn, to_wire
+
+# On the lambda path benchmarks.common sets up
+import dynamodb_handler  # noqa: E402
+
+FIZZ_KEYS = ("pk", "sk")
+FIZZ_INDEXES = {
+    "pk-uwi-index": ("pk", "uwi"),
+    "geo-cell-index": ("geo_cell", "geohash"),
+    "pk-well-name-index": ("pk", "sort_well_name"),
+    "pk-depth-index": ("pk", "sort_depth"),
+    "change-index": ("change_bucket", "updated_at"),
+}
+
+
+def legacy_post_rasters(event, body):
+    # The pre-bulk path: per-item timestamps, sequential 25-item flushes and
+    # a full echo of the body
+    return_items = []
+    client = dynamodb_handler.dynamodb_client
+    with BatchWriter(dynamodb_handler.fizz_table.name, client) as batch:
+        for item in body:
+            now = datetime.now(timezone.utc).isoformat()
+            o = {**item, "created_at": now, "updated_at": now}
+            batch.put_item(Item=to_wire(o))
+            for posting in dynamodb_handler.posting_items(o):
+                batch.put_item(Item=to_wire(posting))
+            return_items.append(o)
+    return dynamodb_handler.create_response(
+        event, 201, {"count": len(body), "items": return_items}
+    )
+
+
+def run_case(post, body, latency, throttle):
+    standin = StandIn(latency=latency, throttle_rate=throttle)
+    standin.create_table(dynamodb_handler.fizz_table.name, FIZZ_KEYS, FIZZ_INDEXES)
+    standin.create_table(dynamodb_handler.jobs_table.name, ("id",))
+    standin.install(dynamodb_handler)
+
+    event = {"headers": {}, "queryStringParameters": None}
+    started = time.perf_counter()
+    response = post(event, body)
+    elapsed = time.perf_counter() - started
+    return {
+        "seconds": round(elapsed, 3),
+        "batch_write_calls": standin.calls["BatchWriteItem"],
+        "response_bytes": len(response["body"]),
+        "stored": len(standin.tables[dynamodb_handler.fizz_table.name].items),
+    }
+
+
+def run(sizes=(1000, 10000), latency=0.01, throttle=0.05):
+    results = {"latency": latency, "throttle": throttle}
+    for size in sizes:
+        body = json.loads(json.dumps(make_rasters(size, decimals=False)))
+        body = dynamodb_handler.parse_body({"body": json.dumps(body)})
+        results[f"rasters_{size}"] = {
+            "legacy": run_case(legacy_post_rasters, body, latency, throttle),
+            "bulk": run_case(dynamodb_handler.post_rasters, body, latency, throttle),
+        }
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.01)
+    parser.add_argument("--throttle", type=float, default=0.05)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    args = parser.parse_args()
+    print(json.dumps(run(args.sizes, args.latency, args.throttle), indent=2))
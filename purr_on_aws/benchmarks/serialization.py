@@ -0,0 +1,92 @@
+"""
+Per-item cost of response/request JSON handling, old (deep-copy) path vs the
+single-pass serializer. Run from purr_on_aws/:
+
+    python -m benchmarks.serialization
+"""
+
+import json
+import timeit
+from decimal import Decimal
+
+from benchmarks.common import make_rasters, make_repos
+
+# On the lambda path benchmarks.common sets up
+import dynamodb_handler  # noqa: E402
+
+
+class DecimalHandler(json.JSONEncoder):
+    # The handler's encoder before dumps_json, kept as the baseline
+    def default(self, o):
+        if isinstance(o, (Decimal, set, frozenset)):
+            return dynamodb_handler.json_default(o)
+        return super().default(o)
+
+    @classmethod
+    def encode_decimal(cls, data):
+        if isinstance(data, float):
+            return Decimal(str(data)) if not data.is_integer() else int(data)
+        if isinstance(data, dict):
+            return {k: cls.encode_decimal(v) for k, v in data.items()}
+        if isinstance(data, (list, tuple)):
+            return [cls.encode_decimal(item) for item in data]
+        return data
+
+    @classmethod
+    def decode_decimal(cls, data):
+        if isinstance(data, Decimal):
+            return int(data) if data % 1 == 0 else float(data)
+        if isinstance(data, dict):
+            return {k: cls.decode_decimal(v) for k, v in data.items()}
+        if isinstance(data, (list, tuple)):
+            return [cls.decode_decimal(item) for item in data]
+        return data
+
+
+def search_old(items):
+    return json.dumps(
+        {"data": DecimalHandler.decode_decimal(items)}, cls=DecimalHandler
+    )
+
+
+def search_new(items):
+    return dynamodb_handler.dumps_json({"data": items})
+
+
+def ingest_old(text):
+    return DecimalHandler.encode_decimal(json.loads(text))
+
+
+def ingest_new(text):
+    return dynamodb_handler.parse_body({"body": text})
+
+
+def per_item_us(func, arg, count, number):
+    seconds = min(timeit.repeat(lambda: func(arg), number=number, repeat=5))
+    return round(seconds / number / count * 1e6, 3)
+
+
+def run():
+    search_items = make_rasters(500)
+    repo_items = make_repos(50)
+    ingest_text = json.dumps(make_rasters(1000, decimals=False))
+
+    cases = {
+        "search_500": (search_old, search_new, search_items, 500, 20),
+        "repo_list_50": (search_old, search_new, repo_items, 50, 200),
+        "raster_ingest_1000": (ingest_old, ingest_new, ingest_text, 1000, 10),
+    }
+    results = {
+        "backend": "orjson" if dynamodb_handler.orjson else "json",
+        "unit": "us_per_item",
+    }
+    for name, (old, new, arg, count, number) in cases.items():
+        results[name] = {
+            "old": per_item_us(old, arg, count, number),
+            "new": per_item_us(new, arg, count, number),
+        }
+    return results
+
+
+if __name__ == "__main__":
+    print(json.dumps(run(), indent=2))
@@ -0,0 +1,398 @@
+"""
+End-to-end benchmark suite. Synthetic repos and wells (rasters with a skewed
+log type mix) are loaded into the stand-in, then dynamodb_handler.handler is
+driven with API Gateway proxy events for search (prefix counts, keyword
+selectivity, areas, depths, deep pagination), ingest and job polling. Each
+scenario reports latency percentiles, round trips, read units and items
+evaluated/returned. The JSON output of one revision can be passed back as
+--baseline to another to see the change per scenario. Run from purr_on_aws/:
+
+    python -m benchmarks.suite [--wells 500] [--segments 5] [--skew 1.2]
+        [--latency 0.002] [--repeat 20] [--output run.json] [--baseline old.json]
+"""
+
+import argparse
+import base64
+import contextlib
+import gzip
+import io
+import json
+import math
+import random
+import subprocess
+import threading
+import time
+from datetime import datetime, timezone
+
+from benchmarks.common import (
+    COUNTIES,
+    LOG_TYPES,
+    make_raster,
+    make_repos,
+    make_uwi,
+)
+from benchmarks.ingest import FIZZ_INDEXES, FIZZ_KEYS
+from tests.standin import StandIn
+
+# On the lambda path benchmarks.common sets up
+import dynamodb_handler  # noqa: E402
+
+LOAD_CHUNK = 1000
+INGEST_BATCH = 500
+JOB_STATUS_IDS = 100
+JOB_COMPLETE_AFTER = 0.05
+AREA = {"bbox": [-104, 31, -101, 33]}
+RADIUS = {"near": {"lat": 32, "lon": -102, "radiusKm": 100}}
+
+
+def api_event(method, path, body=None, query=None, path_params=None, **options):
+    # API Gateway REST proxy event, as the API's LambdaIntegration sends it
+    headers = {"origin": "http://localhost:3000", "content-type": "application/json"}
+    headers.update(options.get("headers", {}))
+    if body is not None and not isinstance(body, str):
+        body = json.dumps(body)
+    return {
+        "resource": path,
+        "path": path,
+        "httpMethod": method,
+        "headers": headers,
+        "queryStringParameters": query,
+        "pathParameters": path_params,
+        "requestContext": {"stage": "prod", "httpMethod": method, "path": path},
+        "body": body,
+        "isBase64Encoded": options.get("is_base64", False),
+    }
+
+
+def log_type_weights(skew):
+    # Zipf-like: the first log type is the most common
+    return [1 / (rank + 1) ** skew for rank in range(len(LOG_TYPES))]
+
+
+def make_wells(rng, wells, segments, skew):
+    weights = log_type_weights(skew)
+    rasters = []
+    for _ in range(wells):
+        uwi = make_uwi(rng)
+        log_types = rng.choices(LOG_TYPES, weights, k=segments)
+        for segment_num, log_type in enumerate(log_types):
+            raster = make_raster(rng, uwi, segment_num, False, log_type)
+            rasters.append(raster)
+    return rasters
+
+
+class Runner:
+    def __init__(self, standin, cold_search):
+        self.standin = standin
+        self.cold_search = cold_search
+
+    def invoke(self, event, cold=True):
+        # One handler call: (response, sample)
+        if cold and self.cold_search:
+            dynamodb_handler.search_cache.clear()
+        self.standin.reset_counters()
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            response = dynamodb_handler.handler(event, None)
+        elapsed = time.perf_counter() - started
+        totals = dynamodb_handler.metrics.totals
+        return response, {
+            "ms": elapsed * 1000,
+            "round_trips": sum(self.standin.calls.values()),
+            "read_units": sum(self.standin.read_units.values()),
+            "items_evaluated": totals["ItemsEvaluated"],
+            "items_returned": totals["ItemsReturned"],
+            "ok": response["statusCode"] < 300,
+        }
+
+    def call(self, event, cold=True):
+        response, sample = self.invoke(event, cold)
+        return json.loads(response["body"]), sample
+
+
+def percentile(values, share):
+    # Nearest rank
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(share * len(ordered)) - 1)]
+
+
+def summarize(samples):
+    latencies = [sample["ms"] for sample in samples]
+
+    def mean(name):
+        return round(sum(sample[name] for sample in samples) / len(samples), 1)
+
+    return {
+        "requests": len(samples),
+        "errors": sum(not sample["ok"] for sample in samples),
+        "p50_ms": round(percentile(latencies, 0.5), 2),
+        "p90_ms": round(percentile(latencies, 0.9), 2),
+        "p99_ms": round(percentile(latencies, 0.99), 2),
+        "max_ms": round(max(latencies), 2),
+        "round_trips": mean("round_trips"),
+        "read_units": mean("read_units"),
+        "items_evaluated": mean("items_evaluated"),
+        "items_returned": mean("items_returned"),
+    }
+
+
+##### SCENARIOS
+
+
+def search_scenarios(runner, rng, uwis, repeat, pages):
+    def search(body, cold=True):
+        return runner.call(api_event("POST", "/search", body), cold)
+
+    def run(make_body):
+        return summarize([search(make_body())[1] for _ in range(repeat)])
+
+    def depth_interval():
+        top = rng.randrange(0, 10000)
+        return [top, top + 200]
+
+    prefixes = sorted({uwi[:5] for uwi in uwis})
+    results = {}
+    for count in (1, 8, 32):
+        results[f"search_prefix_{count}"] = run(
+            lambda: {"uwis": rng.sample(prefixes, min(count, len(prefixes)))}
+        )
+    # Log types are Zipf-distributed, counties uniform
+    common, rare = LOG_TYPES[0].split()[0], LOG_TYPES[-1]
+    results["search_keyword_common"] = run(lambda: {"uwis": ["42"], "wordz": common})
+    results["search_keyword_rare"] = run(lambda: {"uwis": ["42"], "wordz": rare})
+    results["search_keyword_pair"] = run(
+        lambda: {"uwis": ["42"], "wordz": f"{common} {rng.choice(COUNTIES).lower()}"}
+    )
+    results["search_bbox"] = run(lambda: {"uwis": [], **AREA})
+    results["search_radius"] = run(lambda: {"uwis": [], **RADIUS})
+    results["search_depth"] = run(lambda: {"uwis": ["42"], "depth": depth_interval()})
+    results["search_projection"] = run(lambda: {"uwis": ["42"], "projection": "table"})
+    for sort in ("well_name", "calib_segment_top_depth"):
+        results[f"search_sorted_{sort}"] = run(
+            lambda: {
+                "uwis": rng.sample(prefixes, min(8, len(prefixes))),
+                "sortBy": sort,
+            }
+        )
+
+    # Deep pagination: every page of a broad search, each page one sample
+    samples = []
+    token = None
+    for _ in range(pages):
+        body, sample = search(
+            {"uwis": ["4"], "maxResults": 25, "paginationToken": token}
+        )
+        samples.append(sample)
+        token = body["metadata"]["paginationToken"]
+        if not token:
+            break
+    results["search_deep_pages"] = summarize(samples)
+
+    # The same search again and again: warm search cache
+    body = {"uwis": rng.sample(prefixes, min(8, len(prefixes))), "wordz": common}
+    search(body)
+    results["search_repeat_cached"] = summarize(
+        [search(body, cold=False)[1] for _ in range(repeat)]
+    )
+    return results
+
+
+def repo_scenarios(runner, repeat):
+    event = api_event("GET", "/repos")
+    return {"repos_list": summarize([runner.invoke(event)[1] for _ in range(repeat)])}
+
+
+def job_scenarios(runner, repeat):
+    def create(status="pending"):
+        body = {"ttl": int(time.time()) + 3600, "directive": "bench", "status": status}
+        return runner.call(api_event("POST", "/jobs", body))
+
+    def get(job_id, query=None):
+        event = api_event("GET", f"/jobs/{job_id}", query=query)
+        event["pathParameters"] = {"id": job_id}
+        return runner.call(event)
+
+    created = [create() for _ in range(repeat)]
+    ids = [body["id"] for body, _ in created]
+    results = {
+        "job_create": summarize([sample for _, sample in created]),
+        "job_get": summarize([get(job_id)[1] for job_id in ids]),
+    }
+
+    # Long poll answered by another writer's update, made straight on the
+    # stand-in so only the poll's own calls are counted
+    jobs = runner.standin.tables[dynamodb_handler.jobs_table.name]
+
+    def complete(job_id):
+        values = {
+            ":status": "completed",
+            ":now": datetime.now(timezone.utc).isoformat(),
+        }
+        jobs.update(
+            {"id": job_id}, "SET status = :status, updated_at = :now", {}, values
+        )
+
+    samples = []
+    for job_id in ids:
+        timer = threading.Timer(JOB_COMPLETE_AFTER, complete, (job_id,))
+        timer.start()
+        samples.append(get(job_id, {"wait": "5", "status": "pending"})[1])
+        timer.join()
+    results["job_long_poll"] = summarize(samples)
+
+    status_ids = (ids * math.ceil(JOB_STATUS_IDS / len(ids)))[:JOB_STATUS_IDS]
+    status_event = api_event("POST", "/jobs/status", {"ids": status_ids})
+    results["job_status_batch"] = summarize(
+        [runner.invoke(status_event)[1] for _ in range(repeat)]
+    )
+    return results
+
+
+def ingest_scenarios(runner, rng, segments, skew, repeat):
+    def batch():
+        wells = math.ceil(INGEST_BATCH / segments)
+        return json.loads(json.dumps(make_wells(rng, wells, segments, skew)))
+
+    json_samples, upsert_samples, ndjson_samples = [], [], []
+    for _ in range(repeat):
+        rasters = batch()
+        json_samples.append(runner.invoke(api_event("POST", "/rasters", rasters))[1])
+        upsert = api_event("POST", "/rasters", rasters, {"mode": "upsert"})
+        upsert_samples.append(runner.invoke(upsert)[1])
+
+        lines = "\n".join(json.dumps(raster) for raster in batch()).encode()
+        event = api_event(
+            "POST",
+            "/rasters",
+            base64.b64encode(gzip.compress(lines)).decode(),
+            headers={"content-type": "application/gzip"},
+            is_base64=True,
+        )
+        ndjson_samples.append(runner.invoke(event)[1])
+    return {
+        "ingest_json": summarize(json_samples),
+        "ingest_upsert_unchanged": summarize(upsert_samples),
+        "ingest_ndjson_gzip": summarize(ndjson_samples),
+    }
+
+
+##### SUITE
+
+
+def load_dataset(runner, rng, wells, segments, skew, repos):
+    rasters = json.loads(json.dumps(make_wells(rng, wells, segments, skew)))
+    for start in range(0, len(rasters), LOAD_CHUNK):
+        event = api_event("POST", "/rasters", rasters[start : start + LOAD_CHUNK])
+        runner.invoke(event)
+    for repo in json.loads(json.dumps(make_repos(repos), default=float)):
+        runner.invoke(api_event("POST", "/repos", repo))
+    return rasters
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline):
+    # Ratio of this run to the baseline for the headline numbers
+    for name, summary in results["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if not before:
+            continue
+        summary["vs_baseline"] = {
+            key: round(summary[key] / before[key], 3) if before[key] else None
+            for key in ("p50_ms", "p99_ms", "round_trips", "read_units")
+        }
+    results["baseline_revision"] = baseline.get("revision")
+    return results
+
+
+def run(
+    wells=500,
+    segments=5,
+    skew=1.2,
+    repos=20,
+    latency=0.002,
+    repeat=20,
+    pages=40,
+    seed=0,
+    cold_search=True,
+):
+    rng = random.Random(seed)
+    standin = StandIn()
+    standin.create_table(dynamodb_handler.fizz_table.name, FIZZ_KEYS, FIZZ_INDEXES)
+    standin.create_table(dynamodb_handler.jobs_table.name, ("id",))
+    standin.install(dynamodb_handler)
+    dynamodb_handler.search_cache_table = None
+    runner = Runner(standin, cold_search)
+
+    rasters = load_dataset(runner, rng, wells, segments, skew, repos)
+    uwis = sorted({raster["uwi"] for raster in rasters})
+    stored = len(standin.tables[dynamodb_handler.fizz_table.name].items)
+    standin.latency = latency
+
+    scenarios = {}
+    scenarios.update(search_scenarios(runner, rng, uwis, repeat, pages))
+    scenarios.update(repo_scenarios(runner, repeat))
+    scenarios.update(job_scenarios(runner, repeat))
+    # Last, as it grows the dataset
+    scenarios.update(ingest_scenarios(runner, rng, segments, skew, repeat))
+    return {
+        "revision": git_revision(),
+        "config": {
+            "wells": wells,
+            "segments": segments,
+            "skew": skew,
+            "repos": repos,
+            "latency": latency,
+            "repeat": repeat,
+            "seed": seed,
+            "cold_search": cold_search,
+        },
+        "dataset": {"rasters": len(rasters), "items": stored},
+        "scenarios": scenarios,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--wells", type=int, default=500)
+    parser.add_argument("--segments", type=int, default=5)
+    parser.add_argument("--skew", type=float, default=1.2)
+    parser.add_argument("--repos", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.002)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--warm-search", action="store_true")
+    parser.add_argument("--output")
+    parser.add_argument("--baseline")
+    args = parser.parse_args()
+
+    results = run(
+        args.wells,
+        args.segments,
+        args.skew,
+        args.repos,
+        args.latency,
+        args.repeat,
+        args.pages,
+        args.seed,
+        not args.warm_search,
+    )
+    if args.baseline:
+        with open(args.baseline) as f:
+            results = compare(results, json.load(f))
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
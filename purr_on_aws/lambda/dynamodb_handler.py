@@ -1,55 +1,443 @@
 import base64
+import functools
+import gzip
+import hashlib
+import hmac
+import io
+import itertools
 import json
+import math
 import os
+import random
+import re
+import threading
+import time
 import uuid
-from datetime import datetime, timezone
+import zlib
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from collections import Counter, OrderedDict, defaultdict, deque
+from datetime import datetime, timedelta, timezone
 from decimal import Decimal
 
 import boto3
-from boto3.dynamodb.conditions import Key
+from boto3.dynamodb.conditions import ConditionExpressionBuilder, Key
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+from botocore.config import Config
 from botocore.exceptions import ClientError
+from facet_store import (
+    FACET_ATTRIBUTES,
+    FACET_PREFIX_LENGTHS,
+    counts_of_counters,
+    counts_of_rasters,
+    facet_pk,
+    facet_summary,
+)
+from job_store import (
+    job_update_args,
+    load_payloads,
+    offload_payloads,
+    without_payloads,
+)
+
+try:
+    import orjson
+except ImportError:  # plain json is the fallback
+    orjson = None
 
 # Constants
 MAX_RESULTS = 500
 DEFAULT_RESULTS = 100
-VALID_RESOURCES = {"repo", "raster", "vector", "search", "job"}
+SEARCH_WORKERS = 16
+# botocore's default pool of 10 connections would queue the search fan-out
+MAX_POOL_CONNECTIONS = 2 * SEARCH_WORKERS
+# A prefix's streams are first read for an even share of the page plus a
+# margin; those that run dry before the page fills are read again
+STREAM_READ_MARGIN = 2
+SEARCH_TOKEN_VERSION = 4
+SIGNATURE_BYTES = 12
+EXHAUSTED = 0
+BATCH_GET_SIZE = 100
+BATCH_WRITE_SIZE = 25
+WRITE_WORKERS = 8
+MAX_WRITE_ATTEMPTS = 8
+# Ingest responses list at most this many rejected lines and failed keys
+MAX_REJECTED_REPORTED = 100
+MAX_FAILED_REPORTED = 100
+GZIP_MAGIC = b"\x1f\x8b"
+NDJSON_CONTENT_TYPES = {"application/x-ndjson", "application/gzip"}
+CHECKSUM_ATTRIBUTES = ("raster_checksum", "calib_checksum")
+INGEST_BUCKET_NAME = os.environ.get("INGEST_BUCKET_NAME", "")
+READ_AHEAD_MAX = 1000
+MIN_SELECTIVITY = 0.02
+SELECTIVITY_CACHE_SIZE = 1024
+WORD_PATTERN = re.compile(r"\w+")
+# A complete 14 digit UWI in a search is matched exactly; shorter ones
+# (10 digit well, 12 digit wellbore) are prefixes of their 14 digit forms
+FULL_UWI_PATTERN = re.compile(r"\d{14}")
+# Attributes search needs for cursors, keyword and area checks, whatever is
+# projected
+SEARCH_KEY_ATTRIBUTES = (
+    "pk",
+    "sk",
+    "uwi",
+    "wordz",
+    "geo_cell",
+    "geohash",
+    "surface_lat",
+    "surface_lon",
+    "calib_segment_top_depth",
+    "calib_segment_base_depth",
+)
+# NOTE: "table" should match dtRasterKeys in site/src/ts/raster.ts
+SEARCH_PROJECTIONS = {
+    "table": [
+        "sk",
+        "uwi",
+        "calib_checksum",
+        "calib_file_name",
+        "calib_log_depth_type",
+        "calib_log_depth_unit",
+        "calib_segment_base_depth",
+        "calib_segment_name",
+        "calib_segment_top_depth",
+        "calib_type",
+        "calib_vault_fs_path",
+        "raster_checksum",
+        "raster_file_name",
+        "raster_vault_fs_path",
+        "well_county",
+        "well_name",
+        "well_state",
+    ],
+}
+RASTER_SHARDS = 8
+RASTER_PARTITIONS = [f"RASTER#{n:02d}" for n in range(RASTER_SHARDS)]
+# Keyword and depth postings are spread over the same shards as their
+# rasters: "WORD#<token>#<nn>" and "DEPTH#<bucket>#<nn>"
+# Sorted searches read each write shard in order from a sort index, sort by
+# -> (index name, sort key attribute). Sort keys are "<value>\t<uwi>\t<sk>" so
+# ties break by UWI; depths are offset and zero-padded to sort as strings.
+SEARCH_SORTS = {
+    "well_name": ("pk-well-name-index", "sort_well_name"),
+    "calib_segment_top_depth": ("pk-depth-index", "sort_depth"),
+}
+SORT_KEY_SEPARATOR = "\t"
+SORT_DEPTH_OFFSET = 100000
+# A sorted search whose whole result is at most SORT_IN_MEMORY_MAX rows is
+# read as an unsorted one and sorted in memory; its token keeps the keys of
+# the rows still to return. Larger ones walk the sort indexes in rounds of at
+# most MAX_SORTED_EVALUATED items, split between the write shards, until the
+# page is full or MAX_SORTED_SECONDS have passed.
+SORT_IN_MEMORY_MAX = 500
+MAX_SORTED_EVALUATED = 2000
+MAX_SORTED_SECONDS = 10
+# Changed rasters and repos are indexed on change-index by day and write
+# shard (partition "<yyyy-mm-dd>#<pk>") and updated_at (sort). The feed
+# trails writes by CHANGE_SETTLE_SECONDS (beyond the API timeout) so that no
+# write stamped before a watermark lands after it.
+CHANGE_PARTITIONS = {"raster": RASTER_PARTITIONS, "repo": ["REPO"]}
+CHANGE_SETTLE_SECONDS = 60
+MAX_CHANGE_DAYS = 31
+MAX_CHANGE_STREAMS = 32
+# Surface locations are indexed on geo-cell-index by a coarse geohash cell
+# (partition) and a full geohash (sort). Area searches use at most
+# MAX_GEO_CELLS cells, no coarser than the partition cell.
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+GEOHASH_PRECISION = 9
+GEO_CELL_PRECISION = 3
+MAX_GEO_CELLS = 16
+EARTH_RADIUS_KM = 6371.0088
+# Segments are posted to every DEPTH#<bucket> their depths span. Intervals
+# needing more than MAX_DEPTH_BUCKETS buckets read the prefix instead.
+DEPTH_BUCKET_SIZE = 500
+MAX_DEPTH_BUCKETS = 4
+# GET /jobs/{id}?wait= re-reads with backoff until the job changes; API
+# Gateway gives up at 29s
+MAX_JOB_WAIT_SECONDS = 20
+MAX_JOB_STATUS_IDS = 500
+JOB_STATUS_ATTRIBUTES = ("id", "status", "updated_at")
+# GET /jobs/{id} returns a job's items and body once it has finished
+JOB_FINISHED_STATUSES = ("completed", "failed")
+READ_WORKERS = 8
+JOB_POLL_INTERVAL = 0.1
+JOB_POLL_MAX_INTERVAL = 2
+# Read-mostly endpoints (repo listings) are cached in the warm container.
+# Other containers' writes are seen within READ_CACHE_VERSION_SECONDS via a
+# version marker item {"pk": "VERSION", "sk": <scope>, "generation": n}.
+READ_CACHE_TTL_SECONDS = 300
+READ_CACHE_VERSION_SECONDS = 5
+READ_CACHE_SIZE = 256
+# Search responses are cached per raster generation: in memory, and in the
+# shared TTL table when SEARCH_CACHE_TABLE_NAME is set
+SEARCH_CACHE_TTL_SECONDS = 300
+SEARCH_CACHE_SIZE = 32
+MAX_SEARCH_CACHE_BYTES = 350 * 1024
+# One embedded-metric-format record is printed per invocation; send the
+# debug header to also get the totals back as X-Dynamo-* response headers
+METRICS_NAMESPACE = "Purr/Api"
+MAX_METRIC_VALUES = 100
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000)
+READ_OPERATIONS = {"Query", "Scan", "GetItem", "BatchGetItem"}
+DEBUG_HEADER = "x-purr-debug"
+# Prefixes without counters (see facet_store.py) are counted from their
+# rasters, at most MAX_FACET_COUNTED per request (split over the shard reads);
+# wider prefixes get partial counts marked truncated
+MAX_FACET_COUNTED = 8000
+VALID_RESOURCES = {"repo", "raster", "vector", "search", "job", "facet", "change"}
 ALLOWED_ORIGINS = {
     "http://localhost:3000",
     f"https://{os.environ['PURR_SUBDOMAIN']}.{os.environ['PURR_DOMAIN']}",
 }
 
 
-dynamodb = boto3.resource("dynamodb")
+dynamodb = boto3.resource(
+    "dynamodb", config=Config(max_pool_connections=MAX_POOL_CONNECTIONS)
+)
 
 fizz_table = dynamodb.Table(os.environ["FIZZ_TABLE_NAME"])  # type: ignore
 jobs_table = dynamodb.Table(os.environ["JOBS_TABLE_NAME"])  # type: ignore
+search_cache_table = (
+    dynamodb.Table(os.environ["SEARCH_CACHE_TABLE_NAME"])
+    if os.environ.get("SEARCH_CACHE_TABLE_NAME")
+    else None
+)
+
+# Hot read endpoints go through the low-level client and translate the wire
+# format straight to JSON-ready values, skipping the resource layer's Decimals
+dynamodb_client = dynamodb.meta.client
+LOW_LEVEL_READS = os.environ.get("LOW_LEVEL_READS", "true").lower() != "false"
+type_serializer = TypeSerializer()
+type_deserializer = TypeDeserializer()
+
+# Created on first staged ingest
+s3_client = None
+
+# Pagination token signing key, read on first use; see token_secret()
+search_token_secret = None
+
+# (token, uwi_prefix) -> share of postings that survive verification, kept
+# across invocations in a warm container to size the first read
+selectivity_cache = {}
+
+# (scope, endpoint key) -> (expires, value), least recently used first;
+# scope -> {"version": marker generation, "checked": monotonic time}
+read_cache = OrderedDict()
+read_cache_versions = {}
+read_cache_lock = threading.Lock()
+
+# search cache key -> (expires, response), least recently used first
+search_cache = OrderedDict()
+search_cache_stats = Counter()
+
+# DynamoDB calls of the current invocation; replaced by handler()
+metrics = None
+
+
+class Clock:
+    """
+    Wall and monotonic time for timestamps and long polls; tests swap in a
+    fake one.
+    """
+
+    def now(self):
+        return datetime.now(timezone.utc)
+
+    def monotonic(self):
+        return time.monotonic()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+
+clock = Clock()
+
+
+class SearchStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pages = 0
+        self.evaluated = 0
+        self.read_units = 0
+
+    def record(self, evaluated, read_units=0):
+        with self.lock:
+            self.pages += 1
+            self.evaluated += evaluated
+            self.read_units += read_units
+
+    def count_read_units(self, read_units):
+        with self.lock:
+            self.read_units += read_units
+
+
+def consumed_units(response):
+    # ReturnConsumedCapacity="TOTAL": one entry (Query, GetItem) or a list of
+    # them (BatchGetItem)
+    capacity = response.get("ConsumedCapacity") or []
+    if isinstance(capacity, dict):
+        capacity = [capacity]
+    return sum(entry.get("CapacityUnits", 0) for entry in capacity)
+
+
+def items_counted(operation, args, response):
+    # (items evaluated, items returned) by one call
+    if operation in {"Query", "Scan"}:
+        returned = response.get("Count", len(response.get("Items", [])))
+        return response.get("ScannedCount", returned), returned
+    if operation == "GetItem":
+        return 1, int("Item" in response)
+    if operation == "BatchGetItem":
+        requested = sum(len(r["Keys"]) for r in args["RequestItems"].values())
+        unprocessed = sum(
+            len(r["Keys"]) for r in (response.get("UnprocessedKeys") or {}).values()
+        )
+        returned = sum(len(found) for found in response["Responses"].values())
+        return requested - unprocessed, returned
+    return 0, 0
+
+
+def latency_bucket(ms):
+    for limit in LATENCY_BUCKETS_MS:
+        if ms <= limit:
+            return f"<={limit}ms"
+    return f">{LATENCY_BUCKETS_MS[-1]}ms"
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.totals = Counter()
+        self.operations = {}
+        self.latencies = []
+
+    def record(self, operation, seconds, args, response=None):
+        # response is None for a call that raised
+        ms = seconds * 1000
+        if response is None:
+            units, evaluated, returned = 0, 0, 0
+        else:
+            units = consumed_units(response)
+            evaluated, returned = items_counted(operation, args, response)
+        with self.lock:
+            self.totals["DynamoCalls"] += 1
+            self.totals["Pages"] += operation in {"Query", "Scan"}
+            if operation in READ_OPERATIONS:
+                self.totals["ReadUnits"] += units
+            else:
+                self.totals["WriteUnits"] += units
+            self.totals["ItemsEvaluated"] += evaluated
+            self.totals["ItemsReturned"] += returned
+            self.totals["DynamoErrors"] += response is None
+            summary = self.operations.setdefault(
+                operation, {"calls": 0, "ms": 0.0, "maxMs": 0.0, "histogram": Counter()}
+            )
+            summary["calls"] += 1
+            summary["ms"] += ms
+            summary["maxMs"] = max(summary["maxMs"], ms)
+            summary["histogram"][latency_bucket(ms)] += 1
+            self.latencies.append(round(ms, 2))
+
+    def count(self, name):
+        # Invocation events other than DynamoDB calls (cache hits, ...)
+        with self.lock:
+            self.totals[name] += 1
+
+    def record_json(self, resource, method, status_code):
+        # CloudWatch embedded metric format: the listed metrics are extracted
+        # from the log line, the rest stays searchable in Logs Insights
+        names = ["DynamoCalls", "Pages", "ReadUnits", "WriteUnits"]
+        names += ["ItemsEvaluated", "ItemsReturned", "DynamoErrors"]
+        names += ["ReadCacheHits", "ReadCacheMisses", "ReadCacheInvalidations"]
+        with self.lock:
+            record = {
+                "_aws": {
+                    "Timestamp": int(time.time() * 1000),
+                    "CloudWatchMetrics": [
+                        {
+                            "Namespace": METRICS_NAMESPACE,
+                            "Dimensions": [["Resource", "Method"]],
+                            "Metrics": [
+                                *({"Name": name, "Unit": "Count"} for name in names),
+                                {"Name": "DynamoLatency", "Unit": "Milliseconds"},
+                                {"Name": "Duration", "Unit": "Milliseconds"},
+                            ],
+                        }
+                    ],
+                },
+                "Resource": resource,
+                "Method": method,
+                "StatusCode": status_code,
+                **{name: self.totals[name] for name in names},
+                # Up to MAX_METRIC_VALUES per-call values; CloudWatch keeps
+                # the distribution for percentiles
+                "DynamoLatency": self.latencies[:MAX_METRIC_VALUES],
+                "Duration": round((time.perf_counter() - self.started) * 1000, 2),
+                "Operations": {
+                    operation: {
+                        **summary,
+                        "ms": round(summary["ms"], 2),
+                        "maxMs": round(summary["maxMs"], 2),
+                    }
+                    for operation, summary in self.operations.items()
+                },
+            }
+        return record
+
+
+def call_table(operation, call, **args):
+    """
+    Make one DynamoDB call (a client or Table method) with consumed capacity
+    returned, and record it in the invocation's metrics.
+    """
+    args.setdefault("ReturnConsumedCapacity", "TOTAL")
+    started = time.perf_counter()
+    try:
+        response = call(**args)
+    except Exception:
+        if metrics:
+            metrics.record(operation, time.perf_counter() - started, args)
+        raise
+    if metrics:
+        metrics.record(operation, time.perf_counter() - started, args, response)
+    return response
 
 
-class DecimalHandler(json.JSONEncoder):
-    def default(self, o):
-        if isinstance(o, Decimal):
-            return int(o) if o % 1 == 0 else float(o)
-        return super().default(o)
-
-    @classmethod
-    def encode_decimal(cls, data):
-        if isinstance(data, float):
-            return Decimal(str(data)) if not data.is_integer() else int(data)
-        if isinstance(data, dict):
-            return {k: cls.encode_decimal(v) for k, v in data.items()}
-        if isinstance(data, (list, tuple)):
-            return [cls.encode_decimal(item) for item in data]
-        return data
-
-    @classmethod
-    def decode_decimal(cls, data):
-        if isinstance(data, Decimal):
-            return int(data) if data % 1 == 0 else float(data)
-        if isinstance(data, dict):
-            return {k: cls.decode_decimal(v) for k, v in data.items()}
-        if isinstance(data, (list, tuple)):
-            return [cls.decode_decimal(item) for item in data]
-        return data
+def count_metric(name):
+    if metrics:
+        metrics.count(name)
+
+
+class MeteredTable:
+    # Table for shared code (job_store) whose calls go through call_table
+    def __init__(self, table):
+        self.table = table
+        self.name = table.name
+
+    def get_item(self, **args):
+        return call_table("GetItem", self.table.get_item, **args)
+
+    def put_item(self, **args):
+        return call_table("PutItem", self.table.put_item, **args)
+
+
+def json_default(o):
+    if isinstance(o, Decimal):
+        return int(o) if o % 1 == 0 else float(o)
+    if isinstance(o, (set, frozenset)):
+        return sorted(o)
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+def dumps_json(data):
+    # Decimals and sets are converted as they are met, without copying the
+    # item tree first
+    if orjson:
+        try:
+            return orjson.dumps(data, default=json_default).decode()
+        except TypeError:
+            pass
+    return json.dumps(data, default=json_default)
 
 
 def create_response(event, status_code, body, extra_headers=None):
@@ -58,7 +446,9 @@ def create_response(event, status_code, body, extra_headers=None):
     headers = {
         "Content-Type": "application/json",
         "Access-Control-Allow-Origin": cors_origin,
-        "Access-Control-Allow-Headers": "Content-Type,Authorization,X-Api-Key,token",
+        "Access-Control-Allow-Headers": (
+            "Content-Type,Authorization,X-Api-Key,token,X-Purr-Debug"
+        ),
         "Access-Control-Allow-Methods": "GET,POST,OPTIONS",
         "Access-Control-Allow-Credentials": "true",
     }
@@ -67,13 +457,11 @@ def create_response(event, status_code, body, extra_headers=None):
     return {
         "statusCode": status_code,
         "headers": headers,
-        "body": json.dumps(body, cls=DecimalHandler)
-        if not isinstance(body, str)
-        else body,
+        "body": dumps_json(body) if not isinstance(body, str) else body,
     }
 
 
-def get_resource_type(event):
+def get_path_parts(event):
     # Remove stage prefix if present
     path = event["path"]
     # Remove leading slash and split
@@ -81,6 +469,11 @@ def get_resource_type(event):
     # Find the resource part (after stage, e.g., 'prod')
     if parts[0] in {"prod", "dev", "test"}:  # or dynamically get stage name
         parts = parts[1:]
+    return parts
+
+
+def get_resource_type(event):
+    parts = get_path_parts(event)
     # If path is /jobs/123, parts = ['jobs', '123']
     if len(parts) >= 2 and parts[0] == "jobs" and parts[1]:
         return "job"
@@ -93,44 +486,668 @@ def is_valid_resource(resource_type):
     return resource_type in VALID_RESOURCES
 
 
+def get_header(event, name):
+    headers = event.get("headers") or {}
+    for key, value in headers.items():
+        if key.lower() == name:
+            return value or ""
+    return ""
+
+
+def is_ndjson(event):
+    content_type = get_header(event, "content-type").split(";")[0].strip().lower()
+    return content_type in NDJSON_CONTENT_TYPES
+
+
 def parse_body(event):
+    # Floats arrive as Decimal, ready for DynamoDB without encode_decimal
     try:
-        return json.loads(event["body"])
+        return json.loads(event["body"], parse_float=Decimal)
     except json.JSONDecodeError:
         raise ValueError("Invalid JSON format")
 
 
-def build_query_args(uwi_prefix, wordz, max_results, exclusive_start_key):
+def wire_number(n):
+    # int if integral, float otherwise
+    if "." not in n and "e" not in n and "E" not in n:
+        return int(n)
+    d = Decimal(n)
+    return int(d) if d % 1 == 0 else float(d)
+
+
+def wire_to_json(value):
+    kind, v = next(iter(value.items()))
+    if kind == "S":
+        return v
+    if kind == "N":
+        return wire_number(v)
+    if kind == "M":
+        return {k: wire_to_json(x) for k, x in v.items()}
+    if kind == "L":
+        return [wire_to_json(x) for x in v]
+    if kind == "BOOL":
+        return v
+    if kind == "NULL":
+        return None
+    if kind == "SS":
+        return sorted(v)
+    if kind == "NS":
+        return sorted(wire_number(x) for x in v)
+    if kind == "B":
+        return base64.b64encode(v).decode()
+    if kind == "BS":
+        return sorted(base64.b64encode(x).decode() for x in v)
+    raise ValueError(f"Unknown DynamoDB type: {kind}")
+
+
+def wire_item_to_json(item):
+    return {k: wire_to_json(v) for k, v in item.items()}
+
+
+def to_wire(item):
+    return {k: type_serializer.serialize(v) for k, v in item.items()}
+
+
+def from_wire(item):
+    return {k: type_deserializer.deserialize(v) for k, v in item.items()}
+
+
+def query_items(table, **query_args):
+    """
+    table.query() that returns JSON-ready items when LOW_LEVEL_READS is on.
+    Keys (ExclusiveStartKey, LastEvaluatedKey) stay in resource form.
+    """
+    if not LOW_LEVEL_READS:
+        return call_table("Query", table.query, **query_args)
+
+    builder = ConditionExpressionBuilder()
+    names = dict(query_args.pop("ExpressionAttributeNames", {}))
+    values = dict(query_args.pop("ExpressionAttributeValues", {}))
+    for arg in ("KeyConditionExpression", "FilterExpression"):
+        condition = query_args.get(arg)
+        if condition is not None and not isinstance(condition, str):
+            built = builder.build_expression(
+                condition, is_key_condition=arg == "KeyConditionExpression"
+            )
+            query_args[arg] = built.condition_expression
+            names.update(built.attribute_name_placeholders)
+            values.update(built.attribute_value_placeholders)
+    if names:
+        query_args["ExpressionAttributeNames"] = names
+    if values:
+        query_args["ExpressionAttributeValues"] = to_wire(values)
+    if "ExclusiveStartKey" in query_args:
+        query_args["ExclusiveStartKey"] = to_wire(query_args["ExclusiveStartKey"])
+
+    response = call_table(
+        "Query", dynamodb_client.query, TableName=table.name, **query_args
+    )
+    response["Items"] = [wire_item_to_json(item) for item in response["Items"]]
+    if "LastEvaluatedKey" in response:
+        response["LastEvaluatedKey"] = from_wire(response["LastEvaluatedKey"])
+    return response
+
+
+def get_item(table, key, **kwargs):
+    if not LOW_LEVEL_READS:
+        return call_table("GetItem", table.get_item, Key=key, **kwargs).get("Item")
+    response = call_table(
+        "GetItem",
+        dynamodb_client.get_item,
+        TableName=table.name,
+        Key=to_wire(key),
+        **kwargs,
+    )
+    return wire_item_to_json(response["Item"]) if "Item" in response else None
+
+
+def raster_shard(uwi):
+    return zlib.crc32(uwi.encode()) % RASTER_SHARDS
+
+
+def raster_partition(uwi):
+    return RASTER_PARTITIONS[raster_shard(uwi)]
+
+
+def posting_pk(posting_key, uwi):
+    return f"{posting_key}#{raster_shard(uwi):02d}"
+
+
+def posting_partitions(posting_key, uwi_prefix):
+    # A full UWI's postings are all on its raster's shard
+    if is_full_uwi(uwi_prefix):
+        return [posting_pk(posting_key, uwi_prefix)]
+    return [f"{posting_key}#{n:02d}" for n in range(RASTER_SHARDS)]
+
+
+def sort_value(record, sort):
+    if sort == "well_name":
+        return " ".join(str(record.get("well_name") or "").lower().split())
+    depths = raster_depths(record)
+    return f"{max(depths[0] + SORT_DEPTH_OFFSET, 0):016.3f}" if depths else ""
+
+
+def sort_attributes(record):
+    # Rasters missing a sort value sort first
+    if not record.get("uwi"):
+        return {}
+    return {
+        attribute: SORT_KEY_SEPARATOR.join(
+            [sort_value(record, sort), record["uwi"], record["sk"]]
+        )
+        for sort, (_, attribute) in SEARCH_SORTS.items()
+    }
+
+
+def index_raster(record):
+    # Loaders post rasters under pk "RASTER"; spread them over write shards and
+    # add the geo-cell-index and sort index keys
+    record = {**record, **geo_attributes(record)}
+    if record.get("uwi") and record["pk"] == "RASTER":
+        record["pk"] = raster_partition(record["uwi"])
+    if record["pk"] in RASTER_PARTITIONS:
+        record.update(sort_attributes(record))
+    return record
+
+
+def build_query_args(
+    uwi_prefix,
+    partition,
+    max_results,
+    exclusive_start_key,
+    projection=None,
+    exact=False,
+):
+    uwi_condition = Key("uwi").eq if exact else Key("uwi").begins_with
     query_args = {
         "IndexName": "pk-uwi-index",
-        "KeyConditionExpression": Key("pk").eq("RASTER")
-        & Key("uwi").begins_with(uwi_prefix),
+        "KeyConditionExpression": Key("pk").eq(partition) & uwi_condition(uwi_prefix),
         "Limit": max_results,
+        "ReturnConsumedCapacity": "TOTAL",
     }
-    if wordz:
-        query_args["FilterExpression"] = "contains(wordz, :wordz)"
-        query_args["ExpressionAttributeValues"] = {":wordz": wordz.lower()}
     if exclusive_start_key:
         query_args["ExclusiveStartKey"] = exclusive_start_key
+    if projection:
+        query_args.update(projection)
     return query_args
 
 
+def build_sort_query_args(
+    partition, sort, max_results, exclusive_start_key, projection=None, after=None
+):
+    index_name, attribute = SEARCH_SORTS[sort]
+    key_condition = Key("pk").eq(partition)
+    if after:
+        key_condition &= Key(attribute).gt(after)
+    query_args = {
+        "IndexName": index_name,
+        "KeyConditionExpression": key_condition,
+        "Limit": max_results,
+        "ReturnConsumedCapacity": "TOTAL",
+    }
+    if exclusive_start_key:
+        query_args["ExclusiveStartKey"] = exclusive_start_key
+    if projection:
+        query_args.update(projection)
+    return query_args
+
+
+def parse_search_sort(body):
+    # "sortBy": "uwi" (the default) or a SEARCH_SORTS name, ascending
+    sort = body.get("sortBy") or "uwi"
+    if sort == "uwi":
+        return None
+    if sort not in SEARCH_SORTS:
+        raise ValueError(f"sortBy must be one of: {', '.join(['uwi', *SEARCH_SORTS])}")
+    return sort
+
+
+def parse_max_results(value):
+    # maxResults of a search or changes page: an integer from 1, capped
+    try:
+        if isinstance(value, bool) or not isinstance(value, (int, str)):
+            raise ValueError
+        max_results = int(value)
+        if max_results < 1:
+            raise ValueError
+    except ValueError:
+        raise ValueError("maxResults must be an integer of at least 1")
+    return min(max_results, MAX_RESULTS)
+
+
+def parse_search_fields(body):
+    fields = body.get("fields")
+    projection_name = body.get("projection")
+    if projection_name:
+        if projection_name not in SEARCH_PROJECTIONS:
+            raise ValueError(f"Unknown projection: {projection_name}")
+        fields = SEARCH_PROJECTIONS[projection_name]
+    if fields is None:
+        return None
+    if not isinstance(fields, list) or not all(
+        isinstance(field, str) and field for field in fields
+    ):
+        raise ValueError("fields must be a list of attribute names")
+    return list(dict.fromkeys(fields))
+
+
+def build_projection(fields, key_attributes=SEARCH_KEY_ATTRIBUTES):
+    if not fields:
+        return None
+    names = list(dict.fromkeys([*fields, *key_attributes]))
+    return {
+        "ProjectionExpression": ", ".join(f"#f{i}" for i in range(len(names))),
+        "ExpressionAttributeNames": {f"#f{i}": name for i, name in enumerate(names)},
+    }
+
+
+def build_geo_query_args(cell, max_results, exclusive_start_key, projection=None):
+    query_args = {
+        "IndexName": "geo-cell-index",
+        "KeyConditionExpression": Key("geo_cell").eq(cell[:GEO_CELL_PRECISION])
+        & Key("geohash").begins_with(cell),
+        "Limit": max_results,
+        "ReturnConsumedCapacity": "TOTAL",
+    }
+    if exclusive_start_key:
+        query_args["ExclusiveStartKey"] = exclusive_start_key
+    if projection:
+        query_args.update(projection)
+    return query_args
+
+
+def build_posting_query_args(posting_pk, uwi_prefix, max_results, exclusive_start_key):
+    query_args = {
+        "KeyConditionExpression": Key("pk").eq(posting_pk)
+        & Key("sk").begins_with(uwi_prefix),
+        "Limit": max_results,
+        "ReturnConsumedCapacity": "TOTAL",
+    }
+    if exclusive_start_key:
+        query_args["ExclusiveStartKey"] = exclusive_start_key
+    return query_args
+
+
+def tokenize(text):
+    return set(WORD_PATTERN.findall(str(text).lower())) if text else set()
+
+
+def driver_token(tokens):
+    # Longest token is the cheapest guess at the rarest posting list
+    return max(tokens, key=lambda token: (len(token), token))
+
+
+def depth_bucket(depth):
+    return math.floor(depth / DEPTH_BUCKET_SIZE)
+
+
+def segment_depths(item, top_name, base_name):
+    try:
+        top, base = float(item[top_name]), float(item[base_name])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if not (math.isfinite(top) and math.isfinite(base) and top <= base):
+        return None
+    return top, base
+
+
+def first_overlap_bucket(depths, depth):
+    # The one bucket a segment is reported from, so that segments spanning
+    # several searched buckets come back once
+    if not depths or depths[0] > depth[1] or depths[1] < depth[0]:
+        return None
+    return max(depth_bucket(depths[0]), depth_bucket(depth[0]))
+
+
+def raster_depths(item):
+    return segment_depths(item, "calib_segment_top_depth", "calib_segment_base_depth")
+
+
+def posting_items(item):
+    if not item.get("uwi"):
+        return []
+    target = {
+        "sk": f"{item['uwi']}#{item['sk']}",
+        "raster_pk": item["pk"],
+        "raster_sk": item["sk"],
+    }
+    postings = [
+        {"pk": posting_pk(f"WORD#{token}", item["uwi"]), **target}
+        for token in sorted(tokenize(item.get("wordz")))
+    ]
+    depths = raster_depths(item)
+    if depths:
+        postings.extend(
+            {
+                "pk": posting_pk(f"DEPTH#{bucket}", item["uwi"]),
+                **target,
+                "top_depth": item["calib_segment_top_depth"],
+                "base_depth": item["calib_segment_base_depth"],
+            }
+            for bucket in range(depth_bucket(depths[0]), depth_bucket(depths[1]) + 1)
+        )
+    return postings
+
+
+def posting_matches(posting, raster):
+    # A posting is current only while its raster still carries the UWI it was
+    # written under; one left behind by a re-keyed raster points at a raster
+    # that now lives under (and is posted for) another UWI
+    uwi = posting["sk"][: -len(posting["raster_sk"]) - 1]
+    return raster.get("uwi") == uwi
+
+
+def geohash_bits(precision):
+    # (longitude bits, latitude bits); geohash interleaves from longitude
+    bits = 5 * precision
+    return (bits + 1) // 2, bits // 2
+
+
+def geo_cell_index(lat, lon, precision):
+    lon_bits, lat_bits = geohash_bits(precision)
+    return (
+        min(int((lat + 90) / 180 * 2**lat_bits), 2**lat_bits - 1),
+        min(int((lon + 180) / 360 * 2**lon_bits), 2**lon_bits - 1),
+    )
+
+
+def encode_geo_cell(lat_index, lon_index, precision):
+    lon_bits, lat_bits = geohash_bits(precision)
+    value = 0
+    for bit in range(5 * precision):
+        if bit % 2 == 0:
+            lon_bits -= 1
+            value = value << 1 | lon_index >> lon_bits & 1
+        else:
+            lat_bits -= 1
+            value = value << 1 | lat_index >> lat_bits & 1
+    return "".join(
+        GEOHASH_ALPHABET[value >> shift & 31]
+        for shift in range(5 * (precision - 1), -1, -5)
+    )
+
+
+def geohash(lat, lon, precision=GEOHASH_PRECISION):
+    return encode_geo_cell(*geo_cell_index(lat, lon, precision), precision)
+
+
+def geo_attributes(record):
+    # Rasters without a usable surface location are stored but not indexed
+    try:
+        lat = float(record["surface_lat"])
+        lon = float(record["surface_lon"])
+    except (KeyError, TypeError, ValueError):
+        return {}
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return {}
+    cell = geohash(lat, lon)
+    return {"geo_cell": cell[:GEO_CELL_PRECISION], "geohash": cell}
+
+
+def backoff(attempt):
+    # Exponential with jitter: ~25ms, 50ms, 100ms ... capped at 1s
+    time.sleep(min(0.025 * 2 ** (attempt - 1), 1) * random.uniform(0.5, 1))
+
+
+def dedupe_keys(keys):
+    return list({(k["pk"], k["sk"]): k for k in keys}.values())
+
+
+def batch_get_chunk(table, keys, projection=None, consistent=False, stats=None):
+    # One BatchGetItem chunk, retrying UnprocessedKeys with backoff. Read
+    # units go to stats when given.
+    request = {table.name: {"Keys": keys, **(projection or {})}}
+    if consistent:
+        request[table.name]["ConsistentRead"] = True
+    if LOW_LEVEL_READS:
+        request[table.name]["Keys"] = [to_wire(key) for key in keys]
+    items = []
+    attempt = 0
+    while request:
+        if attempt:
+            backoff(attempt)
+        if LOW_LEVEL_READS:
+            response = call_table(
+                "BatchGetItem", dynamodb_client.batch_get_item, RequestItems=request
+            )
+            found = response["Responses"].get(table.name, [])
+            items.extend(wire_item_to_json(item) for item in found)
+        else:
+            response = call_table(
+                "BatchGetItem", dynamodb.batch_get_item, RequestItems=request
+            )
+            items.extend(response["Responses"].get(table.name, []))
+        if stats:
+            stats.count_read_units(consumed_units(response))
+        request = response.get("UnprocessedKeys")
+        attempt += 1
+    return items
+
+
+def batch_get_items(
+    table, keys, projection=None, consistent=False, workers=1, stats=None
+):
+    chunks = [
+        keys[start : start + BATCH_GET_SIZE]
+        for start in range(0, len(keys), BATCH_GET_SIZE)
+    ]
+    if workers > 1 and len(chunks) > 1:
+        with ThreadPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+            results = pool.map(
+                lambda chunk: batch_get_chunk(
+                    table, chunk, projection, consistent, stats
+                ),
+                chunks,
+            )
+            return [item for found in results for item in found]
+    return [
+        item
+        for chunk in chunks
+        for item in batch_get_chunk(table, chunk, projection, consistent, stats)
+    ]
+
+
+def write_chunk(table_name, requests):
+    # One BatchWriteItem chunk, retrying UnprocessedItems with backoff.
+    # Returns the requests still unwritten after MAX_WRITE_ATTEMPTS.
+    attempt = 0
+    while requests:
+        if attempt >= MAX_WRITE_ATTEMPTS:
+            return requests
+        if attempt:
+            backoff(attempt)
+        try:
+            response = call_table(
+                "BatchWriteItem",
+                dynamodb_client.batch_write_item,
+                RequestItems={table_name: requests},
+            )
+        except ClientError as err:
+            print(f"Batch write FAIL! Error Code: {err.response['Error']['Code']}")
+            print(f"{err.response['Error']['Message']}")
+            return requests
+        requests = response.get("UnprocessedItems", {}).get(table_name, [])
+        attempt += 1
+    return []
+
+
+class DeleteKey(dict):
+    """
+    Key of an item for stream_write_items to delete rather than put.
+    """
+
+
+def write_request(item):
+    if isinstance(item, DeleteKey):
+        return {"DeleteRequest": {"Key": to_wire(item)}}
+    return {"PutRequest": {"Item": to_wire(item)}}
+
+
+def request_key(request):
+    if "DeleteRequest" in request:
+        return request["DeleteRequest"]["Key"]
+    return request["PutRequest"]["Item"]
+
+
+def request_kind(request):
+    # Deletes are counted apart from the items put
+    if "DeleteRequest" in request:
+        return "DELETED"
+    return request["PutRequest"]["Item"]["pk"]["S"].split("#", 1)[0]
+
+
+def stream_write_items(table, items, key_names=("pk", "sk")):
+    """
+    Put items from any iterable in concurrent 25-item BatchWriteItem chunks
+    (a DeleteKey deletes instead). Chunks are sent as soon as they fill, with
+    at most 2 * WRITE_WORKERS in flight, so writes start before the input is
+    exhausted and memory stays flat. Returns a Counter of items written by
+    kind (the pk before its first "#": RASTER, WORD, ..., or DELETED) and the
+    keys that could not be written.
+    """
+    written = Counter()
+    failed = []
+    in_flight = {}
+
+    def settle(futures):
+        for future in futures:
+            leftover = future.result()
+            written.update(request_kind(r) for r in in_flight.pop(future))
+            written.subtract(request_kind(r) for r in leftover)
+            failed.extend(
+                {k: type_deserializer.deserialize(request_key(r)[k]) for k in key_names}
+                for r in leftover
+            )
+
+    with ThreadPoolExecutor(max_workers=WRITE_WORKERS) as pool:
+
+        def flush(chunk):
+            if len(in_flight) >= 2 * WRITE_WORKERS:
+                settle(wait(in_flight, return_when=FIRST_COMPLETED).done)
+            requests = list(chunk.values())
+            in_flight[pool.submit(write_chunk, table.name, requests)] = requests
+
+        # Keys are unique within a chunk, as BatchWriteItem requires
+        chunk = {}
+        for item in items:
+            key = tuple(item[k] for k in key_names)
+            chunk[key] = write_request(item)
+            if len(chunk) == BATCH_WRITE_SIZE:
+                flush(chunk)
+                chunk = {}
+        if chunk:
+            flush(chunk)
+        settle(wait(in_flight).done)
+
+    return written, failed
+
+
+def bulk_write_items(table, items, key_names=("pk", "sk")):
+    # Later duplicates of a key win, as with batch_writer(overwrite_by_pkeys)
+    unique = {tuple(item[k] for k in key_names): item for item in items}
+    return stream_write_items(table, unique.values(), key_names)
+
+
 ###############################################################################
 
+##### READ CACHE
+
+
+def read_cache_key(event):
+    # Endpoint + query parameters
+    params = event.get("queryStringParameters") or {}
+    return (event.get("path"), tuple(sorted(params.items())))
+
+
+def drop_cached_reads(scope):
+    for key in [key for key in read_cache if key[0] == scope]:
+        del read_cache[key]
+
+
+def check_read_version(scope, now):
+    # Drop the scope if its version marker moved since the last look.
+    # Returns the scope's generation.
+    seen = read_cache_versions.get(scope)
+    if seen and now - seen["checked"] < READ_CACHE_VERSION_SECONDS:
+        return seen["version"]
+    marker = get_item(
+        fizz_table,
+        {"pk": "VERSION", "sk": scope},
+        ProjectionExpression="generation",
+    )
+    version = int((marker or {}).get("generation", 0))
+    with read_cache_lock:
+        if seen is not None and seen["version"] != version:
+            drop_cached_reads(scope)
+            count_metric("ReadCacheInvalidations")
+        read_cache_versions[scope] = {"version": version, "checked": now}
+    return version
+
+
+def cached_read(scope, key, load):
+    """
+    load() through the warm-container cache. Entries expire after
+    READ_CACHE_TTL_SECONDS and are dropped early by invalidate_reads(scope)
+    here or by a newer version marker from another container.
+    """
+    now = time.monotonic()
+    check_read_version(scope, now)
+    with read_cache_lock:
+        entry = read_cache.get((scope, key))
+        if entry and entry[0] > now:
+            read_cache.move_to_end((scope, key))
+            count_metric("ReadCacheHits")
+            return entry[1]
+    count_metric("ReadCacheMisses")
+
+    value = load()
+    with read_cache_lock:
+        read_cache[(scope, key)] = (now + READ_CACHE_TTL_SECONDS, value)
+        read_cache.move_to_end((scope, key))
+        while len(read_cache) > READ_CACHE_SIZE:
+            read_cache.popitem(last=False)
+    return value
+
+
+def invalidate_reads(scope):
+    # Call after a write to the scope: clears this container at once and
+    # bumps the marker's generation so other containers follow
+    response = call_table(
+        "UpdateItem",
+        fizz_table.update_item,
+        Key={"pk": "VERSION", "sk": scope},
+        UpdateExpression="ADD generation :one SET updated_at = :now",
+        ExpressionAttributeValues={
+            ":one": 1,
+            ":now": datetime.now(timezone.utc).isoformat(),
+        },
+        ReturnValues="UPDATED_NEW",
+    )
+    version = int(response["Attributes"]["generation"])
+    with read_cache_lock:
+        drop_cached_reads(scope)
+        read_cache_versions[scope] = {"version": version, "checked": time.monotonic()}
+    count_metric("ReadCacheInvalidations")
+
+
 ##### REPO
 
 
+def list_repos():
+    response = query_items(fizz_table, KeyConditionExpression=Key("pk").eq("REPO"))
+    return response["Items"]
+
+
 def get_repos(event):
-    response = fizz_table.query(KeyConditionExpression=Key("pk").eq("REPO"))
-    decoded_items = DecimalHandler.decode_decimal(response["Items"])
-    return create_response(event, 200, decoded_items)
+    items = cached_read("REPO", read_cache_key(event), list_repos)
+    return create_response(event, 200, items)
 
 
 def post_repo(event, body):
-    now = datetime.now(timezone.utc).isoformat()
-    item = {**body, "created_at": now, "updated_at": now}
-    encoded_item = DecimalHandler.encode_decimal(item)
-    fizz_table.put_item(Item=encoded_item)
+    now = clock.now().isoformat()
+    item = stamped(body, now, now)
+    call_table("PutItem", fizz_table.put_item, Item=item)
+    invalidate_reads("REPO")
 
     return create_response(
         event,
@@ -147,30 +1164,232 @@ def post_repo(event, body):
 ##### RASTER
 
 
+def is_upsert(event):
+    query_params = event.get("queryStringParameters") or {}
+    return query_params.get("mode", "").lower() == "upsert"
+
+
+def checksums_match(current, record):
+    present = [k for k in CHECKSUM_ATTRIBUTES if record.get(k) is not None]
+    return bool(present) and all(current.get(k) == record[k] for k in present)
+
+
+def change_bucket(pk, updated_at):
+    return f"{updated_at[:10]}#{pk}"
+
+
+def stamped(record, created_at, updated_at):
+    # Timestamps plus the change-index partition for the feed
+    return {
+        **record,
+        "created_at": created_at,
+        "updated_at": updated_at,
+        "change_bucket": change_bucket(record.get("pk"), updated_at),
+    }
+
+
+def raster_copies(batch, projection):
+    # The stored items under each record's sk, on any write shard (or under
+    # the record's own pk), by sk
+    keys = dedupe_keys(
+        [
+            {"pk": pk, "sk": r["sk"]}
+            for r in batch
+            for pk in [r["pk"], *RASTER_PARTITIONS]
+        ]
+    )
+    copies = defaultdict(list)
+    for item in batch_get_items(fizz_table, keys, projection):
+        copies[item["sk"]].append(item)
+    return copies
+
+
+def stale_keys(record, replaced):
+    # Keys of the replaced items, and of their postings, that record does not
+    # write over
+    kept = {(item["pk"], item["sk"]) for item in [record, *posting_items(record)]}
+    return [
+        DeleteKey(pk=item["pk"], sk=item["sk"])
+        for old in replaced
+        for item in [old, *posting_items(old)]
+        if (item["pk"], item["sk"]) not in kept
+    ]
+
+
+def stamp_rasters(records, now, counts, upsert=False):
+    """
+    Yield (record, stale keys) with records stamped with created_at/updated_at.
+    The stored items under each record's sk are batch-read first, on every
+    write shard: a raster re-posted under another UWI leaves its old item and
+    postings behind as stale keys to delete. In upsert mode records whose
+    checksums match are skipped and updated ones keep their original
+    created_at.
+    """
+    records = iter(records)
+    projection = build_projection(["created_at", *CHECKSUM_ATTRIBUTES])
+    while True:
+        batch = [index_raster(r) for r in itertools.islice(records, BATCH_GET_SIZE)]
+        if not batch:
+            return
+        counts["received"] += len(batch)
+        copies = raster_copies(batch, projection)
+        for record in batch:
+            current = None
+            replaced = []
+            for item in copies[record["sk"]]:
+                if item["pk"] == record["pk"]:
+                    current = item
+                if item["pk"] != record["pk"] or item.get("uwi") != record.get("uwi"):
+                    replaced.append(item)
+            stale = stale_keys(record, replaced)
+            if not upsert:
+                yield stamped(record, now, now), stale
+            elif current is None and not replaced:
+                counts["inserted"] += 1
+                yield stamped(record, now, now), stale
+            elif not replaced and checksums_match(current, record):
+                counts["skipped"] += 1
+            else:
+                counts["updated"] += 1
+                created_at = (current or replaced[0]).get("created_at", now)
+                yield stamped(record, created_at, now), stale
+
+
+def ingest_summary(counts, written, failed, upsert):
+    postings = sum(written.values()) - written["RASTER"] - written["DELETED"]
+    summary = {
+        "resource_type": "raster",
+        "count": counts["received"],
+        "written": written["RASTER"],
+        "postingsWritten": postings,
+        "deleted": written["DELETED"],
+        "failedCount": len(failed),
+        "failed": failed[:MAX_FAILED_REPORTED],
+    }
+    if upsert:
+        summary.update({k: counts[k] for k in ("inserted", "updated", "skipped")})
+    return summary
+
+
 def post_rasters(event, body):
     if not isinstance(body, list):
         raise ValueError("Request body must be an array")
+    if not all(
+        isinstance(item, dict) and "pk" in item and "sk" in item for item in body
+    ):
+        raise ValueError("Each raster must be an object with pk and sk")
+
+    query_params = event.get("queryStringParameters") or {}
+    echo = query_params.get("echo", "").lower() == "true"
+    upsert = is_upsert(event)
+
+    now = clock.now().isoformat()
+    counts = Counter()
+    stamped_rasters = list(stamp_rasters(body, now, counts, upsert))
+    rasters = [o for o, _ in stamped_rasters]
+    postings = [posting for o in rasters for posting in posting_items(o)]
+    stale = [key for _, keys in stamped_rasters for key in keys]
+
+    written, failed = bulk_write_items(fizz_table, rasters + postings + stale)
+    if sum(written.values()):
+        invalidate_reads("RASTER")
+
+    response_body = {
+        "message": (
+            f"Failed to write {len(failed)} item(s)"
+            if failed
+            else f"Successfully wrote {len(rasters)} of {len(body)} raster(s)"
+        ),
+        **ingest_summary(counts, written, failed, upsert),
+    }
+    if echo:
+        response_body["items"] = rasters
+
+    return create_response(event, 207 if failed else 201, response_body)
+
+
+def ndjson_stream(event):
+    # NDJSON body, optionally gzipped (sent base64 via binaryMediaTypes)
+    body = event.get("body") or ""
+    raw = base64.b64decode(body) if event.get("isBase64Encoded") else body.encode()
+    if raw[:2] == GZIP_MAGIC:
+        return gzip.GzipFile(fileobj=io.BytesIO(raw))
+    return io.BytesIO(raw)
+
+
+def staged_stream(source):
+    # NDJSON object staged in the ingest bucket, read as a stream
+    global s3_client
+    if not INGEST_BUCKET_NAME:
+        raise ValueError("Staged ingest is not configured")
+    if not isinstance(source, dict) or not source.get("key"):
+        raise ValueError("source must be an object with a key")
+    if source.get("bucket", INGEST_BUCKET_NAME) != INGEST_BUCKET_NAME:
+        raise ValueError(f"source bucket must be {INGEST_BUCKET_NAME}")
+
+    if s3_client is None:
+        s3_client = boto3.client("s3")
+    try:
+        response = s3_client.get_object(Bucket=INGEST_BUCKET_NAME, Key=source["key"])
+    except ClientError as err:
+        if err.response["Error"]["Code"] in {"NoSuchKey", "AccessDenied"}:
+            raise ValueError(f"Staged object not found: {source['key']}")
+        raise
+
+    if (
+        source["key"].endswith(".gz")
+        or response.get("ContentEncoding") == "gzip"
+        or response.get("ContentType") == "application/gzip"
+    ):
+        return gzip.GzipFile(fileobj=response["Body"])
+    return response["Body"].iter_lines()
+
+
+def ndjson_records(lines, rejected):
+    for line_number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line, parse_float=Decimal)
+        except ValueError:
+            rejected.append({"line": line_number, "error": "Invalid JSON"})
+            continue
+        if not isinstance(record, dict) or "pk" not in record or "sk" not in record:
+            rejected.append({"line": line_number, "error": "Missing pk or sk"})
+            continue
+        yield record
 
-    return_items = []
 
-    with fizz_table.batch_writer() as batch:
-        for item in body:
-            now = datetime.now(timezone.utc).isoformat()
-            o = {**item, "created_at": now, "updated_at": now}
+def post_rasters_ndjson(event, lines):
+    now = clock.now().isoformat()
+    upsert = is_upsert(event)
+    rejected = []
+    counts = Counter()
 
-            encoded_item = DecimalHandler.encode_decimal(o)
-            batch.put_item(Item=encoded_item)
+    def write_items():
+        records = ndjson_records(lines, rejected)
+        for o, stale in stamp_rasters(records, now, counts, upsert):
+            yield o
+            yield from posting_items(o)
+            yield from stale
 
-            return_items.append(o)
+    written, failed = stream_write_items(fizz_table, write_items())
+    if sum(written.values()):
+        invalidate_reads("RASTER")
 
     return create_response(
         event,
-        201,
+        207 if failed or rejected else 201,
         {
-            "message": f"Successfully created {len(body)} raster(s)",
-            "resource_type": "raster",
-            "count": len(body),
-            "items": return_items,
+            "message": (
+                f"Read {counts['received']} raster(s) with {len(failed)} failed "
+                f"item(s) and {len(rejected)} rejected line(s)"
+                if failed or rejected
+                else f"Successfully read {counts['received']} raster(s)"
+            ),
+            **ingest_summary(counts, written, failed, upsert),
+            "rejectedCount": len(rejected),
+            "rejected": rejected[:MAX_REJECTED_REPORTED],
         },
     )
 
@@ -178,21 +1397,97 @@ def post_rasters(event, body):
 ##### JOB
 
 
+def parse_job_wait(params):
+    if "wait" not in params:
+        return 0
+    try:
+        wait = float(params["wait"])
+    except (TypeError, ValueError):
+        raise ValueError("wait must be a number of seconds")
+    return min(max(wait, 0), MAX_JOB_WAIT_SECONDS) if math.isfinite(wait) else 0
+
+
+def job_changed(item, since, status):
+    return (since is not None and item.get("updated_at") != since) or (
+        status is not None and item.get("status") != status
+    )
+
+
 def get_job_by_id(event):
     job_id = event.get("pathParameters", {}).get("id")
     if not job_id:
         raise ValueError("Job ID required in path parameters")
 
-    response = jobs_table.get_item(
-        Key={"id": job_id},
-        ConsistentRead=True,
-    )
+    # ?wait=<seconds>&since=<updated_at>&status=<status> holds the request
+    # until the job no longer matches what the client last saw
+    params = event.get("queryStringParameters") or {}
+    wait = parse_job_wait(params)
+    since = params.get("since")
+    status = params.get("status")
+
+    if wait and (since is not None or status is not None):
+        # Only the status is re-read while waiting
+        status_only = build_projection(JOB_STATUS_ATTRIBUTES, ())
+        deadline = clock.monotonic() + wait
+        interval = JOB_POLL_INTERVAL
+        item = get_item(jobs_table, {"id": job_id}, ConsistentRead=True, **status_only)
+        while item is not None and not job_changed(item, since, status):
+            remaining = deadline - clock.monotonic()
+            if remaining <= 0:
+                break
+            clock.sleep(min(interval, remaining))
+            interval = min(interval * 2, JOB_POLL_MAX_INTERVAL)
+            item = get_item(
+                jobs_table, {"id": job_id}, ConsistentRead=True, **status_only
+            )
+        if item is None:
+            return create_response(event, 404, {"error": "Job not found"})
 
-    if "Item" not in response:
+    item = get_item(jobs_table, {"id": job_id}, ConsistentRead=True)
+    if item is None:
         return create_response(event, 404, {"error": "Job not found"})
 
-    decoded_item = DecimalHandler.decode_decimal(response["Item"])
-    return create_response(event, 200, decoded_item)
+    # An unfinished job is its status and metadata; payloads are loaded once
+    # it has finished
+    if item.get("status") not in JOB_FINISHED_STATUSES:
+        return create_response(event, 200, without_payloads(item))
+    return create_response(event, 200, load_payloads(MeteredTable(jobs_table), item))
+
+
+def post_job_statuses(event, body):
+    """
+    POST /jobs/status {"ids": [...], "includeResult": false}: current status of
+    many jobs in one request, in the order asked, plus the ids not found.
+    """
+    ids = body.get("ids") if isinstance(body, dict) else None
+    if not isinstance(ids, list) or not all(
+        isinstance(job_id, str) and job_id for job_id in ids
+    ):
+        raise ValueError("ids must be a list of job ids")
+    ids = list(dict.fromkeys(ids))
+    if len(ids) > MAX_JOB_STATUS_IDS:
+        raise ValueError(f"At most {MAX_JOB_STATUS_IDS} job ids per request")
+
+    include_result = ["body", "body_ref"] if body.get("includeResult") else []
+    fields = [*JOB_STATUS_ATTRIBUTES, *include_result]
+    found = {
+        item["id"]: load_payloads(MeteredTable(jobs_table), item)
+        for item in batch_get_items(
+            jobs_table,
+            [{"id": job_id} for job_id in ids],
+            build_projection(fields, ()),
+            consistent=True,
+            workers=READ_WORKERS,
+        )
+    }
+    return create_response(
+        event,
+        200,
+        {
+            "jobs": [found[job_id] for job_id in ids if job_id in found],
+            "missing": [job_id for job_id in ids if job_id not in found],
+        },
+    )
 
 
 def post_job_create_or_update(event, body):
@@ -202,7 +1497,7 @@ def post_job_create_or_update(event, body):
     if "ttl" not in body:
         raise ValueError("TTL attribute is required")
 
-    current_time = datetime.now(timezone.utc).isoformat()
+    current_time = clock.now().isoformat()
     is_update = "id" in body and body["id"]
 
     if is_update:
@@ -214,25 +1509,25 @@ def post_job_create_or_update(event, body):
         del update_data["id"]  # Remove ID as it's part of the key
         update_data["updated_at"] = current_time
 
-        update_data = DecimalHandler.encode_decimal(update_data)
-
-        update_parts = []
-        expr_names = {}
-        expr_values = {}
-
-        for key, value in update_data.items():
-            update_parts.append(f"#{key} = :{key}")
-            expr_names[f"#{key}"] = key
-            expr_values[f":{key}"] = value
-
-        update_expression = "SET " + ", ".join(update_parts)
+        # Large items/body go out of line; unchanged ones are not rewritten
+        update_data, remove = offload_payloads(
+            MeteredTable(jobs_table),
+            job_id,
+            update_data,
+            body["ttl"],
+            lambda: get_item(
+                jobs_table,
+                {"id": job_id},
+                ProjectionExpression="items_ref, body_ref",
+                ConsistentRead=True,
+            ),
+        )
 
         try:
-            jobs_table.update_item(
-                Key={"id": job_id},
-                UpdateExpression=update_expression,
-                ExpressionAttributeNames=expr_names,
-                ExpressionAttributeValues=expr_values,
+            call_table(
+                "UpdateItem",
+                jobs_table.update_item,
+                **job_update_args(job_id, update_data, remove),
                 ReturnValues="UPDATED_NEW",
             )
 
@@ -256,13 +1551,22 @@ def post_job_create_or_update(event, body):
         if "id" not in body or not body["id"]:
             body["id"] = str(uuid.uuid4())
 
-        processed_item = DecimalHandler.encode_decimal(
-            {**body, "created_at": current_time, "updated_at": current_time}
+        processed_item = {
+            **body,
+            "created_at": current_time,
+            "updated_at": current_time,
+        }
+
+        processed_item, _ = offload_payloads(
+            MeteredTable(jobs_table),
+            processed_item["id"],
+            processed_item,
+            processed_item["ttl"],
         )
 
         try:
             # Create new item using put_item
-            jobs_table.put_item(Item=processed_item)
+            call_table("PutItem", jobs_table.put_item, Item=processed_item)
 
             return create_response(
                 event,
@@ -282,69 +1586,1265 @@ def post_job_create_or_update(event, body):
 ##### SEARCH
 
 
-def post_search(event, body):
-    max_results = min(int(body.get("maxResults", DEFAULT_RESULTS)), MAX_RESULTS)
-    uwis = body.get("uwis", [])
-    wordz = body.get("wordz")
+def search_key_of(item, area=None, stream=None, sort=None):
+    if sort:
+        # ExclusiveStartKey for a sort index: table keys plus index keys
+        attribute = SEARCH_SORTS[sort][1]
+        return {"pk": item["pk"], "sk": item["sk"], attribute: item[attribute]}
+    if area:
+        # ExclusiveStartKey for geo-cell-index
+        return {
+            "pk": item["pk"],
+            "sk": item["sk"],
+            "geo_cell": item["geo_cell"],
+            "geohash": item["geohash"],
+        }
+    if stream and stream.startswith(("WORD#", "DEPTH#")):
+        # ExclusiveStartKey for a posting list shard
+        return {"pk": stream, "sk": f"{item['uwi']}#{item['sk']}"}
+    # ExclusiveStartKey for pk-uwi-index: table keys plus index keys
+    return {"pk": item["pk"], "sk": item["sk"], "uwi": item["uwi"]}
+
+
+def read_ahead_limit(needed, selectivity):
+    selectivity = max(selectivity, MIN_SELECTIVITY)
+    return max(needed, min(READ_AHEAD_MAX, math.ceil(needed / selectivity)))
+
+
+# The search queries return (items, state): EXHAUSTED once DynamoDB has
+# reached the end of the stream, otherwise the LastEvaluatedKey to resume
+# from. A query stopped before its first read returns its start key as given
+# (None for a stream not started), never EXHAUSTED.
+
+
+def query_prefix(
+    uwi_prefix,
+    partition,
+    depth,
+    limit,
+    exclusive_start_key,
+    stop,
+    stats,
+    projection,
+    exact=False,
+):
+    items = []
+    while len(items) < limit and not stop.is_set():
+        query_args = build_query_args(
+            uwi_prefix,
+            partition,
+            limit - len(items),
+            exclusive_start_key,
+            projection,
+            exact,
+        )
+        response = query_items(fizz_table, **query_args)
+        items.extend(
+            item
+            for item in response.get("Items", [])
+            if not depth or first_overlap_bucket(raster_depths(item), depth) is not None
+        )
+        stats.record(
+            response.get("ScannedCount", len(response.get("Items", []))),
+            consumed_units(response),
+        )
+        exclusive_start_key = response.get("LastEvaluatedKey", EXHAUSTED)
+        if exclusive_start_key == EXHAUSTED:
+            break
+    return items, exclusive_start_key
+
+
+def query_postings(
+    uwi_prefix,
+    partition,
+    tokens,
+    depth,
+    limit,
+    exclusive_start_key,
+    stop,
+    stats,
+    projection,
+):
+    # Walk a shard of the driving token's postings in UWI order, fetch the
+    # rasters they point at and keep those still under the posting's UWI
+    # whose current wordz holds every search token (this also drops stale
+    # postings left behind by re-loaded or re-keyed rasters).
+    # Each page reads ahead by the observed selectivity, so the caller may
+    # get more than limit items back and trims the surplus into its cursor.
+    token = driver_token(tokens)
+    cache_key = (token, uwi_prefix)
+    prior = selectivity_cache.get(cache_key, 1.0)
+    evaluated = 0
+    items = []
+    while len(items) < limit and not stop.is_set():
+        selectivity = (len(items) + prior) / (evaluated + 1)
+        query_args = build_posting_query_args(
+            partition,
+            uwi_prefix,
+            read_ahead_limit(limit - len(items), selectivity),
+            exclusive_start_key,
+        )
+        response = query_items(fizz_table, **query_args)
+        postings = response.get("Items", [])
+        if postings:
+            keys = [{"pk": p["raster_pk"], "sk": p["raster_sk"]} for p in postings]
+            rasters = {
+                (r["pk"], r["sk"]): r
+                for r in batch_get_items(
+                    fizz_table, dedupe_keys(keys), projection, stats=stats
+                )
+            }
+            for p in postings:
+                raster = rasters.get((p["raster_pk"], p["raster_sk"]))
+                if (
+                    raster
+                    and posting_matches(p, raster)
+                    and tokens <= tokenize(raster.get("wordz"))
+                    and (
+                        not depth
+                        or first_overlap_bucket(raster_depths(raster), depth)
+                        is not None
+                    )
+                ):
+                    items.append(raster)
+        evaluated += len(postings)
+        stats.record(len(postings), consumed_units(response))
+        exclusive_start_key = response.get("LastEvaluatedKey", EXHAUSTED)
+        if exclusive_start_key == EXHAUSTED:
+            break
 
-    if body.get("paginationToken"):
-        token_data = json.loads(
-            base64.b64decode(body.get("paginationToken", "")).decode()
+    if evaluated:
+        if len(selectivity_cache) >= SELECTIVITY_CACHE_SIZE:
+            selectivity_cache.clear()
+        selectivity_cache[cache_key] = len(items) / evaluated
+    return items, exclusive_start_key
+
+
+def parse_search_area(body):
+    """
+    Reads "bbox": [west, south, east, north] (degrees, west > east crosses the
+    antimeridian) or "near": {"lat", "lon", "radiusKm"} from a search body.
+    """
+    bbox = body.get("bbox")
+    near = body.get("near")
+    if bbox is not None and near is not None:
+        raise ValueError("Search by bbox or near, not both")
+    try:
+        if bbox is not None:
+            if not isinstance(bbox, list):
+                raise TypeError
+            west, south, east, north = (float(v) for v in bbox)
+            area = {"bbox": [west, south, east, north]}
+            valid = -90 <= south <= north <= 90 and all(
+                -180 <= lon <= 180 for lon in (west, east)
+            )
+        elif near is not None:
+            lat, lon = float(near["lat"]), float(near["lon"])
+            radius_km = float(near["radiusKm"])
+            area = {"near": [lat, lon, radius_km]}
+            valid = -90 <= lat <= 90 and -180 <= lon <= 180 and radius_km > 0
+        else:
+            return None
+    except (KeyError, TypeError, ValueError):
+        valid = False
+    if not valid:
+        raise ValueError(
+            "bbox must be [west, south, east, north] and near must be "
+            "{lat, lon, radiusKm}, in degrees and kilometres"
         )
-        exclusive_start_key = token_data.get("last_evaluated_key")
-        current_uwi_prefix = token_data.get("uwi_prefix")
+    return area
+
+
+def area_bounds(area):
+    if "bbox" in area:
+        return area["bbox"]
+    lat, lon, radius_km = area["near"]
+    angle = radius_km / EARTH_RADIUS_KM
+    south = max(lat - math.degrees(angle), -90)
+    north = min(lat + math.degrees(angle), 90)
+    if south == -90 or north == 90 or math.sin(angle) >= math.cos(math.radians(lat)):
+        return -180, south, 180, north
+    spread = math.degrees(math.asin(math.sin(angle) / math.cos(math.radians(lat))))
+    west = (lon - spread + 180) % 360 - 180
+    east = (lon + spread + 180) % 360 - 180
+    return west, south, east, north
+
+
+def cover_area(area):
+    """
+    Geohash cells covering the area, in geohash order: the finest precision
+    that needs no more than MAX_GEO_CELLS of them.
+    """
+    west, south, east, north = area_bounds(area)
+    for precision in range(GEOHASH_PRECISION, GEO_CELL_PRECISION - 1, -1):
+        south_index, west_index = geo_cell_index(south, west, precision)
+        north_index, east_index = geo_cell_index(north, east, precision)
+        lon_cells = 2 ** geohash_bits(precision)[0]
+        # Wraps round when the area crosses the antimeridian
+        lon_span = (east_index - west_index) % lon_cells + 1
+        if west == -180 and east == 180:
+            lon_span = lon_cells
+        if lon_span * (north_index - south_index + 1) <= MAX_GEO_CELLS:
+            return sorted(
+                encode_geo_cell(lat_index, (west_index + n) % lon_cells, precision)
+                for lat_index in range(south_index, north_index + 1)
+                for n in range(lon_span)
+            )
+    raise ValueError("Search area is too large")
+
+
+def distance_km(lat1, lon1, lat2, lon2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (
+        math.sin((phi2 - phi1) / 2) ** 2
+        + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(a, 1)))
+
+
+def in_area(item, area):
+    lat, lon = float(item["surface_lat"]), float(item["surface_lon"])
+    if "near" in area:
+        center_lat, center_lon, radius_km = area["near"]
+        return distance_km(lat, lon, center_lat, center_lon) <= radius_km
+    west, south, east, north = area["bbox"]
+    if west <= east:
+        within_lon = west <= lon <= east
     else:
-        exclusive_start_key = None
-        current_uwi_prefix = None
+        within_lon = lon >= west or lon <= east
+    return south <= lat <= north and within_lon
+
+
+def query_cell(
+    cell, area, uwis, tokens, depth, limit, exclusive_start_key, stop, stats, projection
+):
+    # Cells overhang the area, so refine by exact position (and by UWI prefix,
+    # keywords and depth when the search has them)
+    matches_uwi = uwi_matcher(uwis)
+    items = []
+    while len(items) < limit and not stop.is_set():
+        query_args = build_geo_query_args(
+            cell, limit - len(items), exclusive_start_key, projection
+        )
+        response = query_items(fizz_table, **query_args)
+        stats.record(
+            response.get("ScannedCount", len(response.get("Items", []))),
+            consumed_units(response),
+        )
+        items.extend(
+            item
+            for item in response.get("Items", [])
+            if in_area(item, area)
+            and (not uwis or matches_uwi(item.get("uwi", "")))
+            and tokens <= tokenize(item.get("wordz"))
+            and (
+                not depth
+                or first_overlap_bucket(raster_depths(item), depth) is not None
+            )
+        )
+        exclusive_start_key = response.get("LastEvaluatedKey", EXHAUSTED)
+        if exclusive_start_key == EXHAUSTED:
+            break
+    return items, exclusive_start_key
 
-    all_items = []
-    last_evaluated_key = None
-    last_uwi_prefix = None
 
-    for uwi_prefix in uwis:
-        if current_uwi_prefix and uwi_prefix != current_uwi_prefix:
+def parse_search_depth(body):
+    # "depth": [top, base] finds segments overlapping that interval
+    depth = body.get("depth")
+    if depth is None:
+        return None
+    try:
+        if not isinstance(depth, list):
+            raise TypeError
+        top, base = (float(v) for v in depth)
+        valid = math.isfinite(top) and math.isfinite(base) and top <= base
+    except (TypeError, ValueError):
+        valid = False
+    if not valid:
+        raise ValueError("depth must be [top, base] with top <= base")
+    return [top, base]
+
+
+def depth_buckets(depth):
+    first, last = depth_bucket(depth[0]), depth_bucket(depth[1])
+    if last - first + 1 > MAX_DEPTH_BUCKETS:
+        return None
+    return range(first, last + 1)
+
+
+def query_depth(
+    uwi_prefix,
+    bucket,
+    partition,
+    depth,
+    tokens,
+    limit,
+    exclusive_start_key,
+    stop,
+    stats,
+    projection,
+):
+    # Walk a shard of one depth bucket's postings in UWI order, keep those
+    # this bucket reports, then check the fetched rasters' current UWI, depths
+    # (and keywords) so stale postings from re-loaded or re-keyed rasters drop
+    # out. Postings are read ahead by the share this bucket reports so far,
+    # but only as many rasters as needed are fetched; the cursor resumes after
+    # them.
+    items = []
+    evaluated = 0
+    while len(items) < limit and not stop.is_set():
+        needed = limit - len(items)
+        selectivity = (len(items) + 1) / (evaluated + 1)
+        query_args = build_posting_query_args(
+            partition,
+            uwi_prefix,
+            read_ahead_limit(needed, selectivity),
+            exclusive_start_key,
+        )
+        response = query_items(fizz_table, **query_args)
+        postings = response.get("Items", [])
+        stats.record(len(postings), consumed_units(response))
+        exclusive_start_key = response.get("LastEvaluatedKey", EXHAUSTED)
+        used = []
+        for n, p in enumerate(postings):
+            depths = segment_depths(p, "top_depth", "base_depth")
+            if first_overlap_bucket(depths, depth) != bucket:
+                continue
+            used.append(p)
+            if len(used) == needed and n + 1 < len(postings):
+                # Resume after the last posting used
+                exclusive_start_key = {"pk": partition, "sk": p["sk"]}
+                postings = postings[: n + 1]
+                break
+        evaluated += len(postings)
+        if used:
+            keys = [{"pk": p["raster_pk"], "sk": p["raster_sk"]} for p in used]
+            rasters = {
+                (r["pk"], r["sk"]): r
+                for r in batch_get_items(
+                    fizz_table, dedupe_keys(keys), projection, stats=stats
+                )
+            }
+            for p in used:
+                raster = rasters.get((p["raster_pk"], p["raster_sk"]))
+                if (
+                    raster
+                    and posting_matches(p, raster)
+                    and first_overlap_bucket(raster_depths(raster), depth) == bucket
+                    and tokens <= tokenize(raster.get("wordz"))
+                ):
+                    items.append(raster)
+        if exclusive_start_key == EXHAUSTED:
+            break
+    return items, exclusive_start_key
+
+
+def query_sorted(
+    partition,
+    sort,
+    uwis,
+    area,
+    tokens,
+    depth,
+    after,
+    budgets,
+    limit,
+    exclusive_start_key,
+    stop,
+    stats,
+    projection,
+):
+    # Walk one write shard in sort order, after the sort key after if given;
+    # the search's UWI prefixes, area, keywords and depth are filters here.
+    # Reads ahead by the share passing them, and stops once the shard has
+    # used up its budget of items to evaluate in this request (budgets is
+    # shared by the shard's reads).
+    matches_uwi = uwi_matcher(uwis)
+    items = []
+    evaluated = 0
+    while len(items) < limit and not stop.is_set():
+        budget = budgets[partition]
+        if budget <= 0:
+            break
+        selectivity = (len(items) + 1) / (evaluated + 1)
+        query_args = build_sort_query_args(
+            partition,
+            sort,
+            min(read_ahead_limit(limit - len(items), selectivity), budget),
+            exclusive_start_key,
+            projection,
+            after,
+        )
+        response = query_items(fizz_table, **query_args)
+        scanned = response.get("ScannedCount", len(response.get("Items", [])))
+        evaluated += scanned
+        budgets[partition] -= scanned
+        stats.record(scanned, consumed_units(response))
+        items.extend(
+            item
+            for item in response.get("Items", [])
+            if (not uwis or matches_uwi(item.get("uwi", "")))
+            and (not area or in_area(item, area))
+            and tokens <= tokenize(item.get("wordz"))
+            and (
+                not depth
+                or first_overlap_bucket(raster_depths(item), depth) is not None
+            )
+        )
+        exclusive_start_key = response.get("LastEvaluatedKey", EXHAUSTED)
+        if exclusive_start_key == EXHAUSTED:
+            break
+    return items, exclusive_start_key
+
+
+def is_full_uwi(uwi):
+    return FULL_UWI_PATTERN.fullmatch(uwi) is not None
+
+
+def plan_uwis(uwis):
+    """
+    The UWI prefixes to search, in order, with those another prefix covers
+    dropped (42123 covers 4212345678, which covers 42123456780000). Walking
+    the prefixes sorted is a walk of their trie: a prefix's subtree directly
+    follows it. A full UWI only stands for itself, so it covers nothing.
+    """
+    planned = []
+    covering = None
+    for uwi in sorted(set(uwis)):
+        if covering is not None and uwi.startswith(covering):
             continue
-        while len(all_items) < max_results:
-            query_args = build_query_args(
-                uwi_prefix, wordz, max_results - len(all_items), exclusive_start_key
+        planned.append(uwi)
+        if not is_full_uwi(uwi):
+            covering = uwi
+    return planned
+
+
+def uwi_matcher(uwis):
+    # For a UWI list used as a filter (area search)
+    exact = {uwi for uwi in uwis if is_full_uwi(uwi)}
+    prefixes = tuple(uwi for uwi in uwis if uwi not in exact)
+    return lambda uwi: uwi in exact or uwi.startswith(prefixes)
+
+
+def query_fingerprint(uwis, wordz, area=None, depth=None, sort=None):
+    query = [uwis, wordz, area, depth] if area or depth else [uwis, wordz]
+    if sort:
+        query.append(sort)
+    return hashlib.sha256(json.dumps(query).encode()).hexdigest()[:16]
+
+
+def token_secret():
+    """
+    The search token signing key: SEARCH_TOKEN_SECRET, or the Secrets Manager
+    secret at SEARCH_TOKEN_SECRET_ARN (generated by the stack when no secret
+    is configured), read once per container. Without one, tokens are neither
+    issued nor accepted: an empty key would let anyone sign them.
+    """
+    global search_token_secret
+    if search_token_secret is None:
+        secret = os.environ.get("SEARCH_TOKEN_SECRET", "")
+        secret_arn = os.environ.get("SEARCH_TOKEN_SECRET_ARN", "")
+        if not secret and secret_arn:
+            response = boto3.client("secretsmanager").get_secret_value(
+                SecretId=secret_arn
             )
-            response = fizz_table.query(**query_args)
-            all_items.extend(response.get("Items", []))
-            last_evaluated_key = response.get("LastEvaluatedKey")
-            if not last_evaluated_key:
+            secret = response["SecretString"]
+        if not secret:
+            raise RuntimeError("Search token secret is not configured")
+        search_token_secret = secret.encode()
+    return search_token_secret
+
+
+# Token layout: version byte | truncated HMAC | zlib(JSON). The JSON holds the
+# query fingerprint, the first unfinished prefix index and per-prefix state:
+# EXHAUSTED, the LastEvaluatedKey of a single-stream prefix (geohash cell or
+# full UWI), or a map of stream (raster partition or posting list shard) ->
+# EXHAUSTED/LastEvaluatedKey. Anything absent or null is not started.
+def encode_token(fingerprint, cursor, **extra):
+    start_index, states = cursor
+    payload = zlib.compress(
+        json.dumps(
+            {
+                "q": fingerprint,
+                "i": start_index,
+                "s": {str(i): state for i, state in states.items()},
+                **extra,
+            },
+            separators=(",", ":"),
+        ).encode()
+    )
+    signature = hmac.new(token_secret(), payload, hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(
+        bytes([SEARCH_TOKEN_VERSION]) + signature[:SIGNATURE_BYTES] + payload
+    ).decode()
+
+
+def decode_token(token, fingerprint):
+    # Returns the cursor and the token's JSON
+    try:
+        raw = base64.urlsafe_b64decode(token)
+        version = raw[0]
+        signature = raw[1 : SIGNATURE_BYTES + 1]
+        payload = raw[SIGNATURE_BYTES + 1 :]
+        expected = hmac.new(token_secret(), payload, hashlib.sha256).digest()
+        if version != SEARCH_TOKEN_VERSION or not hmac.compare_digest(
+            signature, expected[:SIGNATURE_BYTES]
+        ):
+            raise ValueError
+        token_data = json.loads(zlib.decompress(payload))
+    except (ValueError, IndexError, zlib.error):
+        raise ValueError("Invalid pagination token")
+
+    if token_data["q"] != fingerprint:
+        raise ValueError("Pagination token does not match this request")
+    states = {int(i): state for i, state in token_data["s"].items()}
+    return (token_data["i"], states), token_data
+
+
+# A sorted search's token also holds its sort state: "r", the [pk, sk] of
+# the rows still to return of a result sorted in memory, or "a", the sort key
+# an index walk resumes after
+SORT_STATE_KEYS = ("r", "a")
+
+
+def encode_search_token(fingerprint, cursor, sort_state=None):
+    return encode_token(fingerprint, cursor, **(sort_state or {}))
+
+
+def decode_search_token(token, fingerprint):
+    # Returns the cursor and the sort state (None if not a sorted search)
+    cursor, token_data = decode_token(token, fingerprint)
+    sort_state = {k: token_data[k] for k in SORT_STATE_KEYS if k in token_data}
+    return cursor, sort_state or None
+
+
+def next_search_cursor(prefixes, index, states):
+    while index < len(prefixes) and states.get(index) == EXHAUSTED:
+        index += 1
+    if index >= len(prefixes):
+        return None
+    return index, {i: state for i, state in states.items() if i >= index}
+
+
+def search_order(item, sort=None):
+    if sort:
+        return item[SEARCH_SORTS[sort][1]]
+    return item["uwi"], item["sk"]
+
+
+def stream_share(room, streams):
+    # Each stream of a prefix is asked for an even share of the room left
+    return math.ceil(room / streams) + STREAM_READ_MARGIN
+
+
+def merge_streams(results, stream_states, room, refill, stream_keys, sort=None):
+    """
+    Merge one prefix's stream results in UWI (or sort) order and take up to
+    room items. An item is only taken once every stream not yet exhausted
+    has one buffered: streams that ran dry are first refilled, together,
+    with refill({stream key: (start key, limit)}) -> {stream key: result},
+    each asked for twice as much as last time (within the room left).
+    Returns the items and the prefix's new state.
+    """
+    buffers = {key: deque(items) for key, (items, _) in results.items()}
+    read_to = {key: state for key, (_, state) in results.items()}
+    asked = dict.fromkeys(results, stream_share(room, len(results)))
+    stream_states = dict(stream_states)
+    taken = []
+    while len(taken) < room:
+        dry = [
+            key
+            for key, buffer in buffers.items()
+            if not buffer and read_to[key] != EXHAUSTED
+        ]
+        if dry:
+            for key in dry:
+                limit = room - len(taken) + STREAM_READ_MARGIN
+                asked[key] = min(2 * asked[key], limit)
+            refilled = refill({key: (read_to[key], asked[key]) for key in dry})
+            for key, (items, state) in refilled.items():
+                buffers[key].extend(items)
+                read_to[key] = state
+            if not any(
+                items or state == EXHAUSTED for items, state in refilled.values()
+            ):
+                # Out of reads for this call (a sorted search's budget)
                 break
-            exclusive_start_key = last_evaluated_key
-            last_uwi_prefix = uwi_prefix
-        if len(all_items) >= max_results:
+            continue
+        heads = [
+            (search_order(buffer[0], sort), key)
+            for key, buffer in buffers.items()
+            if buffer
+        ]
+        if not heads:
             break
-        current_uwi_prefix = None
-        exclusive_start_key = None
-
-    new_token = (
-        base64.b64encode(
-            json.dumps(
-                {
-                    "last_evaluated_key": last_evaluated_key,
-                    "uwi_prefix": last_uwi_prefix,
+        key = min(heads)[1]
+        item = buffers[key].popleft()
+        taken.append(item)
+        stream_states[key] = search_key_of(item, stream=key, sort=sort)
+
+    # A stream with items left resumes after the last one taken from it
+    for key, buffer in buffers.items():
+        if not buffer:
+            stream_states[key] = read_to[key]
+    return taken, collapse_stream_states(stream_states, stream_keys)
+
+
+def collapse_stream_states(stream_states, stream_keys):
+    if all(stream_states.get(key) == EXHAUSTED for key in stream_keys):
+        return EXHAUSTED
+    return stream_states
+
+
+def fan_out_search(
+    uwis,
+    wordz,
+    max_results,
+    cursor,
+    stats,
+    projection=None,
+    area=None,
+    depth=None,
+    sort=None,
+    after=None,
+):
+    """
+    Query the unfinished prefixes concurrently, queued in prefix order, and
+    merge in prefix order.
+    A prefix reads one stream (a geohash cell of an area search, where the
+    covering cells are the prefixes, or a full UWI) or several merged in UWI
+    order (each raster partition, or each shard of the driving posting list
+    of a keyword search or of each depth bucket of a depth search). Returns
+    the items and the cursor to resume from, or None if done. A sorted
+    search is one prefix, the write shards merged in sort order from after
+    that sort key; it may stop short of max_results (see query_sorted).
+    """
+    start_index, states = cursor
+    tokens = tokenize(wordz)
+    cells = cover_area(area) if area and not sort else None
+    buckets = depth_buckets(depth) if depth and not cells and not sort else None
+    if sort:
+        prefixes = [sort] if uwis or area else []
+    else:
+        prefixes = cells or uwis
+    all_items = []
+    pending = [
+        i for i in range(start_index, len(prefixes)) if states.get(i) != EXHAUSTED
+    ]
+    if not pending:
+        return all_items, None
+
+    def stream_queries(i):
+        # Stream key -> query still to be given (limit, start key, stop,
+        # stats, projection); a single stream has the key None
+        if sort:
+            # Each shard has its own share of the budget, so one whose
+            # items wait on the others cannot starve them: the walk moves on
+            # every request
+            share = MAX_SORTED_EVALUATED // len(RASTER_PARTITIONS)
+            budgets = dict.fromkeys(RASTER_PARTITIONS, share)
+            return {
+                partition: functools.partial(
+                    query_sorted,
+                    partition,
+                    sort,
+                    uwis,
+                    area,
+                    tokens,
+                    depth,
+                    after,
+                    budgets,
+                )
+                for partition in RASTER_PARTITIONS
+            }
+        if cells:
+            query = functools.partial(query_cell, cells[i], area, uwis, tokens, depth)
+            return {None: query}
+        # Postings are keyed "<uwi>#<raster sk>": a full UWI's own postings
+        # are those under "<uwi>#"
+        exact = is_full_uwi(uwis[i])
+        posting_prefix = f"{uwis[i]}#" if exact else uwis[i]
+        if buckets:
+            return {
+                partition: functools.partial(
+                    query_depth, posting_prefix, bucket, partition, depth, tokens
+                )
+                for bucket in buckets
+                for partition in posting_partitions(f"DEPTH#{bucket}", uwis[i])
+            }
+        if tokens:
+            token = driver_token(tokens)
+            return {
+                partition: functools.partial(
+                    query_postings, posting_prefix, partition, tokens, depth
+                )
+                for partition in posting_partitions(f"WORD#{token}", uwis[i])
+            }
+        if exact:
+            # A full UWI lives on one write shard
+            query = functools.partial(
+                query_prefix, uwis[i], raster_partition(uwis[i]), depth, exact=True
+            )
+            return {None: query}
+        return {
+            partition: functools.partial(query_prefix, uwis[i], partition, depth)
+            for partition in RASTER_PARTITIONS
+        }
+
+    states = dict(states)
+    streams = {i: stream_queries(i) for i in pending}
+    stop = threading.Event()
+    pool = ThreadPoolExecutor(max_workers=SEARCH_WORKERS)
+    futures = {}
+    submitted = 0
+
+    def submit(query, start_key, room):
+        return pool.submit(query, room, start_key, stop, stats, projection)
+
+    def top_up(position, room):
+        # Keep about 2 * SEARCH_WORKERS streams queued, in prefix order. A
+        # prefix is asked only for the room left when it is queued, split
+        # between its streams, so later prefixes read less as the page fills.
+        nonlocal submitted
+        while submitted < len(pending) and (
+            submitted == position
+            or sum(len(futures[j]) for j in pending[position:submitted])
+            < 2 * SEARCH_WORKERS
+        ):
+            i = pending[submitted]
+            if None in streams[i]:
+                futures[i] = {None: submit(streams[i][None], states.get(i), room)}
+            else:
+                stream_states = states.get(i) or {}
+                live = {
+                    key: query
+                    for key, query in streams[i].items()
+                    if stream_states.get(key) != EXHAUSTED
                 }
-            ).encode()
-        ).decode()
-        if last_evaluated_key
-        else None
-    )
+                share = stream_share(room, len(live))
+                futures[i] = {
+                    key: submit(query, stream_states.get(key), share)
+                    for key, query in live.items()
+                }
+            submitted += 1
+
+    def refill(i, reads):
+        refills = {
+            key: submit(streams[i][key], start_key, limit)
+            for key, (start_key, limit) in reads.items()
+        }
+        return {key: future.result() for key, future in refills.items()}
+
+    try:
+        for position, i in enumerate(pending):
+            top_up(position, max_results - len(all_items))
+            results = {key: future.result() for key, future in futures[i].items()}
+            room = max_results - len(all_items)
+            if None in streams[i]:
+                items, last_key = results[None]
+                taken = items[:room]
+                if len(items) > room:
+                    states[i] = search_key_of(taken[-1], area)
+                else:
+                    states[i] = last_key
+            else:
+                taken, states[i] = merge_streams(
+                    results,
+                    states.get(i) or {},
+                    room,
+                    functools.partial(refill, i),
+                    list(streams[i]),
+                    sort,
+                )
+            all_items.extend(taken)
+            if len(all_items) < max_results and states[i] == EXHAUSTED:
+                continue
+
+            # The page is full, or a sorted search ran out of reads.
+            # Speculative queries that reached the end of their stream with
+            # nothing found need not be re-run
+            stop.set()
+            for j in pending[position + 1 : submitted]:
+                mark_finished_empty(states, j, futures[j], list(streams[j]))
+            return all_items, next_search_cursor(prefixes, i, states)
+    finally:
+        stop.set()
+        pool.shutdown(wait=True, cancel_futures=True)
+
+    return all_items, None
+
+
+def sorted_rows_page(keys, max_results, stats, projection):
+    # The next page of a result sorted in memory: its rows, fetched by key
+    page_keys = [{"pk": pk, "sk": sk} for pk, sk in keys[:max_results]]
+    found = {
+        (item["pk"], item["sk"]): item
+        for item in batch_get_items(fizz_table, page_keys, projection, stats=stats)
+    }
+    items = [found[k["pk"], k["sk"]] for k in page_keys if (k["pk"], k["sk"]) in found]
+    rest = keys[max_results:]
+    return items, (0, {}) if rest else None, {"r": rest}
+
+
+def sorted_search(
+    uwis, wordz, max_results, cursor, sort_state, stats, projection, area, depth, sort
+):
+    """
+    A page of a sorted search. The first page reads up to SORT_IN_MEMORY_MAX
+    rows unsorted, through the search's prefixes, postings or cells; if that
+    is all of them it sorts them here and later pages fetch the rest by key
+    from the sort state. Otherwise it walks the sort indexes, round after
+    round (see query_sorted), until the page is full, the walk ends or
+    MAX_SORTED_SECONDS have passed. Returns the items, the cursor (or None if
+    done) and the sort state.
+    """
+    attribute = SEARCH_SORTS[sort][1]
+    if sort_state and "r" in sort_state:
+        return sorted_rows_page(sort_state["r"], max_results, stats, projection)
+    after = (sort_state or {}).get("a")
+    if sort_state is None:
+        found, rest = fan_out_search(
+            uwis, wordz, SORT_IN_MEMORY_MAX, (0, {}), stats, projection, area, depth
+        )
+        if rest is None:
+            rows = sorted(
+                (item for item in found if attribute in item),
+                key=lambda item: item[attribute],
+            )
+            keys = [[item["pk"], item["sk"]] for item in rows[max_results:]]
+            return rows[:max_results], (0, {}) if keys else None, {"r": keys}
+
+    deadline = clock.monotonic() + MAX_SORTED_SECONDS
+    items = []
+    while True:
+        found, cursor = fan_out_search(
+            uwis,
+            wordz,
+            max_results - len(items),
+            cursor,
+            stats,
+            projection,
+            area,
+            depth,
+            sort,
+            after,
+        )
+        items.extend(found)
+        after = items[-1][attribute] if items else after
+        if cursor is None or len(items) >= max_results or clock.monotonic() >= deadline:
+            return items, cursor, {"a": after}
+
+
+def mark_finished_empty(states, i, futures, stream_keys):
+    empty = [
+        key
+        for key, future in futures.items()
+        if future.done()
+        and not future.cancelled()
+        and future.exception() is None
+        and future.result() == ([], EXHAUSTED)
+    ]
+    if None in empty:
+        states[i] = EXHAUSTED
+    elif empty:
+        stream_states = dict(states.get(i) or {})
+        stream_states.update(dict.fromkeys(empty, EXHAUSTED))
+        states[i] = collapse_stream_states(stream_states, stream_keys)
+
+
+def search_cache_key(fingerprint, cursor, max_results, fields, sort_state=None):
+    # The raster generation keeps entries from before a raster write (and the
+    # token version, pages with tokens of an older layout) from ever matching
+    # again; they age out of both tiers
+    generation = check_read_version("RASTER", time.monotonic())
+    start_index, states = cursor
+    key = [generation, SEARCH_TOKEN_VERSION, fingerprint, start_index, states]
+    key += [max_results, fields, sort_state]
+    return hashlib.sha256(
+        json.dumps(key, sort_keys=True, default=json_default).encode()
+    ).hexdigest()
+
+
+def get_cached_search(key):
+    # Returns (page, tier) or (None, None)
+    now = time.monotonic()
+    with read_cache_lock:
+        entry = search_cache.get(key)
+        if entry and entry[0] > now:
+            search_cache.move_to_end(key)
+            return entry[1], "memory"
+    if search_cache_table is None:
+        return None, None
+    try:
+        response = call_table("GetItem", search_cache_table.get_item, Key={"key": key})
+        item = response.get("Item")
+    except ClientError as err:
+        print(f"Search cache read FAIL! Error Code: {err.response['Error']['Code']}")
+        return None, None
+    # TTL deletion lags, so check expiry here too
+    if not item or item["ttl"] <= time.time():
+        return None, None
+    page = json.loads(zlib.decompress(getattr(item["data"], "value", item["data"])))
+    remember_search(key, page, now)
+    return page, "shared"
+
+
+def remember_search(key, page, now):
+    with read_cache_lock:
+        search_cache[key] = (now + SEARCH_CACHE_TTL_SECONDS, page)
+        search_cache.move_to_end(key)
+        while len(search_cache) > SEARCH_CACHE_SIZE:
+            search_cache.popitem(last=False)
+
+
+def put_cached_search(key, page):
+    remember_search(key, page, time.monotonic())
+    if search_cache_table is None:
+        return
+    data = zlib.compress(dumps_json(page).encode())
+    if len(data) > MAX_SEARCH_CACHE_BYTES:
+        return
+    try:
+        call_table(
+            "PutItem",
+            search_cache_table.put_item,
+            Item={
+                "key": key,
+                "ttl": int(time.time()) + SEARCH_CACHE_TTL_SECONDS,
+                "data": data,
+            },
+        )
+    except ClientError as err:
+        print(f"Search cache write FAIL! Error Code: {err.response['Error']['Code']}")
+
+
+def search_cache_metadata(tier, read_units):
+    with read_cache_lock:
+        if tier:
+            search_cache_stats[f"{tier}_hits"] += 1
+            search_cache_stats["saved_read_units"] += read_units
+        else:
+            search_cache_stats["misses"] += 1
+        hits = search_cache_stats["memory_hits"] + search_cache_stats["shared_hits"]
+        total = hits + search_cache_stats["misses"]
+        return {
+            "status": "hit" if tier else "miss",
+            "tier": tier,
+            "hitRate": round(hits / total, 3),
+            "savedReadUnits": search_cache_stats["saved_read_units"],
+        }
+
+
+def post_search(event, body):
+    if not isinstance(body, dict):
+        raise ValueError("Request body must be an object")
+    max_results = parse_max_results(body.get("maxResults", DEFAULT_RESULTS))
+    uwis = body.get("uwis", [])
+    if not isinstance(uwis, list) or not all(isinstance(uwi, str) for uwi in uwis):
+        raise ValueError("uwis must be a list of UWI prefixes")
+    # Planned so equivalent requests share fingerprint, tokens and cache
+    uwis = plan_uwis(uwis)
+    wordz = " ".join(sorted(tokenize(body.get("wordz")))) or None
+    fields = parse_search_fields(body)
+    area = parse_search_area(body)
+    depth = parse_search_depth(body)
+    sort = parse_search_sort(body)
+    fingerprint = query_fingerprint(uwis, wordz, area, depth, sort)
+
+    if body.get("paginationToken"):
+        cursor, sort_state = decode_search_token(body["paginationToken"], fingerprint)
+    else:
+        cursor, sort_state = (0, {}), None
+
+    cache_key = search_cache_key(fingerprint, cursor, max_results, fields, sort_state)
+    page, tier = get_cached_search(cache_key)
+    stats = SearchStats()
+    if page is None:
+        key_attributes = SEARCH_KEY_ATTRIBUTES
+        if sort:
+            key_attributes += (SEARCH_SORTS[sort][1],)
+        projection = build_projection(fields, key_attributes)
+        if sort:
+            all_items, cursor, sort_state = sorted_search(
+                uwis,
+                wordz,
+                max_results,
+                cursor,
+                sort_state,
+                stats,
+                projection,
+                area,
+                depth,
+                sort,
+            )
+        else:
+            all_items, cursor = fan_out_search(
+                uwis, wordz, max_results, cursor, stats, projection, area, depth
+            )
+        # One result per raster, should one be stored under two keys
+        all_items = list({item["sk"]: item for item in all_items}.values())
+        if fields:
+            all_items = [
+                {field: item[field] for field in fields if field in item}
+                for item in all_items
+            ]
+        page = {
+            "data": all_items,
+            "paginationToken": (
+                encode_search_token(fingerprint, cursor, sort_state) if cursor else None
+            ),
+            "readUnits": stats.read_units,
+        }
+        put_cached_search(cache_key, page)
+    all_items = page["data"]
 
     metadata = {
-        "returnedCount": len(all_items[:max_results]),
+        "returnedCount": len(all_items),
         "totalRequested": max_results,
-        "paginationToken": new_token,
+        "paginationToken": page["paginationToken"],
+        "pageCount": stats.pages,
+        "evaluatedCount": stats.evaluated,
+        "readUnits": stats.read_units,
+        "cache": search_cache_metadata(tier, page["readUnits"]),
+        "generatedAt": datetime.now().isoformat(),
+    }
+
+    return create_response(
+        event,
+        200,
+        {
+            "data": all_items,
+            "metadata": metadata,
+        },
+    )
+
+
+##### FACETS
+
+
+def prefix_counter_counts(prefix, stats):
+    # Maintained counters: one query for the whole scope
+    query_args = {
+        "KeyConditionExpression": Key("pk").eq(facet_pk(prefix)),
+        "ReturnConsumedCapacity": "TOTAL",
+    }
+    counters = []
+    while True:
+        response = query_items(fizz_table, **query_args)
+        counters.extend(response["Items"])
+        stats.record(len(response["Items"]), consumed_units(response))
+        if "LastEvaluatedKey" not in response:
+            return counts_of_counters(counters), False
+        query_args["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+def prefix_raster_counts(prefix, partition, exact, budget, stats):
+    # Counts of up to budget rasters on one shard, and whether more were left
+    projection = build_projection(list(FACET_ATTRIBUTES), ("uwi",))
+    rasters = []
+    start_key = None
+    while True:
+        query_args = build_query_args(
+            prefix,
+            partition,
+            min(READ_AHEAD_MAX, budget - len(rasters)),
+            start_key,
+            projection,
+            exact,
+        )
+        response = query_items(fizz_table, **query_args)
+        rasters.extend(response["Items"])
+        stats.record(len(response["Items"]), consumed_units(response))
+        start_key = response.get("LastEvaluatedKey")
+        if not start_key or len(rasters) >= budget:
+            return counts_of_rasters(rasters), bool(start_key)
+
+
+def post_facets(event, body):
+    """
+    Raster counts by facet for a list of UWI prefixes (all rasters if none).
+    All rasters and 2 and 5 digit prefixes are read from the counters, which
+    trail raster writes by the stream delay; other prefixes and full UWIs
+    are counted from their rasters, up to MAX_FACET_COUNTED of them
+    ("truncated" in the metadata when more were left uncounted).
+    """
+    if not isinstance(body, dict):
+        raise ValueError("Request body must be an object")
+    uwis = body.get("uwis", [])
+    if not isinstance(uwis, list) or not all(isinstance(uwi, str) for uwi in uwis):
+        raise ValueError("uwis must be a list of UWI prefixes")
+    prefixes = plan_uwis(uwis) if uwis else [""]
+
+    counted = []
+    tasks = []
+    for prefix in prefixes:
+        if len(prefix) in FACET_PREFIX_LENGTHS:
+            tasks.append(functools.partial(prefix_counter_counts, prefix))
+            continue
+        exact = is_full_uwi(prefix)
+        partitions = [raster_partition(prefix)] if exact else RASTER_PARTITIONS
+        counted.extend((prefix, partition, exact) for partition in partitions)
+    budget = max(MAX_FACET_COUNTED // max(len(counted), 1), 1)
+    tasks.extend(
+        functools.partial(prefix_raster_counts, prefix, partition, exact, budget)
+        for prefix, partition, exact in counted
+    )
+
+    stats = SearchStats()
+    counts = Counter()
+    truncated = False
+    with ThreadPoolExecutor(max_workers=READ_WORKERS) as pool:
+        for task_counts, task_truncated in pool.map(lambda task: task(stats), tasks):
+            counts.update(task_counts)
+            truncated = truncated or task_truncated
+
+    metadata = {
+        "prefixCount": len(prefixes),
+        "truncated": truncated,
+        "pageCount": stats.pages,
+        "readUnits": stats.read_units,
         "generatedAt": datetime.now().isoformat(),
     }
+    return create_response(
+        event,
+        200,
+        {
+            "data": facet_summary(counts),
+            "metadata": metadata,
+        },
+    )
+
+
+##### CHANGES
 
+
+def parse_change_time(value, name):
+    # ISO 8601, normalized to the stored updated_at form (UTC isoformat)
+    try:
+        moment = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        raise ValueError(f"{name} must be an ISO 8601 timestamp")
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(timezone.utc).isoformat()
+
+
+def change_streams(resource, since, until):
+    # Change-index partitions from since to until, day by day
+    first = datetime.fromisoformat(since).date()
+    last = datetime.fromisoformat(until).date()
+    days = [first + timedelta(days=n) for n in range((last - first).days + 1)]
+    return [
+        change_bucket(pk, day.isoformat())
+        for day in days
+        for pk in CHANGE_PARTITIONS[resource]
+    ]
+
+
+def build_change_query_args(bucket, since, until, max_results, exclusive_start_key):
+    query_args = {
+        "IndexName": "change-index",
+        "KeyConditionExpression": Key("change_bucket").eq(bucket)
+        & Key("updated_at").between(since, until),
+        "Limit": max_results,
+        "ReturnConsumedCapacity": "TOTAL",
+    }
+    if exclusive_start_key:
+        query_args["ExclusiveStartKey"] = exclusive_start_key
+    return query_args
+
+
+def query_changes(bucket, since, until, limit, exclusive_start_key, stats):
+    items = []
+    while len(items) < limit:
+        query_args = build_change_query_args(
+            bucket, since, until, limit - len(items), exclusive_start_key
+        )
+        response = query_items(fizz_table, **query_args)
+        # since itself was already seen
+        items.extend(
+            item for item in response["Items"] if item.get("updated_at") != since
+        )
+        stats.record(len(response["Items"]), consumed_units(response))
+        exclusive_start_key = response.get("LastEvaluatedKey")
+        if not exclusive_start_key:
+            break
+    return items, exclusive_start_key
+
+
+def get_changes(event):
+    """
+    GET /changes?since=<updated_at>[&resource=raster|repo][&maxResults=n]
+    [&paginationToken=t]: rasters (or repos) updated after since, a day and
+    write shard at a time (not in global updated_at order). Once a pull is
+    drained (no paginationToken), metadata.watermark is the since of the
+    next pull.
+    """
+    params = event.get("queryStringParameters") or {}
+    resource = params.get("resource", "raster")
+    if resource not in CHANGE_PARTITIONS:
+        raise ValueError(f"resource must be one of: {', '.join(CHANGE_PARTITIONS)}")
+    if not params.get("since"):
+        raise ValueError("since is required")
+    since = parse_change_time(params["since"], "since")
+    max_results = parse_max_results(params.get("maxResults", DEFAULT_RESULTS))
+    now = clock.now()
+    if since < (now - timedelta(days=MAX_CHANGE_DAYS)).isoformat():
+        raise ValueError(
+            f"since must be within {MAX_CHANGE_DAYS} days; re-sync older data "
+            "with search"
+        )
+
+    # A pull reads up to the until fixed on its first page
+    fingerprint = query_fingerprint([resource], since)
+    if params.get("paginationToken"):
+        cursor, token_data = decode_token(params["paginationToken"], fingerprint)
+        until = token_data["u"]
+    else:
+        cursor = (0, {})
+        until = (now - timedelta(seconds=CHANGE_SETTLE_SECONDS)).isoformat()
+
+    streams = change_streams(resource, since, until) if since < until else []
+    index, states = cursor
+    stats = SearchStats()
+    items = []
+    read = 0
+    while (
+        index < len(streams) and len(items) < max_results and read < MAX_CHANGE_STREAMS
+    ):
+        stream_items, last_key = query_changes(
+            streams[index],
+            since,
+            until,
+            max_results - len(items),
+            states.get(index),
+            stats,
+        )
+        items.extend(stream_items)
+        read += 1
+        if last_key:
+            states = {index: last_key}
+        else:
+            index, states = index + 1, {}
+
+    pagination_token = None
+    if index < len(streams):
+        pagination_token = encode_token(fingerprint, (index, states), u=until)
+    metadata = {
+        "returnedCount": len(items),
+        "since": since,
+        "until": until,
+        "watermark": None if pagination_token else max(since, until),
+        "paginationToken": pagination_token,
+        "pageCount": stats.pages,
+        "readUnits": stats.read_units,
+        "generatedAt": datetime.now().isoformat(),
+    }
     return create_response(
         event,
         200,
         {
-            "data": DecimalHandler.decode_decimal(all_items[:max_results]),
+            "data": items,
             "metadata": metadata,
         },
     )
@@ -353,7 +2853,37 @@ def post_search(event, body):
 ###############################################################################
 
 
+def debug_headers(totals):
+    return {
+        "X-Dynamo-Calls": str(totals["DynamoCalls"]),
+        "X-Dynamo-Pages": str(totals["Pages"]),
+        "X-Dynamo-Read-Units": str(totals["ReadUnits"]),
+        "X-Dynamo-Write-Units": str(totals["WriteUnits"]),
+        "X-Dynamo-Items-Evaluated": str(totals["ItemsEvaluated"]),
+        "X-Dynamo-Items-Returned": str(totals["ItemsReturned"]),
+    }
+
+
 def handler(event, context):
+    global metrics
+    metrics = RequestMetrics()
+    response = route(event)
+
+    resource_type = get_resource_type(event) if event.get("path") else ""
+    record = metrics.record_json(
+        resource_type,
+        event.get("httpMethod", ""),
+        response["statusCode"] if response else None,
+    )
+    print(json.dumps(record))
+    if response and get_header(event, DEBUG_HEADER).lower() == "true":
+        headers = debug_headers(record)
+        response["headers"].update(headers)
+        response["headers"]["Access-Control-Expose-Headers"] = ",".join(headers)
+    return response
+
+
+def route(event):
     try:
         http_method = event["httpMethod"]
         resource_type = get_resource_type(event)
@@ -362,18 +2892,28 @@ def handler(event, context):
             return create_response(event, 400, {"error": "Invalid resource type"})
 
         if http_method == "POST":
+            if resource_type == "raster" and is_ndjson(event):
+                return post_rasters_ndjson(event, ndjson_stream(event))
+
             body = parse_body(event)
 
             if resource_type == "job":
+                if get_path_parts(event)[1:2] == ["status"]:
+                    return post_job_statuses(event, body)
                 return post_job_create_or_update(event, body)
 
             elif resource_type == "search":
                 return post_search(event, body)
 
+            elif resource_type == "facet":
+                return post_facets(event, body)
+
             elif resource_type == "repo":
                 return post_repo(event, body)
 
             elif resource_type == "raster":
+                if isinstance(body, dict) and "source" in body:
+                    return post_rasters_ndjson(event, staged_stream(body["source"]))
                 return post_rasters(event, body)
 
             else:
@@ -386,6 +2926,9 @@ def handler(event, context):
             elif resource_type == "job":
                 return get_job_by_id(event)
 
+            elif resource_type == "change":
+                return get_changes(event)
+
         else:
             return create_response(event, 405, {"error": "Method not allowed"})
 
@@ -0,0 +1,97 @@
+"""
+Raster count and facet counters in the fizz table, kept by facet_worker.py
+from the table stream. Each counter scope (all rasters, or a 2 or 5 digit
+UWI prefix: state or county) is one partition "FACET#<prefix>" holding a
+"TOTAL" counter and one "<attribute>#<value>" counter per facet value, each
+an atomically ADDed "count". A counter is split over COUNTER_SHARDS items
+("<counter>#NN", the counter in "counter") so that stream batches applied
+at once rarely update the same item. Reading a scope's counts is one query.
+"""
+
+from collections import Counter
+
+# Constants
+FACET_ATTRIBUTES = ("well_state", "well_county", "calib_type", "calib_log_type")
+FACET_PREFIX_LENGTHS = (0, 2, 5)
+TOTAL_SK = "TOTAL"
+COUNTER_SHARDS = 8
+
+
+def facet_pk(prefix):
+    return f"FACET#{prefix}"
+
+
+def counter_sk(sk, shard):
+    return f"{sk}#{shard:02d}"
+
+
+def is_raster_key(pk):
+    # Sharded rasters and legacy unsharded ones
+    return pk.startswith("RASTER")
+
+
+def facet_values(raster):
+    # (attribute, value) of each facet a raster has
+    values = []
+    for attribute in FACET_ATTRIBUTES:
+        value = str(raster.get(attribute) or "").strip()
+        if value:
+            values.append((attribute, value))
+    return values
+
+
+def facet_keys(raster):
+    """The (pk, sk) of every counter a raster counts towards."""
+    if not raster or not raster.get("uwi") or not is_raster_key(raster["pk"]):
+        return []
+    sks = [TOTAL_SK, *(f"{a}#{v}" for a, v in facet_values(raster))]
+    return [
+        (facet_pk(raster["uwi"][:length]), sk)
+        for length in FACET_PREFIX_LENGTHS
+        if len(raster["uwi"]) >= length
+        for sk in sks
+    ]
+
+
+def facet_deltas(old, new):
+    # Counter changes for a raster going from old to new (either may be None)
+    deltas = Counter(facet_keys(new))
+    deltas.subtract(facet_keys(old))
+    return deltas
+
+
+# Counts are Counters of (attribute, value) -> count; (None, None) is the
+# total
+
+
+def counts_of_counters(counters):
+    counts = Counter()
+    for counter in counters:
+        # Counters from before the sharding have no "counter"
+        sk = counter.get("counter", counter["sk"])
+        if sk == TOTAL_SK:
+            key = (None, None)
+        else:
+            key = tuple(sk.split("#", 1))
+        counts[key] += int(counter.get("count", 0))
+    return counts
+
+
+def counts_of_rasters(rasters):
+    counts = Counter()
+    for raster in rasters:
+        counts[None, None] += 1
+        counts.update(facet_values(raster))
+    return counts
+
+
+def facet_summary(counts):
+    facets = {attribute: {} for attribute in FACET_ATTRIBUTES}
+    ranked = sorted(
+        (-count, attribute, value)
+        for (attribute, value), count in counts.items()
+        if attribute in facets and count > 0
+    )
+    for count, attribute, value in ranked:
+        facets[attribute][value] = -count
+    return {"total": max(counts[None, None], 0), "facets": facets}
@@ -0,0 +1,122 @@
+import hashlib
+import os
+import random
+import time
+from collections import Counter
+
+import boto3
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.exceptions import ClientError
+from facet_store import COUNTER_SHARDS, counter_sk, facet_deltas
+
+# Constants
+TRANSACTION_SIZE = 100
+REQUEST_TOKEN_LENGTH = 36
+# Transactions cancelled by a conflicting one are retried with backoff
+MAX_TRANSACTION_ATTEMPTS = 8
+
+
+dynamodb_client = boto3.client("dynamodb")
+
+fizz_table_name = os.environ["FIZZ_TABLE_NAME"]
+
+type_deserializer = TypeDeserializer()
+
+
+###############################################################################
+
+
+def image_of(record, name):
+    image = record.get("dynamodb", {}).get(name)
+    if not image:
+        return None
+    return {k: type_deserializer.deserialize(v) for k, v in image.items()}
+
+
+def batch_deltas(records):
+    # Net counter changes of a batch of raster stream records
+    deltas = Counter()
+    for record in records:
+        deltas.update(
+            facet_deltas(image_of(record, "OldImage"), image_of(record, "NewImage"))
+        )
+    return sorted((key, delta) for key, delta in deltas.items() if delta)
+
+
+def request_token(records, n):
+    # Same records, same tokens: DynamoDB applies a retried transaction once
+    # (for 10 minutes), so a batch retried after a partial failure does not
+    # count twice
+    event_ids = "|".join(record.get("eventID", "") for record in records)
+    digest = hashlib.sha256(f"{event_ids}#{n}".encode()).hexdigest()
+    return digest[:REQUEST_TOKEN_LENGTH]
+
+
+def counter_shard(token):
+    # Follows the request token, so a retried transaction updates the same
+    # items and stays the same transaction
+    return int(token, 16) % COUNTER_SHARDS
+
+
+def counter_update(key, delta, shard):
+    pk, sk = key
+    return {
+        "Update": {
+            "TableName": fizz_table_name,
+            "Key": {"pk": {"S": pk}, "sk": {"S": counter_sk(sk, shard)}},
+            "UpdateExpression": "SET #counter = :counter ADD #count :delta",
+            "ExpressionAttributeNames": {"#counter": "counter", "#count": "count"},
+            "ExpressionAttributeValues": {
+                ":counter": {"S": sk},
+                ":delta": {"N": str(delta)},
+            },
+        }
+    }
+
+
+def is_conflict(err):
+    # Cancelled by another transaction on the same items, or the same
+    # transaction still in flight from an earlier attempt
+    code = err.response["Error"]["Code"]
+    if code == "TransactionInProgressException":
+        return True
+    reasons = err.response.get("CancellationReasons", [])
+    return code == "TransactionCanceledException" and any(
+        reason.get("Code") == "TransactionConflict" for reason in reasons
+    )
+
+
+def transact_write(updates, token):
+    attempt = 0
+    while True:
+        try:
+            return dynamodb_client.transact_write_items(
+                TransactItems=updates, ClientRequestToken=token
+            )
+        except ClientError as err:
+            attempt += 1
+            if attempt >= MAX_TRANSACTION_ATTEMPTS or not is_conflict(err):
+                raise
+        # Exponential with jitter: ~25ms, 50ms, 100ms ... capped at 1s
+        time.sleep(min(0.025 * 2 ** (attempt - 1), 1) * random.uniform(0.5, 1))
+
+
+def handler(event, context):
+    """
+    Apply a batch of fizz table stream records (NEW_AND_OLD_IMAGES, raster
+    keys only) to the facet counters. Other errors than transaction
+    conflicts fail the whole batch, which is retried as is.
+    """
+    records = event.get("Records", [])
+    deltas = batch_deltas(records)
+    for n in range(0, len(deltas), TRANSACTION_SIZE):
+        token = request_token(records, n)
+        shard = counter_shard(token)
+        transact_write(
+            [
+                counter_update(key, delta, shard)
+                for key, delta in deltas[n : n + TRANSACTION_SIZE]
+            ],
+            token,
+        )
+    return {"updated": len(deltas)}
@@ -0,0 +1,119 @@
+"""
+Job writes shared by the API handler and the job worker. Large payloads
+(the selected "items", the result "body") are kept out of the job row:
+they are stored zlib-compressed in sibling jobs-table items
+"<job id>#<attribute>#<digest>#<n>" that expire with the job, and the row
+holds a small "<attribute>_ref" instead. Job writes stay constant-size
+however many rows a job carries.
+"""
+
+import hashlib
+import json
+import zlib
+from decimal import Decimal
+
+# Constants
+INLINE_BYTES = 16 * 1024
+CHUNK_BYTES = 256 * 1024
+PAYLOAD_ATTRIBUTES = ("items", "body")
+
+
+def encode_number(o):
+    if isinstance(o, Decimal):
+        return int(o) if o % 1 == 0 else float(o)
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+def payload_chunk_id(job_id, attribute, digest, n):
+    return f"{job_id}#{attribute}#{digest}#{n}"
+
+
+def offload_payloads(table, job_id, attributes, ttl, get_current=None):
+    """
+    Returns (attributes to set, attributes to remove) for a job write, with
+    large payloads swapped for refs. get_current, if given, returns the
+    job's current refs; a payload matching its current ref is not rewritten
+    (superseded chunks are left to expire).
+    """
+    attributes = dict(attributes)
+    remove = []
+    current = None
+    for attribute in PAYLOAD_ATTRIBUTES:
+        if attribute not in attributes:
+            continue
+        ref_name = f"{attribute}_ref"
+        raw = json.dumps(
+            attributes[attribute], default=encode_number, separators=(",", ":")
+        ).encode()
+        if len(raw) <= INLINE_BYTES:
+            remove.append(ref_name)
+            continue
+
+        del attributes[attribute]
+        digest = hashlib.sha256(raw).hexdigest()[:16]
+        if get_current and current is None:
+            current = get_current() or {}
+        if (current or {}).get(ref_name, {}).get("digest") == digest:
+            continue
+
+        data = zlib.compress(raw)
+        chunks = [data[i : i + CHUNK_BYTES] for i in range(0, len(data), CHUNK_BYTES)]
+        for n, chunk in enumerate(chunks):
+            item = {"id": payload_chunk_id(job_id, attribute, digest, n), "data": chunk}
+            if ttl is not None:
+                item["ttl"] = ttl
+            table.put_item(Item=item)
+        attributes[ref_name] = {
+            "digest": digest,
+            "chunks": len(chunks),
+            "bytes": len(raw),
+        }
+        remove.append(attribute)
+    return attributes, remove
+
+
+def load_payloads(table, job):
+    """Put out-of-line payloads back in place of their refs."""
+    for attribute in PAYLOAD_ATTRIBUTES:
+        ref = job.pop(f"{attribute}_ref", None)
+        if not ref:
+            continue
+        data = b""
+        for n in range(int(ref["chunks"])):
+            chunk_id = payload_chunk_id(job["id"], attribute, ref["digest"], n)
+            item = table.get_item(Key={"id": chunk_id}, ConsistentRead=True).get("Item")
+            if item is None:
+                raise RuntimeError(f"Missing job payload chunk {chunk_id}")
+            data += getattr(item["data"], "value", item["data"])
+        job[attribute] = json.loads(zlib.decompress(data), parse_float=Decimal)
+    return job
+
+
+def without_payloads(job):
+    """The job without its payloads, in line or out of line."""
+    dropped = {*PAYLOAD_ATTRIBUTES, *(f"{a}_ref" for a in PAYLOAD_ATTRIBUTES)}
+    return {k: v for k, v in job.items() if k not in dropped}
+
+
+def job_update_args(job_id, attributes, remove=()):
+    # SET the given attributes (and REMOVE others); nothing else is touched
+    update_parts = []
+    expr_names = {}
+    expr_values = {}
+
+    for key, value in attributes.items():
+        update_parts.append(f"#{key} = :{key}")
+        expr_names[f"#{key}"] = key
+        expr_values[f":{key}"] = value
+
+    update_expression = "SET " + ", ".join(update_parts)
+    if remove:
+        update_expression += " REMOVE " + ", ".join(f"#{key}" for key in remove)
+        expr_names.update({f"#{key}": key for key in remove})
+
+    return {
+        "Key": {"id": job_id},
+        "UpdateExpression": update_expression,
+        "ExpressionAttributeNames": expr_names,
+        "ExpressionAttributeValues": expr_values,
+    }
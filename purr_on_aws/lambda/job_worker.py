@@ -0,0 +1,134 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import boto3
+from boto3.dynamodb.conditions import Attr
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.exceptions import ClientError
+from job_store import job_update_args, load_payloads, offload_payloads
+
+# Constants
+JOB_WORKERS = 8
+PENDING = "pending"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+
+dynamodb = boto3.resource("dynamodb")
+
+jobs_table = dynamodb.Table(os.environ["JOBS_TABLE_NAME"])  # type: ignore
+
+type_deserializer = TypeDeserializer()
+
+# directive -> function(job) returning the job's result body. Jobs whose
+# directive is not registered here are left pending for other workers.
+directives = {}
+
+
+def directive(name):
+    def register(func):
+        directives[name] = func
+        return func
+
+    return register
+
+
+###############################################################################
+
+
+def job_from_record(record):
+    if record.get("eventName") not in {"INSERT", "MODIFY"}:
+        return None
+    image = record.get("dynamodb", {}).get("NewImage")
+    if not image:
+        return None
+    return {k: type_deserializer.deserialize(v) for k, v in image.items()}
+
+
+def update_job(job, attributes, condition=None):
+    # Same SET shape as post_job_create_or_update, so either can follow the
+    # other; updated_at moves on every transition. A large result body is
+    # stored out of line with the job's ttl.
+    update_data = {**attributes, "updated_at": datetime.now(timezone.utc).isoformat()}
+    update_data, remove = offload_payloads(
+        jobs_table, job["id"], update_data, job.get("ttl")
+    )
+
+    update_args = job_update_args(job["id"], update_data, remove)
+    if condition is not None:
+        update_args["ConditionExpression"] = condition
+    jobs_table.update_item(**update_args)
+
+
+def claim_job(job, claim):
+    """
+    Move a pending job to running. The claim (the stream record's sequence
+    number) lets a retried record take back its own job while still running,
+    while duplicate deliveries, other records and redeliveries after the job
+    finished find it taken. Returns False if taken.
+    """
+    try:
+        update_job(
+            job,
+            {"status": RUNNING, "claim": claim},
+            Attr("status").eq(PENDING)
+            | (Attr("claim").eq(claim) & Attr("status").eq(RUNNING)),
+        )
+        return True
+    except ClientError as err:
+        if err.response["Error"]["Code"] == "ConditionalCheckFailedException":
+            return False
+        raise
+
+
+def process_job(job, claim):
+    if job.get("status") != PENDING or job.get("directive") not in directives:
+        return
+    if not claim_job(job, claim):
+        return
+
+    try:
+        body = directives[job["directive"]](load_payloads(jobs_table, job))
+    except Exception as e:
+        # The job failed, not the record: report it on the job
+        print(f"Job {job['id']} ({job['directive']}) FAIL: {e}")
+        update_job(job, {"status": FAILED, "body": str(e)})
+        return
+    update_job(job, {"status": COMPLETED, "body": body})
+
+
+def process_records(entries):
+    """
+    Run one job's records in stream order. On an error the record and the
+    rest of the job's records are returned for retry.
+    """
+    for n, (record, job) in enumerate(entries):
+        try:
+            if job:
+                process_job(job, record["dynamodb"]["SequenceNumber"])
+        except Exception as e:
+            print(f"Job record {record.get('eventID')} FAIL: {e}")
+            return [r["dynamodb"]["SequenceNumber"] for r, _ in entries[n:]]
+    return []
+
+
+def handler(event, context):
+    # Records for different jobs are independent and run concurrently
+    by_job = {}
+    for record in event.get("Records", []):
+        job = job_from_record(record)
+        key = job["id"] if job and "id" in job else record.get("eventID")
+        by_job.setdefault(key, []).append((record, job))
+
+    with ThreadPoolExecutor(max_workers=JOB_WORKERS) as pool:
+        failed = list(pool.map(process_records, by_job.values()))
+
+    return {
+        "batchItemFailures": [
+            {"itemIdentifier": sequence_number}
+            for sequence_numbers in failed
+            for sequence_number in sequence_numbers
+        ]
+    }
@@ -0,0 +1,701 @@
+"""
+In-memory DynamoDB stand-in for the unit tests and the local benchmarks.
+It speaks enough of the low-level client API (wire format) and the Table
+resource API (plain values) for the lambda modules, can add per-call
+latency and throttle batch writes, and counts every call and read unit so
+round trips and capacity can be reported.
+
+    standin = StandIn(latency=0.005)
+    standin.create_table("bench-fizz", ("pk", "sk"), {"pk-uwi-index": ("pk", "uwi")})
+    standin.install(dynamodb_handler)
+"""
+
+import math
+import random
+import re
+import threading
+import time
+from collections import Counter
+from decimal import Decimal
+
+from boto3.dynamodb.conditions import ConditionExpressionBuilder
+from boto3.dynamodb.types import Binary, TypeDeserializer, TypeSerializer
+from botocore.exceptions import ClientError
+
+serializer = TypeSerializer()
+deserializer = TypeDeserializer()
+
+TOKEN_PATTERN = re.compile(
+    r"\s*(<>|<=|>=|=|<|>|\(|\)|,|[#:]?[A-Za-z_][A-Za-z0-9_.\-]*)"
+)
+
+
+def to_wire(item):
+    return {k: serializer.serialize(v) for k, v in item.items()}
+
+
+def from_wire(item):
+    return {k: deserializer.deserialize(v) for k, v in item.items()}
+
+
+def client_error(code, message, operation):
+    return ClientError({"Error": {"Code": code, "Message": message}}, operation)
+
+
+def item_size(item):
+    # Rough DynamoDB item size: attribute names plus value lengths
+    return sum(
+        len(k) + (len(v.value) if isinstance(v, Binary) else len(str(v)))
+        for k, v in item.items()
+    )
+
+
+def read_units(size):
+    # Strongly consistent read units: one per 4 KB, rounded up
+    return max(1, math.ceil(size / 4096))
+
+
+class Expression:
+    """
+    Parser/evaluator for the condition expressions the handler produces:
+    comparisons, BETWEEN, IN, AND/OR/NOT and begins_with, contains,
+    attribute_exists, attribute_not_exists.
+    """
+
+    def __init__(self, text, names, values):
+        self.tokens = TOKEN_PATTERN.findall(text)
+        self.names = names or {}
+        self.values = values or {}
+        self.pos = 0
+        self.tree = self.parse_or()
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def take(self, expected=None):
+        token = self.peek()
+        if expected and (token or "").upper() != expected:
+            raise ValueError(f"Expected {expected}, got {token}")
+        self.pos += 1
+        return token
+
+    def parse_or(self):
+        node = self.parse_and()
+        while (self.peek() or "").upper() == "OR":
+            self.take()
+            node = ("or", node, self.parse_and())
+        return node
+
+    def parse_and(self):
+        node = self.parse_not()
+        while (self.peek() or "").upper() == "AND":
+            self.take()
+            node = ("and", node, self.parse_not())
+        return node
+
+    def parse_not(self):
+        if (self.peek() or "").upper() == "NOT":
+            self.take()
+            return ("not", self.parse_not())
+        return self.parse_comparison()
+
+    def parse_comparison(self):
+        if self.peek() == "(":
+            self.take()
+            node = self.parse_or()
+            self.take(")")
+            return node
+        left = self.parse_operand()
+        if left[0] == "call":
+            return left
+        op = (self.peek() or "").upper()
+        if op == "BETWEEN":
+            self.take()
+            low = self.parse_operand()
+            self.take("AND")
+            return ("between", left, low, self.parse_operand())
+        if op == "IN":
+            self.take()
+            self.take("(")
+            options = [self.parse_operand()]
+            while self.peek() == ",":
+                self.take()
+                options.append(self.parse_operand())
+            self.take(")")
+            return ("in", left, options)
+        self.take()
+        return ("cmp", op, left, self.parse_operand())
+
+    def parse_operand(self):
+        token = self.take()
+        if self.peek() == "(":
+            self.take()
+            args = [self.parse_operand()]
+            while self.peek() == ",":
+                self.take()
+                args.append(self.parse_operand())
+            self.take(")")
+            return ("call", token, args)
+        if token.startswith(":"):
+            return ("value", self.values[token])
+        return ("path", self.names.get(token, token))
+
+    def equality(self, path, node=None):
+        # Value an AND-ed "path = :value" pins path to, as in a key condition
+        node = node or self.tree
+        if node[0] == "and":
+            found = self.equality(path, node[1])
+            return found if found is not None else self.equality(path, node[2])
+        if node[0] == "cmp" and node[1] == "=" and node[2] == ("path", path):
+            return node[3][1] if node[3][0] == "value" else None
+        return None
+
+    def operand(self, node, item):
+        if node[0] == "value":
+            return node[1]
+        return item.get(node[1])
+
+    def evaluate(self, item, node=None):
+        node = node or self.tree
+        kind = node[0]
+        if kind == "and":
+            return self.evaluate(item, node[1]) and self.evaluate(item, node[2])
+        if kind == "or":
+            return self.evaluate(item, node[1]) or self.evaluate(item, node[2])
+        if kind == "not":
+            return not self.evaluate(item, node[1])
+        if kind == "between":
+            value = self.operand(node[1], item)
+            low, high = self.operand(node[2], item), self.operand(node[3], item)
+            return value is not None and low <= value <= high
+        if kind == "in":
+            value = self.operand(node[1], item)
+            return value in [self.operand(o, item) for o in node[2]]
+        if kind == "call":
+            name, args = node[1], node[2]
+            if name == "attribute_exists":
+                return args[0][1] in item
+            if name == "attribute_not_exists":
+                return args[0][1] not in item
+            value, arg = self.operand(args[0], item), self.operand(args[1], item)
+            if value is None:
+                return False
+            if name == "begins_with":
+                return str(value).startswith(arg)
+            if name == "contains":
+                return arg in value
+            raise ValueError(f"Unsupported function {name}")
+        op, left, right = (
+            node[1],
+            self.operand(node[2], item),
+            self.operand(node[3], item),
+        )
+        if op == "=":
+            return left == right
+        if op == "<>":
+            return left != right
+        if left is None or right is None:
+            return False
+        return {
+            "<": left < right,
+            "<=": left <= right,
+            ">": left > right,
+            ">=": left >= right,
+        }[op]
+
+
+class Table:
+    def __init__(self, name, key_names, indexes=None):
+        self.name = name
+        self.key_names = tuple(key_names)
+        self.indexes = indexes or {}
+        self.items = {}
+        # index name (None for the table) -> hash key value -> item key ->
+        # item, so a query reads one partition rather than every item
+        self.partitions = {None: {}, **{name: {} for name in self.indexes}}
+        self.lock = threading.Lock()
+
+    def key_of(self, item):
+        return tuple(item[k] for k in self.key_names)
+
+    def store(self, key, item):
+        # Under self.lock; item None deletes
+        current = self.items.pop(key, None)
+        for index_name, partitions in self.partitions.items():
+            hash_key = self.schema(index_name)[0]
+            if current is not None and hash_key in current:
+                partitions.get(current[hash_key], {}).pop(key, None)
+            if item is not None and hash_key in item:
+                partitions.setdefault(item[hash_key], {})[key] = item
+        if item is not None:
+            self.items[key] = item
+
+    def schema(self, index_name):
+        if index_name:
+            return self.indexes[index_name]
+        return self.key_names if len(self.key_names) == 2 else (self.key_names[0], None)
+
+    def query(self, args):
+        hash_key, range_key = self.schema(args.get("IndexName"))
+        names = args.get("ExpressionAttributeNames")
+        values = args.get("ExpressionAttributeValues")
+        key_condition = Expression(args["KeyConditionExpression"], names, values)
+        hash_value = key_condition.equality(hash_key)
+        with self.lock:
+            partitions = self.partitions.get(args.get("IndexName"))
+            if hash_value is None or partitions is None:
+                items = self.items.values()
+            else:
+                items = list(partitions.get(hash_value, {}).values())
+            candidates = [
+                item
+                for item in items
+                if hash_key in item
+                and (range_key is None or range_key in item)
+                and key_condition.evaluate(item)
+            ]
+
+        def order(item):
+            index_order = (item.get(range_key),) if range_key else ()
+            return index_order + self.key_of(item)
+
+        candidates.sort(key=order, reverse=args.get("ScanIndexForward") is False)
+        start = args.get("ExclusiveStartKey")
+        if start:
+            start_order = order(start)
+            reverse = args.get("ScanIndexForward") is False
+            candidates = [
+                item
+                for item in candidates
+                if (order(item) < start_order if reverse else order(item) > start_order)
+            ]
+
+        limit = args.get("Limit")
+        page = candidates[:limit] if limit else candidates
+        response = {
+            "ScannedCount": len(page),
+            "ScannedSize": sum(item_size(item) for item in page),
+        }
+        if limit and len(page) == limit and page:
+            last = page[-1]
+            last_key = {k: last[k] for k in self.key_names}
+            if range_key:
+                last_key[hash_key] = last[hash_key]
+                last_key[range_key] = last[range_key]
+            response["LastEvaluatedKey"] = last_key
+
+        if args.get("FilterExpression"):
+            condition = Expression(args["FilterExpression"], names, values)
+            page = [item for item in page if condition.evaluate(item)]
+        projection = args.get("ProjectionExpression")
+        if projection:
+            fields = [names.get(f.strip(), f.strip()) for f in projection.split(",")]
+            page = [{f: item[f] for f in fields if f in item} for item in page]
+        response["Items"] = [dict(item) for item in page]
+        response["Count"] = len(page)
+        return response
+
+    def put(self, item, condition=None):
+        with self.lock:
+            current = self.items.get(self.key_of(item))
+            if condition and not condition.evaluate(current or {}):
+                raise client_error(
+                    "ConditionalCheckFailedException",
+                    "The conditional request failed",
+                    "PutItem",
+                )
+            self.store(self.key_of(item), dict(item))
+
+    def units_for(self, key):
+        # Reads are charged on the whole item, whatever is projected
+        with self.lock:
+            item = self.items.get(self.key_of(key))
+        return read_units(item_size(item) if item else 0)
+
+    def get(self, key, projection=None, names=None):
+        with self.lock:
+            item = self.items.get(self.key_of(key))
+        if item is None:
+            return None
+        if projection:
+            fields = [
+                (names or {}).get(f.strip(), f.strip()) for f in projection.split(",")
+            ]
+            return {f: item[f] for f in fields if f in item}
+        return dict(item)
+
+    def update(self, key, expression, names, values, condition=None):
+        with self.lock:
+            current = self.items.get(self.key_of(key))
+            if condition and not condition.evaluate(current or {}):
+                raise client_error(
+                    "ConditionalCheckFailedException",
+                    "The conditional request failed",
+                    "UpdateItem",
+                )
+            item = dict(current or key)
+            apply_update(item, expression, names or {}, values or {})
+            self.store(self.key_of(key), item)
+            return item
+
+    def delete(self, key):
+        with self.lock:
+            self.store(self.key_of(key), None)
+
+
+def apply_update(item, expression, names, values):
+    # SET a = :v, b = if_not_exists(b, :w) | ADD c :n | REMOVE d
+    clauses = re.split(r"\b(SET|ADD|REMOVE)\b", expression)
+    action = None
+    for part in clauses:
+        part = part.strip()
+        if part in {"SET", "ADD", "REMOVE"}:
+            action = part
+            continue
+        if not part:
+            continue
+        for assignment in [a.strip() for a in re.split(r",(?![^(]*\))", part)]:
+            if action == "SET":
+                target, source = [x.strip() for x in assignment.split("=", 1)]
+                target = names.get(target, target)
+                match = re.match(r"if_not_exists\((\S+),\s*(\S+)\)", source)
+                if match:
+                    if target not in item:
+                        item[target] = values[match[2]]
+                else:
+                    plus = re.match(r"(\S+)\s*\+\s*(\S+)", source)
+                    if plus:
+                        path = names.get(plus[1], plus[1])
+                        item[target] = item.get(path, 0) + values[plus[2]]
+                    else:
+                        item[target] = values[source]
+            elif action == "ADD":
+                target, source = assignment.split()
+                target = names.get(target, target)
+                value = values[source]
+                if isinstance(value, set):
+                    item[target] = set(item.get(target, set())) | value
+                else:
+                    item[target] = item.get(target, Decimal(0)) + value
+            elif action == "REMOVE":
+                item.pop(names.get(assignment, assignment), None)
+
+
+class StandInClient:
+    """Low-level client facade (wire format in and out)."""
+
+    def __init__(self, standin):
+        self.standin = standin
+
+    def call(self, operation):
+        self.standin.record(operation)
+
+    def query(self, TableName, ReturnConsumedCapacity=None, **args):
+        self.call("Query")
+        table = self.standin.tables[TableName]
+        args = dict(args)
+        if "ExpressionAttributeValues" in args:
+            args["ExpressionAttributeValues"] = from_wire(
+                args["ExpressionAttributeValues"]
+            )
+        if "ExclusiveStartKey" in args:
+            args["ExclusiveStartKey"] = from_wire(args["ExclusiveStartKey"])
+        response = table.query(args)
+        units = read_units(response.pop("ScannedSize"))
+        self.standin.count_read(TableName, response["ScannedCount"], units)
+        response["Items"] = [to_wire(item) for item in response["Items"]]
+        if "LastEvaluatedKey" in response:
+            response["LastEvaluatedKey"] = to_wire(response["LastEvaluatedKey"])
+        return self.standin.with_capacity(
+            response, TableName, units, ReturnConsumedCapacity
+        )
+
+    def get_item(self, TableName, Key, ReturnConsumedCapacity=None, **args):
+        self.call("GetItem")
+        item = self.standin.tables[TableName].get(
+            from_wire(Key),
+            args.get("ProjectionExpression"),
+            args.get("ExpressionAttributeNames"),
+        )
+        units = self.standin.tables[TableName].units_for(from_wire(Key))
+        self.standin.count_read(TableName, 1, units)
+        response = {"Item": to_wire(item)} if item is not None else {}
+        return self.standin.with_capacity(
+            response, TableName, units, ReturnConsumedCapacity
+        )
+
+    def batch_get_item(self, RequestItems, ReturnConsumedCapacity=None):
+        self.call("BatchGetItem")
+        responses, unprocessed, capacity = {}, {}, []
+        for table_name, request in RequestItems.items():
+            table = self.standin.tables[table_name]
+            keys = [from_wire(key) for key in request["Keys"]]
+            if len(keys) > 100:
+                raise client_error(
+                    "ValidationException", "Too many keys", "BatchGetItem"
+                )
+            if len({table.key_of(key) for key in keys}) != len(keys):
+                raise client_error(
+                    "ValidationException",
+                    "Provided list of item keys contains duplicates",
+                    "BatchGetItem",
+                )
+            keys, deferred = self.standin.throttle(keys)
+            if deferred:
+                unprocessed[table_name] = {
+                    **request,
+                    "Keys": [to_wire(key) for key in deferred],
+                }
+            found = [
+                table.get(
+                    key,
+                    request.get("ProjectionExpression"),
+                    request.get("ExpressionAttributeNames"),
+                )
+                for key in keys
+            ]
+            units = sum(table.units_for(key) for key in keys)
+            self.standin.count_read(table_name, len(keys), units)
+            responses[table_name] = [to_wire(item) for item in found if item]
+            if ReturnConsumedCapacity and ReturnConsumedCapacity != "NONE":
+                capacity.append(
+                    {"TableName": table_name, "CapacityUnits": float(units)}
+                )
+        response = {"Responses": responses, "UnprocessedKeys": unprocessed}
+        if capacity:
+            response["ConsumedCapacity"] = capacity
+        return response
+
+    def batch_write_item(self, RequestItems, ReturnConsumedCapacity=None):
+        self.call("BatchWriteItem")
+        unprocessed = {}
+        for table_name, requests in RequestItems.items():
+            table = self.standin.tables[table_name]
+            if len(requests) > 25:
+                raise client_error(
+                    "ValidationException", "Too many items", "BatchWriteItem"
+                )
+            requests, deferred = self.standin.throttle(requests)
+            if deferred:
+                unprocessed[table_name] = deferred
+            for request in requests:
+                if "PutRequest" in request:
+                    table.put(from_wire(request["PutRequest"]["Item"]))
+                else:
+                    table.delete(from_wire(request["DeleteRequest"]["Key"]))
+            self.standin.count_write(table_name, len(requests))
+        return {"UnprocessedItems": unprocessed}
+
+    def put_item(self, TableName, Item, ReturnConsumedCapacity=None, **args):
+        self.call("PutItem")
+        condition = None
+        if "ConditionExpression" in args:
+            condition = Expression(
+                args["ConditionExpression"],
+                args.get("ExpressionAttributeNames"),
+                from_wire(args.get("ExpressionAttributeValues", {})),
+            )
+        self.standin.tables[TableName].put(from_wire(Item), condition)
+        self.standin.count_write(TableName, 1)
+        return self.standin.with_capacity({}, TableName, 1, ReturnConsumedCapacity)
+
+    def update_item(
+        self, TableName, Key, UpdateExpression, ReturnConsumedCapacity=None, **args
+    ):
+        self.call("UpdateItem")
+        values = from_wire(args.get("ExpressionAttributeValues", {}))
+        names = args.get("ExpressionAttributeNames", {})
+        condition = None
+        if "ConditionExpression" in args:
+            condition = Expression(args["ConditionExpression"], names, values)
+        item = self.standin.tables[TableName].update(
+            from_wire(Key), UpdateExpression, names, values, condition
+        )
+        self.standin.count_write(TableName, 1)
+        response = {}
+        if args.get("ReturnValues") in {"ALL_NEW", "UPDATED_NEW"}:
+            response["Attributes"] = to_wire(item)
+        return self.standin.with_capacity(
+            response, TableName, 1, ReturnConsumedCapacity
+        )
+
+    def transact_write_items(self, TransactItems, ClientRequestToken=None, **args):
+        # Updates only, applied in turn; a repeated ClientRequestToken is not
+        # applied again
+        self.call("TransactWriteItems")
+        with self.standin.lock:
+            if ClientRequestToken in self.standin.request_tokens:
+                return {}
+            if ClientRequestToken:
+                self.standin.request_tokens.add(ClientRequestToken)
+        for action in TransactItems:
+            update = action["Update"]
+            self.standin.tables[update["TableName"]].update(
+                from_wire(update["Key"]),
+                update["UpdateExpression"],
+                update.get("ExpressionAttributeNames", {}),
+                from_wire(update.get("ExpressionAttributeValues", {})),
+            )
+            # Transactional writes cost twice
+            self.standin.count_write(update["TableName"], 2)
+        return {}
+
+
+class StandInTable:
+    """Table resource facade (plain Python values, boto3 conditions)."""
+
+    def __init__(self, standin, name):
+        self.standin = standin
+        self.name = name
+        self.client = standin.client
+
+    def compile(self, args):
+        # Turn boto3 condition objects into expression strings, as the
+        # resource layer does before calling the client
+        args = dict(args)
+        builder = ConditionExpressionBuilder()
+        names = dict(args.pop("ExpressionAttributeNames", {}))
+        values = dict(args.pop("ExpressionAttributeValues", {}))
+        for arg in (
+            "KeyConditionExpression",
+            "FilterExpression",
+            "ConditionExpression",
+        ):
+            condition = args.get(arg)
+            if condition is not None and not isinstance(condition, str):
+                built = builder.build_expression(
+                    condition, is_key_condition=arg == "KeyConditionExpression"
+                )
+                args[arg] = built.condition_expression
+                names.update(built.attribute_name_placeholders)
+                values.update(built.attribute_value_placeholders)
+        if names:
+            args["ExpressionAttributeNames"] = names
+        if values:
+            args["ExpressionAttributeValues"] = to_wire(values)
+        return args
+
+    def plain(self, response):
+        response = dict(response)
+        for key in ("Item", "Attributes", "LastEvaluatedKey"):
+            if key in response:
+                response[key] = from_wire(response[key])
+        if "Items" in response:
+            response["Items"] = [from_wire(item) for item in response["Items"]]
+        return response
+
+    def query(self, **args):
+        args = self.compile(args)
+        if "ExclusiveStartKey" in args:
+            args["ExclusiveStartKey"] = to_wire(args["ExclusiveStartKey"])
+        return self.plain(self.client.query(TableName=self.name, **args))
+
+    def get_item(self, Key, **args):
+        return self.plain(
+            self.client.get_item(TableName=self.name, Key=to_wire(Key), **args)
+        )
+
+    def put_item(self, Item, **args):
+        args = self.compile(args)
+        return self.plain(
+            self.client.put_item(TableName=self.name, Item=to_wire(Item), **args)
+        )
+
+    def update_item(self, Key, **args):
+        args = self.compile(args)
+        return self.plain(
+            self.client.update_item(TableName=self.name, Key=to_wire(Key), **args)
+        )
+
+
+class StandInResource:
+    def __init__(self, standin):
+        self.standin = standin
+
+    def Table(self, name):
+        return StandInTable(self.standin, name)
+
+    def batch_get_item(self, RequestItems, **args):
+        request = {
+            name: {**r, "Keys": [to_wire(k) for k in r["Keys"]]}
+            for name, r in RequestItems.items()
+        }
+        response = self.standin.client.batch_get_item(RequestItems=request, **args)
+        return {
+            **response,
+            "Responses": {
+                name: [from_wire(item) for item in items]
+                for name, items in response["Responses"].items()
+            },
+            "UnprocessedKeys": {
+                name: {**r, "Keys": [from_wire(k) for k in r["Keys"]]}
+                for name, r in response["UnprocessedKeys"].items()
+            },
+        }
+
+
+class StandIn:
+    def __init__(self, latency=0.0, throttle_rate=0.0, seed=0):
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.random = random.Random(seed)
+        self.tables = {}
+        self.lock = threading.Lock()
+        self.calls = Counter()
+        self.reads = Counter()
+        self.read_units = Counter()
+        self.writes = Counter()
+        self.request_tokens = set()
+        self.client = StandInClient(self)
+        self.resource = StandInResource(self)
+
+    def create_table(self, name, key_names, indexes=None):
+        self.tables[name] = Table(name, key_names, indexes)
+        return self.resource.Table(name)
+
+    def install(self, handler):
+        """Point a dynamodb_handler module at this stand-in."""
+        handler.dynamodb = self.resource
+        handler.dynamodb_client = self.client
+        handler.fizz_table = self.resource.Table(handler.fizz_table.name)
+        handler.jobs_table = self.resource.Table(handler.jobs_table.name)
+
+    def record(self, operation):
+        with self.lock:
+            self.calls[operation] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def count_read(self, table_name, count, units):
+        with self.lock:
+            self.reads[table_name] += count
+            self.read_units[table_name] += units
+
+    def count_write(self, table_name, count):
+        with self.lock:
+            self.writes[table_name] += count
+
+    def throttle(self, requests):
+        # Defer a random share of a batch, as DynamoDB does under throttling
+        if not self.throttle_rate or len(requests) < 2:
+            return requests, []
+        with self.lock:
+            deferred = [
+                r for r in requests if self.random.random() < self.throttle_rate
+            ]
+        return [r for r in requests if r not in deferred], deferred
+
+    def with_capacity(self, response, table_name, units, return_consumed):
+        if return_consumed and return_consumed != "NONE":
+            response["ConsumedCapacity"] = {
+                "TableName": table_name,
+                "CapacityUnits": float(units),
+            }
+        return response
+
+    def reset_counters(self):
+        with self.lock:
+            self.calls.clear()
+            self.reads.clear()
+            self.read_units.clear()
+            self.writes.clear()
@@ -0,0 +1,111 @@
+import base64
+import json
+import os
+import sys
+from collections import Counter, OrderedDict
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+# The lambda modules read these at import time
+os.environ.setdefault("PURR_SUBDOMAIN", "test")
+os.environ.setdefault("PURR_DOMAIN", "purr.io")
+os.environ.setdefault("FIZZ_TABLE_NAME", "test-fizz")
+os.environ.setdefault("JOBS_TABLE_NAME", "test-jobs")
+os.environ.setdefault("SEARCH_TOKEN_SECRET", "test-secret")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "lambda"))
+
+import dynamodb_handler  # noqa: E402
+from tests.standin import StandIn  # noqa: E402
+
+ORIGIN = "http://localhost:3000"
+FIZZ_INDEXES = {
+    "pk-uwi-index": ("pk", "uwi"),
+    "geo-cell-index": ("geo_cell", "geohash"),
+    "pk-well-name-index": ("pk", "sort_well_name"),
+    "pk-depth-index": ("pk", "sort_depth"),
+    "change-index": ("change_bucket", "updated_at"),
+}
+
+
+class FakeClock(dynamodb_handler.Clock):
+    """
+    Time that only moves when slept through or advanced. Callbacks given to
+    at() run once the clock reaches their time, as a job worker finishing a
+    job while a long poll sleeps.
+    """
+
+    def __init__(self):
+        self.start = datetime(2026, 10, 18, 12, tzinfo=timezone.utc)
+        self.elapsed = 0.0
+        self.due = []
+
+    def now(self):
+        return self.start + timedelta(seconds=self.elapsed)
+
+    def monotonic(self):
+        return self.elapsed
+
+    def sleep(self, seconds):
+        self.advance(seconds)
+
+    def advance(self, seconds):
+        self.elapsed += seconds
+        while self.due and self.due[0][0] <= self.elapsed:
+            _, callback = self.due.pop(0)
+            callback()
+
+    def at(self, seconds, callback):
+        self.due.append((seconds, callback))
+        self.due.sort(key=lambda due: due[0])
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(dynamodb_handler, "clock", fake)
+    return fake
+
+
+@pytest.fixture
+def api(monkeypatch, clock):
+    """
+    dynamodb_handler against a stand-in fizz and jobs table, on the fake
+    clock. Returns call(method, path, body, headers, **query params) ->
+    (status, JSON body), and the stand-in.
+    """
+    standin = StandIn()
+    fizz_table = standin.create_table("test-fizz", ("pk", "sk"), FIZZ_INDEXES)
+    jobs_table = standin.create_table("test-jobs", ("id",))
+    monkeypatch.setattr(dynamodb_handler, "dynamodb", standin.resource)
+    monkeypatch.setattr(dynamodb_handler, "dynamodb_client", standin.client)
+    monkeypatch.setattr(dynamodb_handler, "fizz_table", fizz_table)
+    monkeypatch.setattr(dynamodb_handler, "jobs_table", jobs_table)
+    # Warm-container state starts cold
+    for name in ("read_cache", "search_cache"):
+        monkeypatch.setattr(dynamodb_handler, name, OrderedDict())
+    for name in ("read_cache_versions", "selectivity_cache"):
+        monkeypatch.setattr(dynamodb_handler, name, {})
+    monkeypatch.setattr(dynamodb_handler, "search_cache_stats", Counter())
+
+    def call(method, path, body=None, headers=None, **params):
+        parts = path.strip("/").split("/")
+        event = {
+            "httpMethod": method,
+            "path": path,
+            "headers": {"origin": ORIGIN, **(headers or {})},
+            "pathParameters": {"id": parts[1]} if len(parts) == 2 else None,
+            "queryStringParameters": params or None,
+            "body": body,
+        }
+        # A str body is sent as is and a bytes one base64 encoded
+        if isinstance(body, bytes):
+            event["body"] = base64.b64encode(body).decode()
+            event["isBase64Encoded"] = True
+        elif body is not None and not isinstance(body, str):
+            event["body"] = json.dumps(body)
+        response = dynamodb_handler.handler(event, None)
+        return response["statusCode"], json.loads(response["body"])
+
+    return call, standin
@@ -0,0 +1,39 @@
+import aws_cdk as core
+import aws_cdk.assertions as assertions
+
+from api_stack.api_stack import ApiStack
+
+
+# Synthesize from purr_on_aws/, where the Lambda code asset ("lambda") lives
+def test_tables_and_functions_created():
+    app = core.App()
+    stack = ApiStack(app, "api-stack")
+    template = assertions.Template.from_stack(stack)
+
+    template.has_resource_properties(
+        "AWS::DynamoDB::Table",
+        {
+            "KeySchema": [
+                {"AttributeName": "id", "KeyType": "HASH"},
+            ],
+            "TimeToLiveSpecification": {"AttributeName": "ttl", "Enabled": True},
+            "StreamSpecification": {"StreamViewType": "NEW_IMAGE"},
+        },
+    )
+    template.has_resource_properties(
+        "AWS::Lambda::Function", {"Handler": "dynamodb_handler.handler"}
+    )
+    template.has_resource_properties(
+        "AWS::Lambda::Function", {"Handler": "job_worker.handler"}
+    )
+    template.has_resource_properties(
+        "AWS::Lambda::Function", {"Handler": "facet_worker.handler"}
+    )
+    template.has_resource_properties(
+        "AWS::DynamoDB::Table",
+        {"StreamSpecification": {"StreamViewType": "NEW_AND_OLD_IMAGES"}},
+    )
+    template.has_resource_properties(
+        "AWS::Lambda::EventSourceMapping",
+        {"FunctionResponseTypes": ["ReportBatchItemFailures"]},
+    )
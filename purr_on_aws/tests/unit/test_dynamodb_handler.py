@@ -0,0 +1,562 @@
+import base64
+import gzip
+import io
+import json
+import threading
+from concurrent.futures import wait
+from datetime import timedelta
+
+from botocore.exceptions import ClientError
+
+import dynamodb_handler
+from job_store import job_update_args
+
+
+def raster(uwi, n=1, **attributes):
+    item = {
+        "pk": "RASTER",
+        "sk": f"{uwi}_{n}",
+        "uwi": uwi,
+        "well_name": f"WELL {uwi[-6:]}",
+        "wordz": "gamma ray" if n % 2 else "sonic",
+        "calib_segment_top_depth": 1000 * n,
+        "calib_segment_base_depth": 1000 * n + 500,
+    }
+    return {**item, **attributes}
+
+
+def search_all(call, query, max_results, token=None):
+    # Page to completion; returns the raster sks in page order
+    sks = []
+    while True:
+        body = {**query, "maxResults": max_results, "paginationToken": token}
+        status, page = call("POST", "/search", body)
+        assert status == 200, page
+        sks.extend(item["sk"] for item in page["data"])
+        token = page["metadata"]["paginationToken"]
+        if not token:
+            return sks
+
+
+def ndjson(records):
+    return "".join(json.dumps(record) + "\n" for record in records)
+
+
+class StagedObjects:
+    # S3 client stand-in: get_object of NDJSON staged under a key
+    def __init__(self, objects):
+        self.objects = objects
+
+    def get_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise ClientError({"Error": {"Code": "NoSuchKey"}}, "GetObject")
+        return {"Body": StagedBody(self.objects[Key])}
+
+
+class StagedBody(io.BytesIO):
+    def iter_lines(self):
+        return iter(self.read().splitlines())
+
+
+def test_ndjson_ingest_reports_rejected_lines(api):
+    call, _ = api
+    rasters = [raster(f"4200{n:06d}0000") for n in range(4)]
+    lines = ndjson(rasters[:2]) + "{not json\n\n" + '{"pk": "RASTER"}\n'
+    lines += ndjson(rasters[2:])
+    headers = {"Content-Type": "application/x-ndjson"}
+    status, body = call("POST", "/rasters", lines, headers)
+    assert status == 207
+    assert (body["count"], body["written"], body["failed"]) == (4, 4, [])
+    assert body["postingsWritten"] > 0
+    assert body["rejectedCount"] == 2
+    assert body["rejected"] == [
+        {"line": 3, "error": "Invalid JSON"},
+        {"line": 5, "error": "Missing pk or sk"},
+    ]
+    assert search_all(call, {"uwis": ["42"]}, 10) == [r["sk"] for r in rasters]
+
+
+def test_gzipped_ndjson_ingest(api):
+    call, _ = api
+    rasters = [raster(f"4200{n:06d}0000", 2) for n in range(30)]
+    body = gzip.compress(ndjson(rasters).encode())
+    headers = {"Content-Type": "application/gzip"}
+    status, summary = call("POST", "/rasters", body, headers)
+    assert status == 201
+    assert (summary["count"], summary["written"], summary["rejectedCount"]) == (
+        30,
+        30,
+        0,
+    )
+    assert search_all(call, {"uwis": ["42"]}, 100) == [r["sk"] for r in rasters]
+
+
+def test_staged_ingest(api, monkeypatch):
+    call, _ = api
+    plain = [raster(f"4200{n:06d}0000") for n in range(3)]
+    zipped = [raster(f"4201{n:06d}0000") for n in range(3)]
+    objects = {
+        "plain.ndjson": ndjson(plain).encode(),
+        "zipped.ndjson.gz": gzip.compress(ndjson(zipped).encode()),
+    }
+    monkeypatch.setattr(dynamodb_handler, "INGEST_BUCKET_NAME", "test-ingest")
+    monkeypatch.setattr(dynamodb_handler, "s3_client", StagedObjects(objects))
+
+    for key in objects:
+        status, body = call("POST", "/rasters", {"source": {"key": key}})
+        assert (status, body["written"]) == (201, 3)
+    expected = sorted(item["sk"] for item in plain + zipped)
+    assert search_all(call, {"uwis": ["42"]}, 10) == expected
+
+    for source, error in (
+        ({"key": "missing.ndjson"}, "Staged object not found: missing.ndjson"),
+        (
+            {"bucket": "other", "key": "plain.ndjson"},
+            "source bucket must be test-ingest",
+        ),
+        ({}, "source must be an object with a key"),
+    ):
+        status, body = call("POST", "/rasters", {"source": source})
+        assert (status, body["error"]) == (400, error)
+
+
+def test_max_results_must_be_a_positive_integer(api):
+    call, _ = api
+    assert call("POST", "/rasters", [raster("42000000010000")])[0] == 201
+    error = "maxResults must be an integer of at least 1"
+    for bad in (0, -3, "abc", "2.5", 1.5, True, None):
+        status, body = call("POST", "/search", {"uwis": ["42"], "maxResults": bad})
+        assert (status, body["error"]) == (400, error), bad
+    for bad in ("0", "-1", "abc"):
+        since = "2026-10-18T00:00:00+00:00"
+        status, body = call("GET", "/changes", since=since, maxResults=bad)
+        assert (status, body["error"]) == (400, error), bad
+    status, body = call("POST", "/search", ["42"])
+    assert (status, body["error"]) == (400, "Request body must be an object")
+
+    status, page = call("POST", "/search", {"uwis": ["42"], "maxResults": "1"})
+    assert status == 200 and len(page["data"]) == 1
+
+
+def test_speculative_queries_stopped_before_reading_are_resumed(api, monkeypatch):
+    call, _ = api
+    uwis = [f"42{n:08d}0000" for n in range(40)]
+    rasters = [raster(uwi, n) for uwi in uwis for n in (1, 2)]
+    assert call("POST", "/rasters", rasters)[0] == 201
+
+    # On the first page the first four prefixes fill it; the speculative
+    # queries of later ones are held until then, so they stop before they
+    # read, and all have returned before the finished ones are looked at
+    query_prefix = dynamodb_handler.query_prefix
+    mark_finished_empty = dynamodb_handler.mark_finished_empty
+    first_page = threading.Event()
+    first_page.set()
+
+    def held_query_prefix(
+        uwi_prefix, partition, depth, limit, start_key, stop, *args, **kwargs
+    ):
+        if first_page.is_set() and uwis.index(uwi_prefix) >= 4:
+            stop.wait()
+        return query_prefix(
+            uwi_prefix, partition, depth, limit, start_key, stop, *args, **kwargs
+        )
+
+    def settled_mark_finished_empty(states, i, futures, stream_keys):
+        wait(futures.values())
+        return mark_finished_empty(states, i, futures, stream_keys)
+
+    monkeypatch.setattr(dynamodb_handler, "query_prefix", held_query_prefix)
+    monkeypatch.setattr(
+        dynamodb_handler, "mark_finished_empty", settled_mark_finished_empty
+    )
+    status, page = call("POST", "/search", {"uwis": uwis, "maxResults": 7})
+    assert status == 200
+    first_page.clear()
+    sks = [item["sk"] for item in page["data"]]
+    sks += search_all(call, {"uwis": uwis}, 7, page["metadata"]["paginationToken"])
+    assert sks == [item["sk"] for item in rasters]
+
+
+def test_search_tokens_need_a_secret(api, monkeypatch):
+    call, _ = api
+    assert call("POST", "/rasters", [raster("42000000010000", n) for n in (1, 2)])
+    monkeypatch.delenv("SEARCH_TOKEN_SECRET")
+    monkeypatch.setattr(dynamodb_handler, "search_token_secret", None)
+    status, body = call("POST", "/search", {"uwis": ["42"], "maxResults": 1})
+    assert status == 500
+    assert body["error"] == "Search token secret is not configured"
+
+
+def test_shards_are_read_for_a_share_of_the_page(api, monkeypatch):
+    call, _ = api
+    uwis = [f"4200{n:06d}0000" for n in range(60)]
+    rasters = [raster(uwi) for uwi in uwis]
+    assert call("POST", "/rasters", rasters)[0] == 201
+
+    query_prefix = dynamodb_handler.query_prefix
+    limits = []
+
+    def recorded_query_prefix(uwi_prefix, partition, depth, limit, *args, **kwargs):
+        limits.append(limit)
+        return query_prefix(uwi_prefix, partition, depth, limit, *args, **kwargs)
+
+    monkeypatch.setattr(dynamodb_handler, "query_prefix", recorded_query_prefix)
+    sks = search_all(call, {"uwis": ["42"]}, 40)
+    assert sks == sorted(item["sk"] for item in rasters)
+    shares = limits[: dynamodb_handler.RASTER_SHARDS]
+    share = 40 // dynamodb_handler.RASTER_SHARDS + dynamodb_handler.STREAM_READ_MARGIN
+    assert shares == [share] * dynamodb_handler.RASTER_SHARDS
+
+
+def test_rasters_re_posted_under_another_uwi_move(api, clock):
+    call, standin = api
+    since = (clock.now() - timedelta(minutes=1)).isoformat()
+    item = raster("42001000010000")
+    moved = {**item, "uwi": "42002000010000"}
+    assert dynamodb_handler.raster_shard(moved["uwi"]) != dynamodb_handler.raster_shard(
+        item["uwi"]
+    )
+    assert call("POST", "/rasters", [item, raster("42003000010000")])[0] == 201
+    status, body = call("POST", "/rasters", [moved])
+    assert status == 201
+    assert body["deleted"] == 1 + len(dynamodb_handler.posting_items(item))
+
+    for query, want in (
+        ({"uwis": ["42"]}, [moved["sk"], "42003000010000_1"]),
+        ({"uwis": ["42001"], "wordz": "gamma"}, []),
+        ({"uwis": ["42"], "wordz": "gamma"}, [moved["sk"], "42003000010000_1"]),
+        ({"uwis": ["42002"], "depth": [1200, 1300]}, [moved["sk"]]),
+    ):
+        assert search_all(call, query, 10) == want, query
+    clock.advance(dynamodb_handler.CHANGE_SETTLE_SECONDS + 1)
+    status, page = call("GET", "/changes", since=since)
+    assert sorted(item["uwi"] for item in page["data"]) == [
+        "42002000010000",
+        "42003000010000",
+    ]
+    # Nothing is left under the old UWI
+    stored = standin.tables["test-fizz"].items.values()
+    assert not [
+        i
+        for i in stored
+        if i.get("uwi") == item["uwi"] or i["sk"].startswith(f"{item['uwi']}#")
+    ]
+
+
+def test_sorted_search_of_few_rasters_reads_only_them(api):
+    call, _ = api
+    uwis = [f"4200{n:06d}0000" for n in range(200)]
+    assert call("POST", "/rasters", [raster(uwi) for uwi in uwis])[0] == 201
+    query = {"uwis": [uwis[7]], "sortBy": "well_name", "maxResults": 10}
+    status, body = call("POST", "/search", query)
+    assert status == 200
+    assert [item["sk"] for item in body["data"]] == [f"{uwis[7]}_1"]
+    assert body["metadata"]["evaluatedCount"] == 1
+
+
+def test_sorted_search_in_memory_pages_read_only_their_rows(api):
+    call, _ = api
+    rasters = [
+        raster(f"4200{n:06d}0000", well_name=f"WELL {(37 * n) % 60:03d}")
+        for n in range(60)
+    ]
+    assert call("POST", "/rasters", rasters)[0] == 201
+    query = {"uwis": ["42"], "sortBy": "well_name", "maxResults": 25}
+    status, page = call("POST", "/search", query)
+    assert page["metadata"]["evaluatedCount"] == 60
+    sks = [item["sk"] for item in page["data"]]
+    while page["metadata"]["paginationToken"]:
+        token = page["metadata"]["paginationToken"]
+        status, page = call("POST", "/search", {**query, "paginationToken": token})
+        assert status == 200
+        # Fetched by key: no query re-reads the prefix
+        metadata = page["metadata"]
+        assert (metadata["pageCount"], metadata["evaluatedCount"]) == (0, 0)
+        sks.extend(item["sk"] for item in page["data"])
+    by_name = sorted(rasters, key=lambda item: item["well_name"])
+    assert sks == [item["sk"] for item in by_name]
+
+
+def test_sorted_search_walk_fills_pages_and_pages_to_completion(api, monkeypatch):
+    call, _ = api
+    uwis = [f"4200{n:06d}0000" for n in range(120)]
+    rasters = [
+        raster(uwi, n, well_name=f"WELL {(37 * i) % 120:03d}")
+        for i, uwi in enumerate(uwis)
+        for n in (1, 2)
+    ]
+    assert call("POST", "/rasters", rasters)[0] == 201
+    monkeypatch.setattr(dynamodb_handler, "SORT_IN_MEMORY_MAX", 10)
+    monkeypatch.setattr(dynamodb_handler, "MAX_SORTED_EVALUATED", 40)
+    for query, matches in (
+        ({"uwis": ["42"], "wordz": "gamma"}, lambda item: item["wordz"] == "gamma ray"),
+        # A narrow prefix, a few rasters in each round of the walk
+        ({"uwis": ["420000000"]}, lambda item: item["uwi"].startswith("420000000")),
+    ):
+        query = {**query, "sortBy": "well_name", "maxResults": 6}
+        pages = []
+        token = None
+        while True:
+            status, page = call("POST", "/search", {**query, "paginationToken": token})
+            assert status == 200, page
+            pages.append([item["sk"] for item in page["data"]])
+            token = page["metadata"]["paginationToken"]
+            if not token:
+                break
+        assert all(len(sks) == 6 for sks in pages[:-1]), pages
+        expected = sorted(
+            (item for item in rasters if matches(item)),
+            key=lambda item: (item["well_name"], item["uwi"], item["sk"]),
+        )
+        assert sum(pages, []) == [item["sk"] for item in expected]
+
+
+def test_search_pages_to_completion_without_loss_or_duplicates(api):
+    call, _ = api
+    uwis = [f"42{county:03d}{n:05d}0000" for county in (1, 2, 3) for n in range(15)]
+    rasters = [raster(uwi, n) for uwi in uwis for n in (1, 2, 3)]
+    assert call("POST", "/rasters", rasters)[0] == 201
+
+    def expected(prefixes, wordz=None, depth=None):
+        return sorted(
+            item["sk"]
+            for item in rasters
+            if item["uwi"].startswith(tuple(prefixes))
+            and (not wordz or wordz in item["wordz"])
+            and (
+                not depth
+                or item["calib_segment_top_depth"] <= depth[1]
+                and item["calib_segment_base_depth"] >= depth[0]
+            )
+        )
+
+    queries = [
+        {"uwis": ["42"]},
+        {"uwis": ["42002", "42001", uwis[40], "4200200003"]},
+        {"uwis": ["42"], "wordz": "gamma"},
+        {"uwis": ["42001", "42003"], "depth": [2200, 2800]},
+    ]
+    for query in queries:
+        want = expected(query["uwis"], query.get("wordz"), query.get("depth"))
+        for max_results in (1, 4, 50):
+            assert search_all(call, query, max_results) == want, (query, max_results)
+
+
+def test_postings_drop_rasters_that_left_their_uwi(api):
+    call, _ = api
+    item = raster("42001000010000")
+    assert call("POST", "/rasters", [item])[0] == 201
+    # The raster is now under another UWI; its old postings are still there
+    stored = dynamodb_handler.fizz_table.get_item(
+        Key={"pk": dynamodb_handler.raster_partition(item["uwi"]), "sk": item["sk"]}
+    )["Item"]
+    dynamodb_handler.fizz_table.put_item(Item={**stored, "uwi": "42002000010000"})
+    for query in (
+        {"uwis": ["42001"], "wordz": "gamma"},
+        {"uwis": ["42001000010000"], "wordz": "gamma"},
+        {"uwis": ["42001"], "depth": [1200, 1300]},
+    ):
+        assert search_all(call, query, 10) == [], query
+
+
+def test_search_tokens_are_checked(api):
+    call, _ = api
+    rasters = [raster(f"4200{n:06d}0000") for n in range(5)]
+    assert call("POST", "/rasters", rasters)[0] == 201
+    status, page = call("POST", "/search", {"uwis": ["42"], "maxResults": 2})
+    token = page["metadata"]["paginationToken"]
+
+    other = {"uwis": ["4200"], "maxResults": 2, "paginationToken": token}
+    status, body = call("POST", "/search", other)
+    assert (status, body["error"]) == (
+        400,
+        "Pagination token does not match this request",
+    )
+    raw = bytearray(base64.urlsafe_b64decode(token))
+    raw[-1] ^= 1
+    tampered = base64.urlsafe_b64encode(bytes(raw)).decode()
+    for bad in (tampered, "AA", "not a token"):
+        query = {"uwis": ["42"], "maxResults": 2, "paginationToken": bad}
+        status, body = call("POST", "/search", query)
+        assert (status, body["error"]) == (400, "Invalid pagination token")
+
+
+def test_upsert_counts_and_keeps_created_at(api, clock):
+    call, _ = api
+    rasters = [
+        raster(f"4200{n:06d}0000", raster_checksum=f"r{n}", calib_checksum="c")
+        for n in range(3)
+    ]
+    status, body = call("POST", "/rasters", rasters[:2], echo="true")
+    assert status == 201
+    created_at = body["items"][1]["created_at"]
+    clock.advance(60)
+
+    changed = {**rasters[1], "raster_checksum": "r1-changed"}
+    again = [rasters[0], changed, rasters[2]]
+    status, body = call("POST", "/rasters", again, mode="upsert", echo="true")
+    assert status == 201
+    assert {k: body[k] for k in ("inserted", "updated", "skipped", "written")} == {
+        "inserted": 1,
+        "updated": 1,
+        "skipped": 1,
+        "written": 2,
+    }
+    updated = {item["sk"]: item for item in body["items"]}[changed["sk"]]
+    assert updated["created_at"] == created_at
+    assert updated["updated_at"] > created_at
+
+    lines = ndjson(again)
+    headers = {"Content-Type": "application/x-ndjson"}
+    status, body = call("POST", "/rasters", lines, headers, mode="upsert")
+    assert (body["inserted"], body["updated"], body["skipped"]) == (0, 0, 3)
+    assert body["written"] == 0
+
+
+def test_reads_are_cached_until_a_write(api):
+    call, standin = api
+    repo = {"pk": "REPO", "sk": "repo-1", "fs_path": "/data/one"}
+    assert call("POST", "/repos", repo)[0] == 201
+    status, first = call("GET", "/repos")
+    queries = standin.calls["Query"]
+    status, second = call("GET", "/repos")
+    assert second == first
+    assert standin.calls["Query"] == queries
+
+    repo = {"pk": "REPO", "sk": "repo-2", "fs_path": "/data/two"}
+    assert call("POST", "/repos", repo)[0] == 201
+    status, third = call("GET", "/repos")
+    assert [item["sk"] for item in third] == ["repo-1", "repo-2"]
+    assert standin.calls["Query"] == queries + 1
+
+
+def test_search_cache_is_dropped_by_a_raster_write(api):
+    call, _ = api
+    assert call("POST", "/rasters", [raster("42000000010000")])[0] == 201
+    query = {"uwis": ["42"], "maxResults": 10}
+    assert call("POST", "/search", query)[1]["metadata"]["cache"]["status"] == "miss"
+    status, page = call("POST", "/search", query)
+    assert page["metadata"]["cache"]["status"] == "hit"
+    assert [item["sk"] for item in page["data"]] == ["42000000010000_1"]
+
+    assert call("POST", "/rasters", [raster("42000000020000")])[0] == 201
+    status, page = call("POST", "/search", query)
+    assert page["metadata"]["cache"]["status"] == "miss"
+    assert [item["sk"] for item in page["data"]] == [
+        "42000000010000_1",
+        "42000000020000_1",
+    ]
+
+
+def test_facets_from_counters_and_rasters(api, monkeypatch):
+    call, standin = api
+    rasters = [
+        raster("42329000010000", well_county="MIDLAND", calib_type="depth"),
+        raster("42329000020000", well_county="MIDLAND"),
+        raster("42329100030000", well_county="UPTON"),
+    ]
+    assert call("POST", "/rasters", rasters)[0] == 201
+    fizz_table = standin.resource.Table("test-fizz")
+    # Sharded counters, and one from before the sharding
+    for sk, counter, count in (
+        ("TOTAL#00", "TOTAL", 2),
+        ("TOTAL#05", "TOTAL", 1),
+        ("well_county#MIDLAND#03", "well_county#MIDLAND", 2),
+        ("well_county#UPTON", None, 1),
+    ):
+        item = {"pk": "FACET#42", "sk": sk, "count": count}
+        fizz_table.put_item(Item={**item, **({"counter": counter} if counter else {})})
+
+    status, body = call("POST", "/facets", {"uwis": ["42"]})
+    assert status == 200
+    assert body["data"]["total"] == 3
+    assert body["data"]["facets"]["well_county"] == {"MIDLAND": 2, "UPTON": 1}
+
+    for uwis in (["423290", "42329100030000"], ["423"]):
+        status, body = call("POST", "/facets", {"uwis": uwis})
+        assert status == 200
+        assert body["data"]["total"] == 3
+        assert body["data"]["facets"]["calib_type"] == {"depth": 1}
+        assert body["metadata"]["truncated"] is False
+
+    # Wide prefixes count up to a cap of rasters
+    monkeypatch.setattr(dynamodb_handler, "MAX_FACET_COUNTED", 1)
+    status, body = call("POST", "/facets", {"uwis": ["4"]})
+    assert status == 200
+    assert body["data"]["total"] < 3
+    assert body["metadata"]["truncated"] is True
+
+    for bad in (["42"], "42"):
+        status, body = call("POST", "/facets", bad)
+        assert (status, body["error"]) == (400, "Request body must be an object")
+
+
+def test_changes_page_to_completion(api, clock):
+    call, _ = api
+    since = (clock.now() - timedelta(minutes=1)).isoformat()
+    rasters = [raster(f"4200{n:06d}0000") for n in range(11)]
+    assert call("POST", "/rasters", rasters)[0] == 201
+    status, page = call("GET", "/changes", since=since)
+    assert (status, page["data"]) == (200, [])
+
+    # Writes show once the feed has settled past them
+    clock.advance(dynamodb_handler.CHANGE_SETTLE_SECONDS + 1)
+    sks = []
+    params = {"since": since, "maxResults": "3"}
+    while True:
+        status, page = call("GET", "/changes", **params)
+        assert status == 200, page
+        assert len(page["data"]) <= 3
+        sks.extend(item["sk"] for item in page["data"])
+        token = page["metadata"]["paginationToken"]
+        if not token:
+            break
+        params["paginationToken"] = token
+    assert sorted(sks) == sorted(item["sk"] for item in rasters)
+
+    status, page = call("GET", "/changes", since=page["metadata"]["watermark"])
+    assert (status, page["data"]) == (200, [])
+
+
+def test_failed_writes_are_counted_and_listed_up_to_a_cap(api, monkeypatch):
+    call, _ = api
+    # Every chunk stays unprocessed, as under sustained throttling
+    monkeypatch.setattr(dynamodb_handler, "write_chunk", lambda table, reqs: reqs)
+    rasters = [raster(f"4200{n:06d}0000") for n in range(150)]
+    status, body = call("POST", "/rasters", rasters)
+    assert status == 207
+    assert body["written"] == 0
+    assert body["failedCount"] > len(rasters)
+    assert len(body["failed"]) == dynamodb_handler.MAX_FAILED_REPORTED
+    assert set(body["failed"][0]) == {"pk", "sk"}
+
+    headers = {"Content-Type": "application/x-ndjson"}
+    status, body = call("POST", "/rasters", ndjson(rasters), headers)
+    assert status == 207
+    assert body["failedCount"] > len(rasters)
+    assert len(body["failed"]) == dynamodb_handler.MAX_FAILED_REPORTED
+
+
+def test_job_payloads_are_returned_once_it_finishes(api, clock):
+    call, standin = api
+    items = [{"uwi": f"4200{n:06d}0000", "note": "x" * 200} for n in range(100)]
+    job = {"ttl": 1, "status": "pending", "directive": "export", "items": items}
+    status, created = call("POST", "/jobs", job)
+    assert status == 201
+    job_id = created["id"]
+    status, job = call("GET", f"/jobs/{job_id}")
+    assert (status, job["status"], job["directive"]) == (200, "pending", "export")
+    assert not {"items", "items_ref", "body"} & set(job)
+
+    # The worker finishes the job while the request waits
+    finished = {"status": "completed", "body": {"rows": 100}, "updated_at": "later"}
+    clock.at(
+        5,
+        lambda: dynamodb_handler.jobs_table.update_item(
+            **job_update_args(job_id, finished)
+        ),
+    )
+    status, job = call("GET", f"/jobs/{job_id}", wait="20", status="pending")
+    assert (status, job["status"]) == (200, "completed")
+    assert (job["body"], job["items"]) == ({"rows": 100}, items)
+    assert 5 <= clock.monotonic() < 10
@@ -0,0 +1,134 @@
+import os
+import sys
+
+import pytest
+from boto3.dynamodb.conditions import Key
+from boto3.dynamodb.types import TypeSerializer
+from botocore.exceptions import ClientError
+
+os.environ.setdefault("FIZZ_TABLE_NAME", "test-fizz")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "lambda"))
+
+import facet_worker  # noqa: E402
+from tests.standin import StandIn  # noqa: E402
+from facet_store import counts_of_counters, facet_pk, facet_summary  # noqa: E402
+
+serializer = TypeSerializer()
+
+
+def stream_record(sequence_number, old=None, new=None):
+    # Synthetic DynamoDB stream record, NEW_AND_OLD_IMAGES view
+    event_name = "MODIFY" if old and new else "INSERT" if new else "REMOVE"
+    change = {"SequenceNumber": str(sequence_number)}
+    for name, image in (("OldImage", old), ("NewImage", new)):
+        if image:
+            change[name] = {k: serializer.serialize(v) for k, v in image.items()}
+    return {
+        "eventID": f"event-{sequence_number}",
+        "eventName": event_name,
+        "dynamodb": change,
+    }
+
+
+def raster(uwi, n=1, **attributes):
+    item = {
+        "pk": "RASTER#00",
+        "sk": f"{uwi}_{n}",
+        "uwi": uwi,
+        "well_state": "TX",
+        "well_county": "MIDLAND",
+        "calib_type": "depth",
+    }
+    return {**item, **attributes}
+
+
+@pytest.fixture
+def summary(monkeypatch):
+    standin = StandIn()
+    table = standin.create_table("test-fizz", ("pk", "sk"))
+    monkeypatch.setattr(facet_worker, "dynamodb_client", standin.client)
+    monkeypatch.setattr(facet_worker, "fizz_table_name", "test-fizz")
+
+    def read(prefix=""):
+        counters = table.query(KeyConditionExpression=Key("pk").eq(facet_pk(prefix)))
+        return facet_summary(counts_of_counters(counters["Items"]))
+
+    return read, standin
+
+
+def test_counts_follow_raster_changes(summary):
+    read, _ = summary
+    a, b = raster("42329000010000"), raster("42461000020000", well_county="UPTON")
+    facet_worker.handler({"Records": [stream_record(1, new=a)]}, None)
+    facet_worker.handler({"Records": [stream_record(2, new=b)]}, None)
+    assert read()["total"] == 2
+    assert read()["facets"]["well_county"] == {"MIDLAND": 1, "UPTON": 1}
+    assert read("42329")["total"] == 1
+
+    moved = {**b, "well_county": "MIDLAND", "calib_log_type": "GR"}
+    records = [stream_record(3, old=b, new=moved), stream_record(4, old=a)]
+    facet_worker.handler({"Records": records}, None)
+    assert read()["total"] == 1
+    assert read()["facets"]["well_county"] == {"MIDLAND": 1}
+    assert read()["facets"]["calib_log_type"] == {"GR": 1}
+    assert read("42329")["total"] == 0
+    assert read("42")["facets"]["well_state"] == {"TX": 1}
+
+
+def test_other_items_are_not_counted(summary):
+    read, _ = summary
+    posting = {"pk": "WORD#gamma", "sk": "42329000010000#x", "uwi": "42329000010000"}
+    facet_worker.handler({"Records": [stream_record(1, new=posting)]}, None)
+    assert read()["total"] == 0
+
+
+def test_retried_batch_counts_once(summary, monkeypatch):
+    read, standin = summary
+    records = [stream_record(n, new=raster(f"42{n:03d}000010000")) for n in range(60)]
+    transact = standin.client.transact_write_items
+    calls = []
+
+    def flaky_transact(**args):
+        # The second transaction of the first delivery fails
+        calls.append(args)
+        if len(calls) == 2:
+            raise ClientError(
+                {"Error": {"Code": "ProvisionedThroughputExceededException"}},
+                "TransactWriteItems",
+            )
+        return transact(**args)
+
+    monkeypatch.setattr(standin.client, "transact_write_items", flaky_transact)
+    with pytest.raises(ClientError):
+        facet_worker.handler({"Records": records}, None)
+    facet_worker.handler({"Records": records}, None)
+    assert read()["total"] == 60
+    assert read("42001")["total"] == 1
+
+
+def test_conflicting_transaction_is_retried(summary, monkeypatch):
+    read, standin = summary
+    records = [stream_record(n, new=raster(f"42{n:03d}000010000")) for n in range(3)]
+    transact = standin.client.transact_write_items
+    calls = []
+
+    def conflicting_transact(**args):
+        # Another batch updates the same counters at the same time, once
+        calls.append(args)
+        if len(calls) == 1:
+            raise ClientError(
+                {
+                    "Error": {"Code": "TransactionCanceledException"},
+                    "CancellationReasons": [{"Code": "TransactionConflict"}],
+                },
+                "TransactWriteItems",
+            )
+        return transact(**args)
+
+    monkeypatch.setattr(standin.client, "transact_write_items", conflicting_transact)
+    facet_worker.handler({"Records": records}, None)
+    assert len(calls) == 2
+    assert calls[0] == calls[1]
+    assert read()["total"] == 3
+    assert read("42")["facets"]["well_county"] == {"MIDLAND": 3}
@@ -0,0 +1,186 @@
+import os
+import sys
+import threading
+
+import pytest
+from boto3.dynamodb.types import TypeSerializer
+from botocore.exceptions import ClientError
+
+os.environ.setdefault("JOBS_TABLE_NAME", "test-jobs")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "lambda"))
+
+import job_worker  # noqa: E402
+from tests.standin import StandIn  # noqa: E402
+
+serializer = TypeSerializer()
+
+
+def stream_record(sequence_number, job, event_name="INSERT"):
+    # Synthetic DynamoDB stream record, NEW_IMAGE view
+    return {
+        "eventID": f"event-{sequence_number}",
+        "eventName": event_name,
+        "dynamodb": {
+            "SequenceNumber": str(sequence_number),
+            "NewImage": {k: serializer.serialize(v) for k, v in job.items()},
+        },
+    }
+
+
+def pending_job(job_id, directive="echo", **attributes):
+    job = {"id": job_id, "ttl": 1, "directive": directive, "status": "pending"}
+    return {**job, **attributes}
+
+
+@pytest.fixture
+def jobs(monkeypatch):
+    standin = StandIn()
+    table = standin.create_table("test-jobs", ("id",))
+    monkeypatch.setattr(job_worker, "jobs_table", table)
+    monkeypatch.setattr(job_worker, "directives", {})
+
+    @job_worker.directive("echo")
+    def echo(job):
+        return f"echoed {job['id']}"
+
+    @job_worker.directive("explode")
+    def explode(job):
+        raise RuntimeError("no such repo")
+
+    def load(*items):
+        for item in items:
+            table.put_item(Item=item)
+        return [stream_record(n + 1, item) for n, item in enumerate(items)]
+
+    def get(job_id):
+        return table.get_item(Key={"id": job_id})["Item"]
+
+    return load, get, table
+
+
+def test_runs_registered_directive(jobs):
+    load, get, _ = jobs
+    records = load(pending_job("a"))
+
+    assert job_worker.handler({"Records": records}, None) == {"batchItemFailures": []}
+    job = get("a")
+    assert job["status"] == "completed"
+    assert job["body"] == "echoed a"
+    assert job["updated_at"]
+
+
+def test_directive_error_fails_job_not_record(jobs):
+    load, get, _ = jobs
+    records = load(pending_job("a", "explode"))
+
+    assert job_worker.handler({"Records": records}, None) == {"batchItemFailures": []}
+    assert get("a")["status"] == "failed"
+    assert get("a")["body"] == "no such repo"
+
+
+def test_ignores_other_records(jobs):
+    load, get, _ = jobs
+    records = load(
+        pending_job("unknown", "add_petra_repo"),
+        pending_job("done", status="completed"),
+    )
+    records.append({"eventID": "gone", "eventName": "REMOVE", "dynamodb": {}})
+
+    assert job_worker.handler({"Records": records}, None) == {"batchItemFailures": []}
+    assert get("unknown")["status"] == "pending"
+    assert get("done")["status"] == "completed"
+
+
+def test_duplicate_delivery_runs_once(jobs):
+    load, get, _ = jobs
+    calls = []
+    job_worker.directives["count"] = lambda job: calls.append(job["id"]) or "ok"
+    job = pending_job("a", "count")
+    record = load(job)[0]
+    duplicate = stream_record(7, job, "MODIFY")
+
+    job_worker.handler({"Records": [record, duplicate]}, None)
+    assert calls == ["a"]
+    assert get("a")["status"] == "completed"
+
+
+def test_redelivery_after_completion_runs_once(jobs):
+    load, get, _ = jobs
+    calls = []
+    job_worker.directives["count"] = lambda job: calls.append(job["id"]) or "ok"
+    record = load(pending_job("a", "count"))[0]
+
+    job_worker.handler({"Records": [record]}, None)
+    assert get("a")["status"] == "completed"
+    # The same record again, after the job finished
+    assert job_worker.handler({"Records": [record]}, None) == {"batchItemFailures": []}
+    assert calls == ["a"]
+    assert get("a")["status"] == "completed"
+
+
+def test_partial_batch_failure(jobs, monkeypatch):
+    load, get, table = jobs
+    records = load(pending_job("ok"), pending_job("bad"))
+    records.append(stream_record(3, pending_job("bad"), "MODIFY"))
+    update_item = table.update_item
+
+    def flaky_update_item(**args):
+        # Claims go through; the completed write for "bad" does not
+        values = args["ExpressionAttributeValues"]
+        if args["Key"]["id"] == "bad" and values[":status"] == "completed":
+            raise ClientError(
+                {"Error": {"Code": "ProvisionedThroughputExceededException"}},
+                "UpdateItem",
+            )
+        return update_item(**args)
+
+    monkeypatch.setattr(table, "update_item", flaky_update_item)
+    response = job_worker.handler({"Records": records}, None)
+
+    # The failed record and the later record for the same job are retried
+    assert response == {
+        "batchItemFailures": [{"itemIdentifier": "2"}, {"itemIdentifier": "3"}]
+    }
+    assert get("ok")["status"] == "completed"
+    assert get("bad")["status"] == "running"
+
+    # A retried record reclaims its own job
+    monkeypatch.setattr(table, "update_item", update_item)
+    retry = job_worker.handler({"Records": records[1:2]}, None)
+    assert retry == {"batchItemFailures": []}
+    assert get("bad")["status"] == "completed"
+
+
+def test_independent_jobs_run_concurrently(jobs):
+    load, get, _ = jobs
+    both_running = threading.Barrier(2, timeout=5)
+
+    @job_worker.directive("meet")
+    def meet(job):
+        both_running.wait()
+        return "met"
+
+    records = load(pending_job("a", "meet"), pending_job("b", "meet"))
+    assert job_worker.handler({"Records": records}, None) == {"batchItemFailures": []}
+    assert get("a")["status"] == get("b")["status"] == "completed"
+
+
+def test_large_payloads_stay_out_of_the_job_row(jobs):
+    load, get, table = jobs
+    items = [{"uwi": f"42{n:012d}", "name": f"well {n}"} for n in range(2000)]
+
+    @job_worker.directive("copy")
+    def copy(job):
+        return job["items"] * 2
+
+    # Stored the way POST /jobs stores it: the row holds only items_ref
+    job, _ = job_worker.offload_payloads(
+        table, "a", pending_job("a", "copy", items=items), 1
+    )
+    records = load(job)
+
+    assert job_worker.handler({"Records": records}, None) == {"batchItemFailures": []}
+    row = get("a")
+    assert "body" not in row and row["body_ref"]["chunks"] == 1
+    assert job_worker.load_payloads(table, row)["body"] == items * 2
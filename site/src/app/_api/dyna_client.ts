@@ -8,6 +8,7 @@ const ENDPOINTS = {
   SEARCH_RASTERS: "/search",
   CREATE_JOB: "jobs",
   GET_JOB_BY_ID: (id: string) => `/jobs/${id}`,
+  GET_JOB_STATUSES: "/jobs/status",
 };
 
 type HttpMethod = "GET" | "POST" | "DELETE";
@@ -124,9 +125,27 @@ export const createJob = async (job: Job): Promise<ApiResponse<Job>> => {
   }
 };
 
-export const getJobById = async (id: string): Promise<ApiResponse<Job>> => {
+// Long-poll: the server holds the request up to `wait` seconds until the
+// job's updated_at/status differ from `since`/`status`
+export interface JobWaitParams {
+  wait: number;
+  since?: string;
+  status?: string;
+}
+
+export const getJobById = async (
+  id: string,
+  waitParams?: JobWaitParams,
+): Promise<ApiResponse<Job>> => {
   try {
-    const response = await client.get<Job>(ENDPOINTS.GET_JOB_BY_ID(id));
+    const params = new URLSearchParams();
+    for (const [key, value] of Object.entries(waitParams ?? {})) {
+      if (value !== undefined) params.set(key, String(value));
+    }
+    const query = params.toString() ? `?${params}` : "";
+    const response = await client.get<Job>(
+      ENDPOINTS.GET_JOB_BY_ID(id) + query,
+    );
     return response;
   } catch (error) {
     console.error("Error fetching job by ID:", error);
@@ -134,6 +153,28 @@ export const getJobById = async (id: string): Promise<ApiResponse<Job>> => {
   }
 };
 
+export interface JobStatuses {
+  jobs: Pick<Job, "id" | "status" | "updated_at" | "body">[];
+  missing: string[];
+}
+
+// One request for many jobs' status (and result body, if asked for)
+export const getJobStatuses = async (
+  ids: string[],
+  includeResult = false,
+): Promise<ApiResponse<JobStatuses>> => {
+  try {
+    const response = await client.post<JobStatuses>(
+      ENDPOINTS.GET_JOB_STATUSES,
+      { ids, includeResult },
+    );
+    return response;
+  } catch (error) {
+    console.error("Error fetching job statuses:", error);
+    throw error;
+  }
+};
+
 export interface RepoSearchParams {
   maxResults: number;
   uwis: string[];
@@ -145,8 +186,10 @@ export const searchRasters = async (
   params: RepoSearchParams,
 ): Promise<FilteredRasterResponse> => {
   try {
+    // "table" projection returns only the dtRasterKeys columns
     const payload = {
       ...params,
+      projection: "table",
       paginationToken: params.paginationToken || undefined,
     };
 
@@ -1,5 +1,8 @@
+// Search cursors are opaque and bound to the query that produced them, so a
+// token is dropped whenever the query it is requested for changes.
 class PaginationManager {
   private token: string | null = null;
+  private queryKey: string | null = null;
 
   get currentToken(): string | null {
     return this.token;
@@ -8,6 +11,14 @@ class PaginationManager {
   set currentToken(value: string | null) {
     this.token = value;
   }
+
+  tokenFor(queryKey: string): string | null {
+    if (queryKey !== this.queryKey) {
+      this.queryKey = queryKey;
+      this.token = null;
+    }
+    return this.token;
+  }
 }
 
 export default PaginationManager;
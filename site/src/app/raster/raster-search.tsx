@@ -71,17 +71,19 @@ export default function RasterSearchForm() {
     setError(null);
 
     try {
+      const uwis = parseUwiInput(values.uwiList);
+      const wordz = values.wordz || null;
+      const token = pm.current.tokenFor(JSON.stringify([uwis, wordz]));
+
       const response = await searchRasters({
         //maxResults: values.maxResults,
         maxResults: currentMaxResults,
-        uwis: parseUwiInput(values.uwiList),
-        wordz: values.wordz || null,
-        paginationToken: pm.current.currentToken, // Send raw token
+        uwis: uwis,
+        wordz: wordz,
+        paginationToken: token, // Send raw token
       });
 
-      setResults((prev) =>
-        pm.current.currentToken ? [...prev, ...response.data] : response.data,
-      );
+      setResults((prev) => (token ? [...prev, ...response.data] : response.data));
 
       pm.current.currentToken = response.metadata?.paginationToken || null;
       //setHasMoreResults(!!pm.current.currentToken);
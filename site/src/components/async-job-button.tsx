@@ -1,8 +1,7 @@
-import React, { useState } from "react";
-import { useInterval } from "@/hooks/use-interval";
+import React, { useEffect, useRef, useState } from "react";
 import { Button } from "@/components/ui/button";
 import { createJob, getJobById } from "@/app/_api/dyna_client";
-//import { Job } from "@/ts/job";
+import { Job } from "@/ts/job";
 //import { v4 as uuidv4 } from "uuid";
 
 const getTTL = () => {
@@ -10,7 +9,10 @@ const getTTL = () => {
   return now + 1 * 60;
 };
 
-const POLL_SEC = 2;
+// Each status request long-polls: the server answers as soon as the job
+// changes, or after WAIT_SEC with the job as it was
+const WAIT_SEC = 20;
+const MAX_JOB_SEC = 60;
 
 type AsyncJobButtonProps = {
   icon?: React.ElementType;
@@ -29,7 +31,11 @@ export const AsyncJobButton = ({
 }: AsyncJobButtonProps) => {
   const [isPending, setIsPending] = useState(false);
   const [jobId, setJobId] = useState<string | null>(null);
-  const [pollCount, setPollCount] = useState(0);
+  const savedOnJobComplete = useRef(onJobComplete);
+
+  useEffect(() => {
+    savedOnJobComplete.current = onJobComplete;
+  }, [onJobComplete]);
 
   // Start the async job by calling the API
   const startAsyncJob = async () => {
@@ -51,31 +57,50 @@ export const AsyncJobButton = ({
     }
   };
 
-  const pollJobStatus = async () => {
+  useEffect(() => {
     if (!jobId) return;
-    try {
-      const response = await getJobById(jobId);
-      const job = response.data;
-      if (job.status === "completed" || job.status === "failed") {
-        setIsPending(false);
-        onJobComplete(job);
-      }
+    let cancelled = false;
 
-      setPollCount((c) => c + 1);
+    const waitForJob = async () => {
+      const started = Date.now();
+      let job: Job | undefined;
+      try {
+        while (!cancelled) {
+          // The first request returns at once; later ones wait for a change
+          const response = await getJobById(jobId, {
+            wait: WAIT_SEC,
+            since: job?.updated_at,
+            status: job?.status,
+          });
+          if (response.status !== 200) {
+            throw new Error(`Job status request failed: ${response.status}`);
+          }
+          job = response.data;
+          if (job.status === "completed" || job.status === "failed") break;
 
-      if (pollCount * POLL_SEC > 60) {
-        console.error("JOB TOOK TOO LONG!");
-        console.error(job);
+          if ((Date.now() - started) / 1000 > MAX_JOB_SEC) {
+            console.error("JOB TOOK TOO LONG!");
+            console.error(job);
+            break;
+          }
+        }
+        if (!cancelled) {
+          setIsPending(false);
+          setJobId(null);
+          savedOnJobComplete.current(job);
+        }
+      } catch (error) {
+        console.error("Polling failed:", error);
         setIsPending(false);
-        onJobComplete(job);
+        setJobId(null);
       }
-    } catch (error) {
-      console.error("Polling failed:", error);
-      setIsPending(false);
-    }
-  };
+    };
 
-  useInterval(pollJobStatus, isPending && jobId ? POLL_SEC * 1000 : null);
+    waitForJob();
+    return () => {
+      cancelled = true;
+    };
+  }, [jobId]);
 
   return (
     <Button
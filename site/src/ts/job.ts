@@ -5,4 +5,6 @@ export interface Job {
   directive: string;
   status: string;
   body?: string;
+  created_at?: string;
+  updated_at?: string;
 }